@@ -0,0 +1,61 @@
+"""
+Per call cost of generating a security credential.
+
+    $ python benchmarks/bench_credentials.py
+"""
+
+import datetime
+import json
+import pathlib
+import sys
+import tempfile
+import timeit
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+from mpesa_connect import SecurityCredentialProvider
+from mpesa_connect.utils import generate_security_credential
+
+
+def _write_certificate(path: pathlib.Path) -> None:
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "mpesa")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    path.write_bytes(certificate.public_bytes(serialization.Encoding.PEM))
+
+
+def _per_call(func, number: int) -> float:  # type: ignore[no-untyped-def]
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+def run(number: int = 200) -> dict:  # type: ignore[type-arg]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = pathlib.Path(tmp) / "cert.cer"
+        _write_certificate(path)
+        provider = SecurityCredentialProvider(path)
+        cached = SecurityCredentialProvider(path, cache_ttl=3600)
+        return {
+            "generate_security_credential": _per_call(
+                lambda: generate_security_credential("password", path), number
+            ),
+            "provider": _per_call(lambda: provider.generate("password"), number),
+            "provider_cached": _per_call(lambda: cached.generate("password"), number),
+        }
+
+
+if __name__ == "__main__":
+    json.dump({k: f"{v * 1e6:.1f}us" for k, v in run().items()}, sys.stdout, indent=2)
+    print()
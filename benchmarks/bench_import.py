@@ -0,0 +1,31 @@
+"""
+Time taken by `import mpesa_connect` in a fresh interpreter.
+
+    $ python benchmarks/bench_import.py
+"""
+
+import json
+import subprocess
+import sys
+import time
+from typing import Dict
+
+
+def _startup(code: str, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def run(repeat: int = 10) -> Dict[str, float]:
+    """Seconds, excluding interpreter startup"""
+    baseline = _startup("pass", repeat)
+    return {"import": _startup("import mpesa_connect", repeat) - baseline}
+
+
+if __name__ == "__main__":
+    json.dump({k: f"{v * 1e3:.1f}ms" for k, v in run().items()}, sys.stdout, indent=2)
+    print()
@@ -0,0 +1,68 @@
+"""
+Memory allocated per in-flight async call and per retained result.
+
+    $ python benchmarks/bench_memory.py
+"""
+
+import asyncio
+import gc
+import json
+import sys
+import tracemalloc
+from typing import Any, Dict, List
+
+from bench_throughput import QUERY, _app, simulator
+
+from mpesa_connect import AsyncSTKPush, STKPush
+
+
+def _in_flight(url: str, requests: int, latency: float) -> float:
+    async def main() -> float:
+        async with _app(url, pool_maxsize=requests) as app:
+            stkpush = AsyncSTKPush(app)
+            # Warm up the pool, the token and the lazily built caches
+            await asyncio.gather(*(stkpush.query(**QUERY) for _ in range(requests)))
+            gc.collect()
+            tracemalloc.start()
+            tasks = [
+                asyncio.ensure_future(stkpush.query(**QUERY)) for _ in range(requests)
+            ]
+            # The simulator latency keeps every call in flight here
+            await asyncio.sleep(latency / 2)
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            await asyncio.gather(*tasks)
+            return current / requests
+
+    return asyncio.run(main())
+
+
+def _retained(url: str, results: int, retain_response: bool) -> float:
+    with _app(url, retain_response=retain_response) as app:
+        stkpush = STKPush(app)
+        stkpush.query(**QUERY)
+        gc.collect()
+        tracemalloc.start()
+        kept: List[Any] = [stkpush.query(**QUERY) for _ in range(results)]
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del kept
+        return current / results
+
+
+def run(requests: int = 200, results: int = 500) -> Dict[str, float]:
+    """Bytes per call"""
+    with simulator("--latency", "0.5") as url:
+        in_flight = _in_flight(url, requests, 0.5)
+    with simulator() as url:
+        return {
+            "async_in_flight": in_flight,
+            "result_with_response": _retained(url, results, True),
+            "result_without_response": _retained(url, results, False),
+        }
+
+
+if __name__ == "__main__":
+    json.dump({k: f"{v / 1024:.1f}KiB" for k, v in run().items()}, sys.stdout, indent=2)
+    print()
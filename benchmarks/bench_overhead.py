@@ -0,0 +1,97 @@
+"""
+Per call client overhead, without any network I/O.
+
+    $ python benchmarks/bench_overhead.py
+"""
+
+import json
+import pathlib
+import sys
+import tempfile
+import timeit
+from typing import Any, Dict
+
+from bench_credentials import _write_certificate
+
+from mpesa_connect import App, AppEnv, STKPush, STKPushResult, TransactionType
+from mpesa_connect.stkpush import STKPushErrorResult
+from mpesa_connect.utils import generate_password, generate_security_credential
+
+PASS_KEY = "bfb279f9aa9bdbcf158e97dd71a467cd2e0c893059b10f78e6b72ada1ed2c919"
+STKPUSH_RESPONSE = json.dumps(
+    {
+        "MerchantRequestID": "29115-34620561-1",
+        "CheckoutRequestID": "ws_CO_191220191020363925",
+        "ResponseCode": "0",
+        "ResponseDescription": "Success. Request accepted for processing",
+        "CustomerMessage": "Success. Request accepted for processing",
+    }
+).encode()
+
+
+class _Response:
+    status_code = 200
+    url = "https://sandbox.safaricom.co.ke/mpesa/stkpush/v1/processrequest"
+    content = STKPUSH_RESPONSE
+
+
+class _PayloadOnly(STKPush):
+    def _post(self, path, payload, *args, **kwargs):  # type: ignore[no-untyped-def]
+        return payload
+
+
+def _per_call(func, number: int) -> float:  # type: ignore[no-untyped-def]
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+def run(number: int = 10000) -> Dict[str, float]:
+    """Seconds per call"""
+    app = App(env=AppEnv.SANDBOX, consumer_key="", consumer_secret="")
+    stkpush = _PayloadOnly(app, access_token="token")
+    response: Any = _Response()
+
+    def build_payload() -> Any:
+        return stkpush.process_request(
+            business_short_code="174379",
+            transaction_type=TransactionType.CUSTOMER_PAY_BILL_ONLINE,
+            amount="1",
+            phone_number="254708374149",
+            call_back_url="https://mydomain.com/stk",
+            account_reference="Test",
+            transaction_desc="Test",
+            pass_key=PASS_KEY,
+        )
+
+    payload = build_payload()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = pathlib.Path(tmp) / "cert.cer"
+        _write_certificate(path)
+        return {
+            "stkpush_payload": _per_call(build_payload, number),
+            "encode_payload": _per_call(
+                lambda: app.json_backend.dumps(payload), number
+            ),
+            "build_result": _per_call(
+                lambda: stkpush._build_result(
+                    response, STKPushResult, STKPushErrorResult
+                ),
+                number,
+            ),
+            "generate_password": _per_call(
+                lambda: generate_password(
+                    business_short_code="174379",
+                    pass_key=PASS_KEY,
+                    timestamp="20160216165627",
+                ),
+                number,
+            ),
+            "generate_security_credential": _per_call(
+                lambda: generate_security_credential("password", path),
+                max(number // 50, 1),
+            ),
+        }
+
+
+if __name__ == "__main__":
+    json.dump({k: f"{v * 1e6:.1f}us" for k, v in run().items()}, sys.stdout, indent=2)
+    print()
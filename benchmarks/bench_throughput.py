@@ -0,0 +1,98 @@
+"""
+End to end calls per second against the local Daraja simulator, for a new
+connection per call, the app's pooled session from a thread pool and the
+pooled async client. The simulator runs in its own process so that it does
+not compete with the client for the GIL.
+
+    $ python benchmarks/bench_throughput.py
+"""
+
+import asyncio
+import contextlib
+import json
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator
+
+from mpesa_connect import App, AppEnv, AsyncSTKPush, STKPush
+
+QUERY = {
+    "business_short_code": "174379",
+    "checkout_request_id": "ws_CO_13012021093521236557",
+    "password": "password",
+    "timestamp": "20160216165627",
+}
+
+
+@contextlib.contextmanager
+def simulator(*args: str) -> Iterator[str]:
+    """Run `python -m mpesa_connect.simulator` and yield its URL"""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "mpesa_connect.simulator", "--port", "0", *args],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        assert process.stdout is not None
+        yield process.stdout.readline().split()[-1]
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def _app(url: str, **kwargs: Any) -> App:
+    return App(
+        env=AppEnv.SANDBOX,
+        consumer_key="key",
+        consumer_secret="secret",
+        base_url=url,
+        **kwargs,
+    )
+
+
+def _sync(url: str, requests: int, concurrency: int, **kwargs: Any) -> float:
+    with _app(url, pool_maxsize=concurrency, **kwargs) as app:
+        stkpush = STKPush(app)
+        stkpush.query(**QUERY)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            for _ in executor.map(lambda _: stkpush.query(**QUERY), range(requests)):
+                pass
+        return requests / (time.perf_counter() - started)
+
+
+def _async(url: str, requests: int, concurrency: int) -> float:
+    async def main() -> float:
+        async with _app(url, pool_maxsize=concurrency) as app:
+            stkpush = AsyncSTKPush(app)
+            await stkpush.query(**QUERY)
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def query() -> None:
+                async with semaphore:
+                    await stkpush.query(**QUERY)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(query() for _ in range(requests)))
+            return requests / (time.perf_counter() - started)
+
+    return asyncio.run(main())
+
+
+def run(
+    requests: int = 1000, concurrency: int = 16, latency: float = 0.01
+) -> Dict[str, float]:
+    """Calls per second"""
+    with simulator("--latency", str(latency)) as url:
+        return {
+            "sync_unpooled": _sync(url, requests, concurrency, keep_alive=False),
+            "sync_pooled": _sync(url, requests, concurrency),
+            "async_pooled": _async(url, requests, concurrency),
+        }
+
+
+if __name__ == "__main__":
+    json.dump({k: f"{v:.0f}/s" for k, v in run().items()}, sys.stdout, indent=2)
+    print()
@@ -0,0 +1,111 @@
+"""
+Run every benchmark and write the results as JSON, optionally comparing them
+with a previous run to catch regressions.
+
+    $ python benchmarks/run.py --output results.json
+    $ python benchmarks/run.py --compare results.json --threshold 0.2
+
+Exits with status 1 when a benchmark regressed by more than the threshold.
+"""
+
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import sys
+from typing import Any, Callable, Dict, Tuple
+
+import bench_credentials
+import bench_import
+import bench_memory
+import bench_overhead
+import bench_throughput
+
+# Name: (run, unit, higher is better)
+BENCHMARKS: Dict[str, Tuple[Callable[[], Dict[str, float]], str, bool]] = {
+    "overhead": (bench_overhead.run, "s/call", False),
+    "credentials": (bench_credentials.run, "s/call", False),
+    "throughput": (bench_throughput.run, "calls/s", True),
+    "memory": (bench_memory.run, "bytes/call", False),
+    "import": (bench_import.run, "s", False),
+}
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run(names: Any = None) -> Dict[str, Any]:
+    results = {}
+    for name, (bench, unit, higher_is_better) in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        print(f"Running {name}", file=sys.stderr)
+        for key, value in bench().items():
+            results[f"{name}.{key}"] = {
+                "value": value,
+                "unit": unit,
+                "higher_is_better": higher_is_better,
+            }
+    return {
+        "commit": _commit(),
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def compare(
+    baseline: Dict[str, Any], current: Dict[str, Any], threshold: float
+) -> bool:
+    """Print the change of every result, returns whether any regressed"""
+    regressed = False
+    for key, result in current["results"].items():
+        previous = baseline["results"].get(key)
+        if not previous or not previous["value"]:
+            continue
+        change = result["value"] / previous["value"] - 1
+        worse = -change if result["higher_is_better"] else change
+        flag = ""
+        if worse > threshold:
+            regressed = True
+            flag = "  REGRESSION"
+        print(f"{key:45} {change:+8.1%}{flag}", file=sys.stderr)
+    return regressed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "benchmarks", nargs="*", help=f"Any of {', '.join(BENCHMARKS)}, all by default"
+    )
+    parser.add_argument("--output", help="Write the results to this file")
+    parser.add_argument("--compare", help="Results file of a previous run")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+    current = run(args.benchmarks)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2)
+    else:
+        json.dump(current, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(baseline, current, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
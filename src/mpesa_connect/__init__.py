@@ -5,9 +5,47 @@ from .account_balance import (
     AccountBalanceErrorResult,
     AccountBalanceResult,
 )
+from .aio import (
+    AsyncAccountBalance,
+    AsyncB2C,
+    AsyncC2B,
+    AsyncOAuth,
+    AsyncQRCode,
+    AsyncReversal,
+    AsyncSTKPush,
+    AsyncTokenProvider,
+    AsyncTransactionStatus,
+)
 from .app import App, AppEnv
-from .authorization import OAuth, OAuthErrorResult, OAuthResult
+from .authorization import OAuth, OAuthErrorResult, OAuthResult, TokenProvider
+from .base import ResponseInfo
 from .b2c import B2C, B2CErrorResult, B2CResult
+from .bulk import (
+    BulkDisbursement,
+    BulkQRCode,
+    BulkReversal,
+    BulkStats,
+    DisbursementOutcome,
+    QRCodeOutcome,
+    QRCodeStats,
+    ReversalOutcome,
+    ReversalStats,
+)
+from .balance import BalanceCache, BalanceSnapshot
+from .callbacks import (
+    AccountBalanceCallback,
+    AccountBalanceRecord,
+    B2CCallback,
+    C2BConfirmationCallback,
+    C2BValidationCallback,
+    Callback,
+    CallbackApp,
+    ReversalCallback,
+    STKPushCallback,
+    TransactionStatusCallback,
+    parse_account_balance,
+    parse_callback,
+)
 from .c2b import (
     C2B,
     C2BErrorResult,
@@ -15,8 +53,43 @@ from .c2b import (
     C2BSimulateErrorResult,
     C2BSimulateResult,
 )
-from .enums import CommandID, IdentifierType, ResponseType, TransactionType, TrxCode
-from .qrcode import QRCode, QRCodeErrorResult, QRCodeResult
+from .circuitbreaker import CircuitBreaker, CircuitBreakers, CircuitState
+from .correlation import (
+    Correlation,
+    CorrelationStore,
+    InMemoryCorrelationStore,
+    SQLiteCorrelationStore,
+)
+from .credentials import SecurityCredentialProvider
+from .enums import (
+    CallbackType,
+    CommandID,
+    IdentifierType,
+    ResponseType,
+    TransactionType,
+    TrxCode,
+    ValidationResultCode,
+)
+from .exceptions import (
+    AuthorizationError,
+    CircuitOpenError,
+    MpesaConnectError,
+    MpesaTimeoutError,
+)
+from .instrumentation import Metrics, OpenTelemetryMetrics, PrometheusMetrics
+from .json_backend import JSONBackend, get_json_backend
+from .outbox import Outbox, OutboxEntry, OutboxStatus
+from .poller import PollOutcome, STKPushPoller
+from .qrcode import QRCode, QRCodeCache, QRCodeErrorResult, QRCodeResult
+from .ratelimit import AdaptiveRateLimiter, RateLimiter, RateLimits
+from .reconciliation import (
+    MatchStatus,
+    Reconciler,
+    ReconciliationRecord,
+    hash_msisdn,
+)
+from .retry import RetryPolicy
+from .routing import EndpointRouter
 from .reversal import Reversal, ReversalErrorResult, ReversalResult
 from .stkpush import (
     STKPush,
@@ -25,46 +98,121 @@ from .stkpush import (
     STKPushQueryResult,
     STKPushResult,
 )
+from .tenants import Tenant, TenantConfig, TenantRegistry
 from .transaction_status import (
     TransactionStatus,
     TransactionStatusErrorResult,
     TransactionStatusResult,
 )
+from .validation import C2BValidator, ValidationRules
 
 __all__: List[str] = [
     "AccountBalance",
+    "AccountBalanceCallback",
     "AccountBalanceErrorResult",
+    "AccountBalanceRecord",
     "AccountBalanceResult",
+    "AdaptiveRateLimiter",
     "App",
     "AppEnv",
+    "AsyncAccountBalance",
+    "AsyncB2C",
+    "AsyncC2B",
+    "AsyncOAuth",
+    "AsyncQRCode",
+    "AsyncReversal",
+    "AsyncSTKPush",
+    "AsyncTokenProvider",
+    "AsyncTransactionStatus",
+    "AuthorizationError",
     "B2C",
+    "BalanceCache",
+    "BalanceSnapshot",
+    "B2CCallback",
     "B2CErrorResult",
     "B2CResult",
+    "BulkDisbursement",
+    "BulkQRCode",
+    "BulkReversal",
+    "BulkStats",
     "C2B",
+    "C2BConfirmationCallback",
     "C2BResult",
     "C2BErrorResult",
     "C2BSimulateResult",
     "C2BSimulateErrorResult",
+    "C2BValidationCallback",
+    "C2BValidator",
+    "Callback",
+    "CallbackApp",
+    "CallbackType",
+    "CircuitBreaker",
+    "CircuitBreakers",
+    "CircuitOpenError",
+    "CircuitState",
     "CommandID",
+    "Correlation",
+    "CorrelationStore",
+    "DisbursementOutcome",
+    "EndpointRouter",
     "IdentifierType",
+    "InMemoryCorrelationStore",
+    "JSONBackend",
+    "MatchStatus",
+    "Metrics",
+    "MpesaConnectError",
+    "MpesaTimeoutError",
     "OAuth",
     "OAuthResult",
     "OAuthErrorResult",
+    "OpenTelemetryMetrics",
+    "Outbox",
+    "OutboxEntry",
+    "OutboxStatus",
+    "PollOutcome",
+    "PrometheusMetrics",
     "QRCode",
+    "QRCodeCache",
+    "QRCodeOutcome",
     "QRCodeResult",
     "QRCodeErrorResult",
+    "QRCodeStats",
+    "RateLimiter",
+    "RateLimits",
+    "Reconciler",
+    "ReconciliationRecord",
+    "ResponseInfo",
     "ResponseType",
+    "RetryPolicy",
     "Reversal",
+    "ReversalCallback",
+    "ReversalOutcome",
     "ReversalResult",
+    "ReversalStats",
     "ReversalErrorResult",
+    "SQLiteCorrelationStore",
+    "SecurityCredentialProvider",
     "STKPush",
+    "STKPushCallback",
     "STKPushErrorResult",
+    "STKPushPoller",
     "STKPushQueryErrorResult",
     "STKPushQueryResult",
     "STKPushResult",
+    "Tenant",
+    "TenantConfig",
+    "TenantRegistry",
+    "TokenProvider",
     "TransactionStatus",
+    "TransactionStatusCallback",
     "TransactionStatusResult",
     "TransactionStatusErrorResult",
     "TransactionType",
     "TrxCode",
+    "ValidationResultCode",
+    "ValidationRules",
+    "get_json_backend",
+    "hash_msisdn",
+    "parse_account_balance",
+    "parse_callback",
 ]
@@ -1,15 +1,16 @@
 from dataclasses import dataclass
 from typing import Optional, Union
 
-import requests
-
 from .base import API, ErrorResult, Result
 from .enums import CommandID, IdentifierType
+from .timeouts import Timeout
 from .urls import PATH_ACCOUNTBALANCE_QUERY
 
 
 @dataclass
 class AccountBalanceResult(Result):
+    correlation_key = "conversation_id"
+
     originator_conversation_id: str
     conversation_id: str
     response_code: str
@@ -34,6 +35,7 @@ class AccountBalance(API):
         result_url: str,
         command_id: Union[CommandID, str] = CommandID.ACCOUNT_BALANCE,
         access_token: Optional[str] = None,
+        timeout: Optional[Timeout] = None,
     ) -> Union[AccountBalanceResult, AccountBalanceErrorResult]:
         payload = {
             "Initiator": initiator,
@@ -51,12 +53,11 @@ class AccountBalance(API):
             "QueueTimeOutURL": queue_time_out_url,
             "ResultURL": result_url,
         }
-        response = requests.post(
-            self.get_url(PATH_ACCOUNTBALANCE_QUERY),
-            headers={"Authorization": f"Bearer {access_token or self.access_token}"},
-            json=payload,
+        return self._post(
+            PATH_ACCOUNTBALANCE_QUERY,
+            payload,
+            AccountBalanceResult,
+            AccountBalanceErrorResult,
+            access_token=access_token,
+            timeout=timeout,
         )
-        result_dict = self._make_result(response)
-        if response.status_code != 200:
-            return AccountBalanceErrorResult(**result_dict)
-        return AccountBalanceResult(**result_dict)
@@ -0,0 +1,368 @@
+"""
+Asyncio counterparts of the API classes.
+
+Each async class reuses the payload building of its sync counterpart and only
+swaps the transport for the app's pooled `httpx.AsyncClient`, so every API
+method returns an awaitable instead of a result.
+"""
+
+import asyncio
+import logging
+import time
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Optional,
+    Type,
+    Union,
+)
+
+from .account_balance import (
+    AccountBalance,
+    AccountBalanceErrorResult,
+    AccountBalanceResult,
+)
+from .app import App, to_httpx_timeout
+from .authorization import OAuth, OAuthErrorResult, OAuthResult
+from .b2c import B2C, B2CErrorResult, B2CResult
+from .base import API, E, R, Result
+from .c2b import (
+    C2B,
+    C2BErrorResult,
+    C2BResult,
+    C2BSimulateErrorResult,
+    C2BSimulateResult,
+)
+from .exceptions import AuthorizationError, MpesaTimeoutError
+from .qrcode import QRCode, QRCodeErrorResult, QRCodeResult
+from .retry import is_timeout_error
+from .reversal import Reversal, ReversalErrorResult, ReversalResult
+from .stkpush import (
+    STKPush,
+    STKPushErrorResult,
+    STKPushQueryErrorResult,
+    STKPushQueryResult,
+    STKPushResult,
+)
+from .transaction_status import (
+    TransactionStatus,
+    TransactionStatusErrorResult,
+    TransactionStatusResult,
+)
+from .timeouts import Budget, Timeout
+from .urls import PATH_OAUTH_GENERATE
+
+if TYPE_CHECKING:
+    import httpx
+
+    from .outbox import Outbox
+
+_logger = logging.getLogger(__name__)
+
+
+class AsyncAPI(API):
+    async def _request(  # type: ignore[override]
+        self, method: str, path: str, **kwargs: Any
+    ) -> "httpx.Response":
+        if "timeout" in kwargs:
+            kwargs["timeout"] = to_httpx_timeout(kwargs["timeout"])
+        await self.app.rate_limits.acquire_async(path)
+        circuit = self._acquire_circuit(path)
+        sent_at = time.monotonic()
+        try:
+            response = await self._route(method, path, kwargs)
+        except Exception as e:
+            self._record_circuit(circuit, e, sent_at)
+            raise
+        self._record_circuit(circuit, response, sent_at)
+        return response
+
+    async def _route(  # type: ignore[override]
+        self, method: str, path: str, kwargs: Dict[str, Any]
+    ) -> "httpx.Response":
+        router = self.app.router
+        for endpoints_left in reversed(range(len(router))):
+            url = self.get_url(path)
+            started_at = self._request_started(method, path, kwargs)
+            try:
+                response = await self.app.async_client.request(method, url, **kwargs)
+            except Exception as e:
+                self._request_finished(method, path, started_at, None, e)
+                if not self._failover(url, e, endpoints_left):
+                    raise
+            else:
+                self._request_finished(method, path, started_at, response, None)
+                router.report_success(url)
+                return response
+        raise AssertionError("unreachable")
+
+    async def _send(  # type: ignore[override]
+        self,
+        path: str,
+        payload: Dict[str, Any],
+        access_token: Optional[str],
+        budget: Budget,
+    ) -> "httpx.Response":
+        body = self.app.json_backend.dumps(payload)
+        token = access_token or self.access_token
+        managed = token is None
+        if managed:
+            token = await self.app.async_token_provider.get_token(budget=budget)
+        response = await self._request(
+            "POST",
+            path,
+            headers={
+                "Authorization": f"Bearer {token}",
+                "Content-Type": "application/json",
+            },
+            content=body,
+            timeout=budget.request_timeout(),
+        )
+        if managed and response.status_code == 401:
+            # The cached token was revoked early, get a fresh one and try again
+            self.app.async_token_provider.invalidate(token)
+            token = await self.app.async_token_provider.get_token(budget=budget)
+            response = await self._request(
+                "POST",
+                path,
+                headers={
+                    "Authorization": f"Bearer {token}",
+                    "Content-Type": "application/json",
+                },
+                content=body,
+                timeout=budget.request_timeout(),
+            )
+        return response
+
+    async def _post_recorded(  # type: ignore[override]
+        self,
+        outbox: "Outbox",
+        path: str,
+        payload: Dict[str, Any],
+        execute: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        key = await outbox.record_async(path, payload)
+        try:
+            result = await execute()
+        except Exception as e:
+            await outbox.failed_async(key, e)
+            raise
+        await outbox.sent_async(key, result)
+        return result
+
+    async def _execute(  # type: ignore[override]
+        self,
+        path: str,
+        send: Callable[[], Awaitable["httpx.Response"]],
+        result_class: Type[R],
+        error_result_class: Type[E],
+        budget: Budget,
+    ) -> Union[R, E]:
+        policy = self.retry_policy or self.app.retry_policy
+        started_at = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = await send()
+            except Exception as e:
+                delay = self._retry_delay(policy, path, attempt, started_at, budget, e)
+                if delay is None:
+                    if is_timeout_error(e):
+                        raise MpesaTimeoutError(f"{path} timed out: {e}") from e
+                    raise
+                _logger.warning("%s failed with %r, retrying in %.2fs", path, e, delay)
+            else:
+                result, error = self._decode_result(
+                    response, result_class, error_result_class
+                )
+                self._observe(path, result)
+                delay = self._retry_delay(
+                    policy, path, attempt, started_at, budget, result
+                )
+                if delay is None:
+                    if error is not None:
+                        raise error
+                    return await self._track_async(path, result)
+                _logger.warning(
+                    "%s failed with status %s, retrying in %.2fs",
+                    path,
+                    response.status_code,
+                    delay,
+                )
+            await asyncio.sleep(delay)
+
+    async def _track_async(self, path: str, result: Union[R, E]) -> Union[R, E]:
+        store = self.app.correlation_store
+        if store is not None and isinstance(result, Result):
+            # Stores may write to disk, keep that off the event loop
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._correlate, store, path, result)
+        return result
+
+
+class AsyncOAuth(AsyncAPI, OAuth):
+    async def generate(  # type: ignore[override]
+        self, *, timeout: Optional[Timeout] = None
+    ) -> Union[OAuthResult, OAuthErrorResult]:
+        return await self._generate(self._budget(timeout))
+
+    async def _generate(  # type: ignore[override]
+        self, budget: Budget
+    ) -> Union[OAuthResult, OAuthErrorResult]:
+        return await self._execute(
+            PATH_OAUTH_GENERATE,
+            lambda: self._request(
+                "GET",
+                PATH_OAUTH_GENERATE,
+                params={"grant_type": "client_credentials"},
+                auth=(self.app.consumer_key, self.app.consumer_secret),
+                timeout=budget.request_timeout(),
+            ),
+            OAuthResult,
+            OAuthErrorResult,
+            budget,
+        )
+
+
+class AsyncTokenProvider:
+    """
+    Async counterpart of `TokenProvider`.
+
+    Concurrent coroutines share a single in-flight refresh.
+    """
+
+    def __init__(
+        self,
+        app: App,
+        /,
+        *,
+        refresh_margin: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.app = app
+        self.refresh_margin = refresh_margin
+        self._clock = clock
+        self._oauth = AsyncOAuth(app)
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._refreshing: Optional["asyncio.Future[str]"] = None
+
+    async def get_token(self, *, budget: Optional[Budget] = None) -> str:
+        token, now = self._token, self._clock()
+        if token is not None and now < self._expires_at - self.refresh_margin:
+            return token
+        refreshing = self._start_refresh(budget)
+        if token is not None and now < self._expires_at:
+            # Still valid, let the refresh complete in the background
+            return token
+        return await self._wait(refreshing, budget)
+
+    async def refresh(self, *, budget: Optional[Budget] = None) -> str:
+        return await self._wait(self._start_refresh(budget), budget)
+
+    def _start_refresh(self, budget: Optional[Budget]) -> "asyncio.Future[str]":
+        if self._refreshing is None:
+            self._refreshing = asyncio.ensure_future(self._refresh(budget))
+            self._refreshing.add_done_callback(_consume_exception)
+        return self._refreshing
+
+    async def _wait(
+        self, refreshing: "asyncio.Future[str]", budget: Optional[Budget]
+    ) -> str:
+        remaining = budget.remaining() if budget is not None else None
+        try:
+            return await asyncio.wait_for(asyncio.shield(refreshing), remaining)
+        except asyncio.TimeoutError as e:
+            raise MpesaTimeoutError("Deadline exceeded waiting for access token") from e
+
+    def invalidate(self, token: Optional[str] = None) -> None:
+        """Drop the cached token, or only `token` if it is still the cached one"""
+        if token is None or token == self._token:
+            self._token = None
+            self._expires_at = 0.0
+
+    async def _refresh(self, budget: Optional[Budget]) -> str:
+        try:
+            result = await self._oauth._generate(budget or self._oauth._budget(None))
+            self.app.metrics.token_refresh(result.status_ok)
+            if not result.status_ok:
+                raise AuthorizationError(result)
+            self._token = result.access_token
+            self._expires_at = self._clock() + float(result.expires_in)
+            return self._token
+        finally:
+            self._refreshing = None
+
+
+def _consume_exception(future: "asyncio.Future[Any]") -> None:
+    # Background refreshes are awaited by nobody when they fail
+    if not future.cancelled() and future.exception() is not None:
+        _logger.warning("Refreshing the access token failed: %r", future.exception())
+
+
+class AsyncSTKPush(AsyncAPI, STKPush):
+    if TYPE_CHECKING:
+
+        async def process_request(  # type: ignore[override]
+            self, **kwargs: Any
+        ) -> Union[STKPushResult, STKPushErrorResult]: ...
+
+        async def query(  # type: ignore[override]
+            self, **kwargs: Any
+        ) -> Union[STKPushQueryResult, STKPushQueryErrorResult]: ...
+
+
+class AsyncC2B(AsyncAPI, C2B):
+    if TYPE_CHECKING:
+
+        async def register_url(  # type: ignore[override]
+            self, **kwargs: Any
+        ) -> Union[C2BResult, C2BErrorResult]: ...
+
+        async def simulate(  # type: ignore[override]
+            self, **kwargs: Any
+        ) -> Union[C2BSimulateResult, C2BSimulateErrorResult]: ...
+
+
+class AsyncB2C(AsyncAPI, B2C):
+    if TYPE_CHECKING:
+
+        async def payment_request(  # type: ignore[override]
+            self, **kwargs: Any
+        ) -> Union[B2CResult, B2CErrorResult]: ...
+
+
+class AsyncAccountBalance(AsyncAPI, AccountBalance):
+    if TYPE_CHECKING:
+
+        async def query(  # type: ignore[override]
+            self, **kwargs: Any
+        ) -> Union[AccountBalanceResult, AccountBalanceErrorResult]: ...
+
+
+class AsyncTransactionStatus(AsyncAPI, TransactionStatus):
+    if TYPE_CHECKING:
+
+        async def query(  # type: ignore[override]
+            self, **kwargs: Any
+        ) -> Union[TransactionStatusResult, TransactionStatusErrorResult]: ...
+
+
+class AsyncReversal(AsyncAPI, Reversal):
+    if TYPE_CHECKING:
+
+        async def request(  # type: ignore[override]
+            self, **kwargs: Any
+        ) -> Union[ReversalResult, ReversalErrorResult]: ...
+
+
+class AsyncQRCode(AsyncAPI, QRCode):
+    if TYPE_CHECKING:
+
+        async def generate(  # type: ignore[override]
+            self, **kwargs: Any
+        ) -> Union[QRCodeResult, QRCodeErrorResult]: ...
@@ -1,8 +1,41 @@
+import asyncio
+import logging
+import threading
 from enum import Enum
-from typing import Any, Literal, Union
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Literal,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Union,
+)
 
+import requests
+from requests.adapters import HTTPAdapter
+
+from .circuitbreaker import CircuitBreakers
+from .instrumentation import Metrics, default_hooks
+from .json_backend import JSONBackend, get_json_backend
+from .ratelimit import RateLimiter, RateLimits
+from .retry import RetryPolicy
+from .routing import EndpointRouter
+from .timeouts import DEFAULT_TIMEOUT, Timeout
 from .urls import LIVE_URL, SANDBOX_URL
 
+if TYPE_CHECKING:
+    import httpx
+
+    from .aio import AsyncTokenProvider
+    from .authorization import TokenProvider
+    from .correlation import CorrelationStore
+    from .outbox import Outbox
+
+_logger = logging.getLogger(__name__)
+
 
 class AppEnv(Enum):
     LIVE = LIVE_URL
@@ -16,14 +49,235 @@ class App:
         env: Union[AppEnv, Literal["sandbox", "live"]],
         consumer_key: str,
         consumer_secret: str,
+        base_url: Optional[Union[str, Sequence[str], EndpointRouter]] = None,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        pool_block: bool = False,
+        keep_alive: bool = True,
+        timeout: Optional[Timeout] = DEFAULT_TIMEOUT,
+        deadline: Optional[float] = None,
+        token_provider: Optional["TokenProvider"] = None,
+        rate_limit: Optional[Union[float, RateLimiter]] = None,
+        path_rate_limits: Optional[Mapping[str, Union[float, RateLimiter]]] = None,
+        adaptive_rate_limit: bool = True,
+        retry_policy: Optional[RetryPolicy] = None,
+        correlation_store: Optional["CorrelationStore"] = None,
+        json_backend: Optional[Union[str, JSONBackend]] = None,
+        retain_response: bool = True,
+        metrics: Optional[Metrics] = None,
+        hooks: Optional[Mapping[str, Sequence[Callable[..., Any]]]] = None,
+        circuit_breakers: Optional[CircuitBreakers] = None,
+        outbox: Optional["Outbox"] = None,
     ) -> None:
+        """
+        Args:
+            env: The Daraja environment to connect to
+            consumer_key (str): The app consumer key
+            consumer_secret (str): The app consumer secret
+            base_url: Send requests here instead of the `env` URL, e.g. a proxy
+                or a local `DarajaSimulator`. Several URLs, or an
+                `EndpointRouter`, spread requests over them with failover
+            pool_connections (int): Number of per-host connection pools to cache
+            pool_maxsize (int): Maximum number of connections kept alive per host
+            pool_block (bool): Block when the pool is exhausted instead of opening
+                a throwaway connection
+            keep_alive (bool): Reuse connections across calls
+            timeout: Default `(connect, read)` timeout in seconds of every HTTP
+                request, or None to wait indefinitely
+            deadline (float): Seconds an API call may take in total, including
+                retries and token refresh
+            token_provider (TokenProvider): Supplies access tokens to API instances
+                created without one. Defaults to a cached `TokenProvider`
+            rate_limit: Maximum calls per second across all endpoints
+            path_rate_limits: Maximum calls per second keyed by endpoint path
+            adaptive_rate_limit (bool): Lower the rate limits when Daraja
+                throttles calls and recover them gradually afterwards
+            retry_policy (RetryPolicy): Default retry policy of API calls, no
+                retries are made when omitted
+            correlation_store (CorrelationStore): Records accepted requests so
+                that results can wait for their callbacks
+            json_backend: `orjson`, `ujson`, `json` or a `JSONBackend` used to
+                encode and decode bodies, defaults to the fastest installed
+            retain_response (bool): Keep the HTTP response on results. When
+                False results only hold a small `ResponseInfo` so response
+                bodies and headers can be freed, e.g. in bulk jobs
+            metrics (Metrics): Receives latency, response, retry and token
+                refresh events of every API call
+            hooks: `request` and `response` callables run around every HTTP
+                request, see `mpesa_connect.instrumentation`
+            circuit_breakers (CircuitBreakers): Fail calls to an endpoint fast
+                with `CircuitOpenError` while it is failing or slow
+            outbox (Outbox): Durably records money moving requests before they
+                are sent, so that they can be reconciled after a crash
+        """
         self.env = AppEnv[env.upper()] if isinstance(env, str) else env
         self.consumer_key = consumer_key
         self.consumer_secret = consumer_secret
+        if isinstance(base_url, EndpointRouter):
+            self.router = base_url
+        else:
+            self.router = EndpointRouter(
+                [base_url or self.env.value]
+                if base_url is None or isinstance(base_url, str)
+                else base_url
+            )
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.deadline = deadline
+        self._session: Optional[requests.Session] = None
+        self._token_provider = token_provider
+        self.rate_limits = RateLimits(
+            rate_limit, path_rate_limits, adaptive=adaptive_rate_limit
+        )
+        self.retry_policy = retry_policy
+        self.correlation_store = correlation_store
+        self.json_backend = (
+            json_backend
+            if isinstance(json_backend, JSONBackend)
+            else get_json_backend(json_backend)
+        )
+        self.retain_response = retain_response
+        self.metrics = metrics or Metrics()
+        self.hooks = default_hooks(hooks)
+        self.circuit_breakers = circuit_breakers
+        self.outbox = outbox
+        self._async_client: Optional["httpx.AsyncClient"] = None
+        self._async_token_provider: Optional["AsyncTokenProvider"] = None
+        self._closing: Set["asyncio.Task[None]"] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        """The base URL to send the next request to"""
+        return self.router.select()
+
+    @property
+    def session(self) -> requests.Session:
+        """The pooled HTTP session shared by every API bound to this app"""
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self._create_session()
+        return self._session
+
+    @property
+    def token_provider(self) -> "TokenProvider":
+        """The access token cache used when an API call has no explicit token"""
+        if self._token_provider is None:
+            from .authorization import TokenProvider
+
+            with self._lock:
+                if self._token_provider is None:
+                    self._token_provider = TokenProvider(self)
+        return self._token_provider
 
     @property
-    def base_url(self):
-        return self.env.value
+    def async_client(self) -> "httpx.AsyncClient":
+        """The pooled async HTTP client shared by every async API bound to this app"""
+        if self._async_client is None:
+            with self._lock:
+                if self._async_client is None:
+                    self._async_client = self._create_async_client()
+        return self._async_client
+
+    @property
+    def async_token_provider(self) -> "AsyncTokenProvider":
+        """The access token cache used by async API calls without an explicit token"""
+        if self._async_token_provider is None:
+            from .aio import AsyncTokenProvider
+
+            with self._lock:
+                if self._async_token_provider is None:
+                    self._async_token_provider = AsyncTokenProvider(self)
+        return self._async_token_provider
+
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block,
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        if not self.keep_alive:
+            session.headers["Connection"] = "close"
+        return session
+
+    def _create_async_client(self) -> "httpx.AsyncClient":
+        try:
+            import httpx
+        except ImportError as e:
+            _logger.error(str(e))
+            raise Exception(
+                "HTTPX library is not installed, please install with `pip install mpesa-connect[async]`"
+            ) from e
+        return httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.pool_maxsize if self.pool_block else None,
+                max_keepalive_connections=self.pool_maxsize if self.keep_alive else 0,
+            ),
+            timeout=to_httpx_timeout(self.timeout),
+        )
+
+    def close(self) -> None:
+        """
+        Close all pooled connections and stop health checks.
+
+        An async client is closed in the background when called from a running
+        event loop, use `aclose()` in async code to wait for it.
+        """
+        self.router.stop()
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+            client, self._async_client = self._async_client, None
+        if client is not None:
+            self._close_async_client(client)
+
+    async def aclose(self) -> None:
+        """Close all pooled connections, including those of the async client"""
+        with self._lock:
+            client, self._async_client = self._async_client, None
+        self.close()
+        if client is not None:
+            await client.aclose()
+
+    def _close_async_client(self, client: "httpx.AsyncClient") -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is not None:
+            task = loop.create_task(client.aclose())
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+            return
+        try:
+            asyncio.run(client.aclose())
+        except Exception as e:
+            # Its connections belong to an event loop that is already closed
+            _logger.warning(
+                "Async client connections could not be closed (%r), close the app"
+                " with `aclose()` before its event loop ends",
+                e,
+            )
+
+    async def __aenter__(self) -> "App":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.aclose()
+
+    def __enter__(self) -> "App":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
 
     @classmethod
     def create_sandbox(cls, **kwargs: Any) -> "App":
@@ -32,3 +286,12 @@ class App:
     @classmethod
     def create_live(cls, **kwargs: Any) -> "App":
         return cls(env=AppEnv.LIVE, **kwargs)
+
+
+def to_httpx_timeout(timeout: Optional[Timeout]) -> "httpx.Timeout":
+    import httpx
+
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+    return httpx.Timeout(timeout)
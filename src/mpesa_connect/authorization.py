@@ -1,13 +1,20 @@
+import logging
+import threading
+import time
 from dataclasses import dataclass
-from typing import Union
+from typing import Callable, Optional, Union
 
-import requests
 from requests.auth import HTTPBasicAuth
 
 from .app import App
 from .base import API, ErrorResult, Result
+from .exceptions import AuthorizationError, MpesaTimeoutError
+from .retry import RetryPolicy
+from .timeouts import Budget, Timeout
 from .urls import PATH_OAUTH_GENERATE
 
+_logger = logging.getLogger(__name__)
+
 
 @dataclass
 class OAuthResult(Result):
@@ -21,16 +28,116 @@ class OAuthErrorResult(ErrorResult):
 
 
 class OAuth(API):
-    def __init__(self, app: App, /):
-        self.app = app
+    def __init__(self, app: App, /, *, retry_policy: Optional[RetryPolicy] = None):
+        super().__init__(app, retry_policy=retry_policy)
 
-    def generate(self) -> Union[OAuthResult, OAuthErrorResult]:
-        response = requests.get(
-            self.get_url(PATH_OAUTH_GENERATE),
-            {"grant_type": "client_credentials"},
-            auth=HTTPBasicAuth(self.app.consumer_key, self.app.consumer_secret),
+    def generate(
+        self, *, timeout: Optional[Timeout] = None
+    ) -> Union[OAuthResult, OAuthErrorResult]:
+        return self._generate(self._budget(timeout))
+
+    def _generate(self, budget: Budget) -> Union[OAuthResult, OAuthErrorResult]:
+        return self._execute(
+            PATH_OAUTH_GENERATE,
+            lambda: self._request(
+                "GET",
+                PATH_OAUTH_GENERATE,
+                params={"grant_type": "client_credentials"},
+                auth=HTTPBasicAuth(self.app.consumer_key, self.app.consumer_secret),
+                timeout=budget.request_timeout(),
+            ),
+            OAuthResult,
+            OAuthErrorResult,
+            budget,
         )
-        result_dict = self._make_result(response)
-        if response.status_code != 200:
-            return OAuthErrorResult(**result_dict)
-        return OAuthResult(**result_dict)
+
+
+class TokenProvider:
+    """
+    Caches the app access token and refreshes it before it expires.
+
+    Concurrent callers share a single in-flight refresh. While a still valid
+    token is being refreshed ahead of expiry, other callers keep using it
+    instead of waiting, and it is still used when the refresh fails.
+    """
+
+    def __init__(
+        self,
+        app: App,
+        /,
+        *,
+        refresh_margin: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        Args:
+            app (App): The app to generate tokens for
+            refresh_margin (float): Seconds before expiry at which the token is refreshed
+            clock (Callable): Monotonic time source
+        """
+        self.app = app
+        self.refresh_margin = refresh_margin
+        self._clock = clock
+        self._oauth = OAuth(app)
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def get_token(self, *, budget: Optional[Budget] = None) -> str:
+        """
+        Args:
+            budget (Budget): Time allowed to wait for and make a refresh
+        """
+        token, now = self._token, self._clock()
+        if token is not None and now < self._expires_at - self.refresh_margin:
+            return token
+        if token is not None and now < self._expires_at:
+            # Still valid, refresh only if nobody else is already doing it
+            if not self._lock.acquire(blocking=False):
+                return token
+            try:
+                return self._refresh_locked(token, budget)
+            except Exception as e:
+                # Tried again by the next caller, the token is good until it expires
+                _logger.warning("Refreshing the access token failed: %r", e)
+                return token
+            finally:
+                self._lock.release()
+        self._acquire(budget)
+        try:
+            return self._refresh_locked(token, budget)
+        finally:
+            self._lock.release()
+
+    def refresh(self, *, budget: Optional[Budget] = None) -> str:
+        self._acquire(budget)
+        try:
+            return self._refresh_locked(self._token, budget)
+        finally:
+            self._lock.release()
+
+    def _acquire(self, budget: Optional[Budget]) -> None:
+        remaining = budget.remaining() if budget is not None else None
+        if not self._lock.acquire(
+            timeout=max(remaining, 0) if remaining is not None else -1
+        ):
+            raise MpesaTimeoutError("Deadline exceeded waiting for access token")
+
+    def invalidate(self, token: Optional[str] = None) -> None:
+        """Drop the cached token, or only `token` if it is still the cached one"""
+        with self._lock:
+            if token is None or token == self._token:
+                self._token = None
+                self._expires_at = 0.0
+
+    def _refresh_locked(self, stale: Optional[str], budget: Optional[Budget]) -> str:
+        if self._token is not None and self._token != stale:
+            # Refreshed by another caller while we waited for the lock
+            return self._token
+        result = self._oauth._generate(budget or self._oauth._budget(None))
+        self.app.metrics.token_refresh(result.status_ok)
+        if not result.status_ok:
+            raise AuthorizationError(result)
+        self._token = result.access_token
+        self._expires_at = self._clock() + float(result.expires_in)
+        return self._token
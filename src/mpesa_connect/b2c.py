@@ -1,15 +1,16 @@
 from dataclasses import dataclass
 from typing import Optional, Union
 
-import requests
-
 from .base import API, ErrorResult, Result
 from .enums import CommandID
+from .timeouts import Timeout
 from .urls import PATH_B2C_PAYMENTREQUEST
 
 
 @dataclass
 class B2CResult(Result):
+    correlation_key = "conversation_id"
+
     conversation_id: str
     originator_conversation_id: str
     response_code: str
@@ -37,6 +38,7 @@ class B2C(API):
         result_url: str,
         occassion: Optional[str] = None,
         access_token: Optional[str] = None,
+        timeout: Optional[Timeout] = None,
     ) -> Union[B2CResult, B2CErrorResult]:
         payload = {
             "OriginatorConversationID": originator_conversation_id,
@@ -53,12 +55,11 @@ class B2C(API):
             "ResultURL": result_url,
             "Occassion": occassion or "",
         }
-        response = requests.post(
-            self.get_url(PATH_B2C_PAYMENTREQUEST),
-            headers={"Authorization": f"Bearer {access_token or self.access_token}"},
-            json=payload,
+        return self._post(
+            PATH_B2C_PAYMENTREQUEST,
+            payload,
+            B2CResult,
+            B2CErrorResult,
+            access_token=access_token,
+            timeout=timeout,
         )
-        result_dict = self._make_result(response)
-        if response.status_code != 200:
-            return B2CErrorResult(**result_dict)
-        return B2CResult(**result_dict)
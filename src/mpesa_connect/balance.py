@@ -0,0 +1,160 @@
+"""
+Cached account balances, so that checking the float before a payout reads
+from memory instead of querying Daraja and waiting for the result callback.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Any, Callable, Dict, Mapping, Optional
+
+from .account_balance import AccountBalance
+from .callbacks import AccountBalanceCallback, AccountBalanceRecord
+from .enums import IdentifierType
+from .exceptions import MpesaConnectError
+
+_logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BalanceSnapshot:
+    shortcode: str
+    accounts: Dict[str, AccountBalanceRecord]
+    # `clock` time the balances were received at
+    fetched_at: float
+    # When Daraja took the balances, e.g. "20200109125710"
+    completed_time: Optional[str] = None
+
+    def available(self, account: str = "Working Account") -> Decimal:
+        """The available balance of `account`, zero if the short code has no such account"""
+        record = self.accounts.get(account)
+        return record.available_balance if record is not None else Decimal(0)
+
+
+class BalanceCache:
+    """
+    Keeps the latest balances of each short code for `max_age` seconds.
+
+    A lookup of a missing or stale snapshot queries Daraja and waits for the
+    result callback, which requires a `correlation_store` on the app that the
+    callback is resolved into. Concurrent lookups of a short code share one
+    outstanding query.
+    """
+
+    def __init__(
+        self,
+        account_balance: AccountBalance,
+        *,
+        defaults: Optional[Mapping[str, Any]] = None,
+        max_age: float = 60.0,
+        callback_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        Args:
+            account_balance (AccountBalance): Used to query the balances
+            defaults (Mapping): `AccountBalance.query` arguments of every query,
+                e.g. `initiator`, `security_credential` and `result_url`
+            max_age (float): Seconds a snapshot is served before it is refreshed
+            callback_timeout (float): Seconds to wait for the result callback
+            clock (Callable): Monotonic time source
+        """
+        self.account_balance = account_balance
+        self.defaults: Dict[str, Any] = {
+            "identifier_type": IdentifierType.ORGANIZATION_SHORT_CODE,
+            "remarks": "Balance",
+            **(defaults or {}),
+        }
+        self.max_age = max_age
+        self.callback_timeout = callback_timeout
+        self._clock = clock
+        self._snapshots: Dict[str, BalanceSnapshot] = {}
+        self._queries: Dict[str, "Future[BalanceSnapshot]"] = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self, shortcode: str, *, max_age: Optional[float] = None, **query: Any
+    ) -> BalanceSnapshot:
+        """
+        Args:
+            shortcode (str): The short code whose balances to get
+            max_age (float): Overrides the maximum age of a cached snapshot
+            query: `AccountBalance.query` arguments overriding `defaults`
+
+        Returns:
+            BalanceSnapshot: The cached balances, queried if missing or stale
+        """
+        shortcode = str(shortcode)
+        max_age = self.max_age if max_age is None else max_age
+        snapshot = self._snapshots.get(shortcode)
+        if snapshot is not None and self._clock() - snapshot.fetched_at < max_age:
+            return snapshot
+        with self._lock:
+            future = self._queries.get(shortcode)
+            leader = future is None
+            if future is None:
+                future = self._queries[shortcode] = Future()
+        if not leader:
+            return future.result()
+        try:
+            snapshot = self._query(shortcode, query)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(snapshot)
+            return snapshot
+        finally:
+            with self._lock:
+                del self._queries[shortcode]
+
+    def available(
+        self, shortcode: str, account: str = "Working Account", **query: Any
+    ) -> Decimal:
+        """The available balance of an account of `shortcode`"""
+        return self.get(shortcode, **query).available(account)
+
+    def update(
+        self, shortcode: str, callback: AccountBalanceCallback
+    ) -> BalanceSnapshot:
+        """Cache the balances of a callback, e.g. of a query made elsewhere"""
+        if not callback.status_ok:
+            raise MpesaConnectError(
+                f"Balance query of {shortcode} failed: {callback.result_code}"
+                f" {callback.result_desc}"
+            )
+        completed_time = callback.result_parameters.get("BOCompletedTime")
+        snapshot = BalanceSnapshot(
+            str(shortcode),
+            callback.accounts,
+            self._clock(),
+            None if completed_time is None else str(completed_time),
+        )
+        self._snapshots[snapshot.shortcode] = snapshot
+        return snapshot
+
+    def invalidate(self, shortcode: Optional[str] = None) -> None:
+        """Drop the snapshot of `shortcode`, or every snapshot, e.g. after a payout"""
+        if shortcode is None:
+            self._snapshots.clear()
+        else:
+            self._snapshots.pop(str(shortcode), None)
+
+    def _query(self, shortcode: str, query: Mapping[str, Any]) -> BalanceSnapshot:
+        arguments: Dict[str, Any] = {**self.defaults, "party_a": shortcode, **query}
+        result = self.account_balance.query(**arguments)
+        if not result.status_ok:
+            raise MpesaConnectError(
+                f"Balance query of {shortcode} failed: {result.error_code}"
+                f" {result.error_message}"
+            )
+        callback = result.wait_for_callback(self.callback_timeout)
+        if not isinstance(callback, AccountBalanceCallback):
+            raise MpesaConnectError(
+                f"Unexpected {type(callback).__name__} for balance query of {shortcode}"
+            )
+        _logger.debug("Balances of %s received", shortcode)
+        return self.update(shortcode, callback)
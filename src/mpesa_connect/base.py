@@ -1,24 +1,153 @@
 import logging
-from dataclasses import dataclass
-from typing import Any, Dict, Literal, Optional
-from urllib.parse import urljoin
+import time
+from dataclasses import dataclass, fields
+from types import MappingProxyType
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    ClassVar,
+    Dict,
+    FrozenSet,
+    Literal,
+    Mapping,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    get_origin,
+)
 
 import requests
 
 from .app import App
+from .callbacks import Callback
+from .circuitbreaker import CircuitBreaker, is_failure
+from .exceptions import MpesaConnectError, MpesaTimeoutError
+from .ratelimit import is_throttled
+from .retry import (
+    RetryPolicy,
+    is_connect_error,
+    is_timeout_error,
+    is_transient_error,
+)
+from .timeouts import Budget, Timeout
 from .utils import convert_to_snake_case
 
+if TYPE_CHECKING:
+    from .correlation import CorrelationStore
+    from .outbox import Outbox
+
 _logger = logging.getLogger(__name__)
 
 
+class ResponseInfo:
+    """Stands in for the HTTP response on results when responses are not retained"""
+
+    __slots__ = ("status_code", "url")
+
+    def __init__(self, status_code: int, url: str) -> None:
+        self.status_code = status_code
+        self.url = url
+
+    def __repr__(self) -> str:
+        return f"<ResponseInfo [{self.status_code}]>"
+
+
+_NO_EXTRA: Mapping[str, Any] = MappingProxyType({})
+
+
+def _namespace_annotations(namespace: Dict[str, Any]) -> Dict[str, Any]:
+    if "__annotations__" in namespace:
+        return namespace["__annotations__"]
+    try:
+        # Python 3.14+ evaluates annotations lazily
+        import annotationlib  # type: ignore[import]
+    except ImportError:
+        return {}
+    annotate = annotationlib.get_annotate_from_class_namespace(namespace)
+    if annotate is None:
+        return {}
+    return annotationlib.call_annotate_function(
+        annotate, annotationlib.Format.FORWARDREF
+    )
+
+
+class _Slotted(type):
+    """Gives every result class `__slots__` for its fields, to save memory per result"""
+
+    def __new__(mcls, name: str, bases: Tuple[type, ...], namespace: Dict[str, Any]):  # type: ignore[no-untyped-def]
+        fields = []
+        defaulted = False
+        for field, annotation in _namespace_annotations(namespace).items():
+            if get_origin(annotation) is ClassVar or annotation is ClassVar:
+                continue
+            if field in namespace:
+                # A slot would replace the default the dataclass reads from
+                # the class, these are kept in a `__dict__` instead
+                defaulted = True
+            else:
+                fields.append(field)
+        slots = tuple(fields) + tuple(namespace.get("__slots__", ()))
+        if defaulted and not any(base.__dictoffset__ for base in bases):
+            slots += ("__dict__",)
+        namespace["__slots__"] = slots
+        return super().__new__(mcls, name, bases, namespace)
+
+
+class _ResultBase(metaclass=_Slotted):
+    __slots__ = ("_extra",)
+
+    @property
+    def extra(self) -> Mapping[str, Any]:
+        """Response values that have no matching field"""
+        return getattr(self, "_extra", _NO_EXTRA)
+
+
 @dataclass
-class Result:
+class Result(_ResultBase):
+    __slots__ = ("_correlation_store",)
+
+    # The field holding the id Daraja repeats in the callback of the request
+    correlation_key: ClassVar[Optional[str]] = None
+
     response: requests.Response
     status_ok: Literal[True]
 
+    @property
+    def correlation_id(self) -> Optional[str]:
+        return getattr(self, self.correlation_key) if self.correlation_key else None
+
+    def wait_for_callback(self, timeout: Optional[float] = None) -> Callback:
+        """
+        Block until the callback of this request is received, requires a
+        `correlation_store` on the app
+
+        Args:
+            timeout (float): Seconds to wait before raising `MpesaTimeoutError`
+        """
+        store, correlation_id = self._correlation()
+        return store.wait(correlation_id, timeout)
+
+    async def wait_for_callback_async(
+        self, timeout: Optional[float] = None
+    ) -> Callback:
+        store, correlation_id = self._correlation()
+        return await store.wait_async(correlation_id, timeout)
+
+    def _correlation(self) -> Tuple["CorrelationStore", str]:
+        store = getattr(self, "_correlation_store", None)
+        correlation_id = self.correlation_id
+        if store is None or correlation_id is None:
+            raise MpesaConnectError(
+                f"{type(self).__name__} can not be correlated to a callback"
+            )
+        return store, correlation_id
+
 
 @dataclass
-class ErrorResult:
+class ErrorResult(_ResultBase):
     response: requests.Response
     status_ok: Literal[False]
     request_id: str
@@ -26,6 +155,10 @@ class ErrorResult:
     error_message: str
 
 
+R = TypeVar("R", bound=Result)
+E = TypeVar("E", bound=ErrorResult)
+
+
 class API:
     def __init__(
         self,
@@ -33,20 +166,368 @@ class API:
         /,
         *,
         access_token: Optional[str] = None,
+        retry_policy: Optional[RetryPolicy] = None,
     ) -> None:
         self.app = app
         self.access_token = access_token
+        self.retry_policy = retry_policy
 
     def get_url(self, path: str) -> str:
-        return urljoin(self.app.base_url, path)
+        return self.app.base_url + path
 
-    def _make_result(self, response: requests.Response) -> Dict[str, Any]:
+    def _request(self, method: str, path: str, **kwargs: Any) -> requests.Response:
+        kwargs.setdefault("timeout", self.app.timeout)
+        self.app.rate_limits.acquire(path)
+        # Acquired after any throttling delay, only the HTTP request is timed
+        circuit = self._acquire_circuit(path)
+        sent_at = time.monotonic()
         try:
-            json = response.json()
-        except requests.JSONDecodeError as e:
-            _logger.error(str(e))
-            raise e
-        result = {convert_to_snake_case(k): v for k, v in json.items()}
-        result["response"] = response
-        result["status_ok"] = response.status_code == 200
+            response = self._route(method, path, kwargs)
+        except Exception as e:
+            self._record_circuit(circuit, e, sent_at)
+            raise
+        self._record_circuit(circuit, response, sent_at)
+        return response
+
+    def _route(
+        self, method: str, path: str, kwargs: Dict[str, Any]
+    ) -> requests.Response:
+        router = self.app.router
+        for endpoints_left in reversed(range(len(router))):
+            url = self.get_url(path)
+            started_at = self._request_started(method, path, kwargs)
+            try:
+                response = self.app.session.request(method, url, **kwargs)
+            except Exception as e:
+                self._request_finished(method, path, started_at, None, e)
+                if not self._failover(url, e, endpoints_left):
+                    raise
+            else:
+                self._request_finished(method, path, started_at, response, None)
+                router.report_success(url)
+                return response
+        raise AssertionError("unreachable")
+
+    def _failover(self, url: str, error: BaseException, endpoints_left: int) -> bool:
+        # Requests that could not connect never reached Daraja, so they can be
+        # sent to another endpoint whatever the API
+        if not is_connect_error(error):
+            return False
+        self.app.router.report_failure(url)
+        if endpoints_left:
+            _logger.warning("%s failed with %r, trying another endpoint", url, error)
+        return endpoints_left > 0
+
+    def _request_started(self, method: str, path: str, kwargs: Dict[str, Any]) -> float:
+        for hook in self.app.hooks["request"]:
+            hook(method, path, kwargs)
+        self.app.metrics.request_started(path)
+        return time.perf_counter()
+
+    def _request_finished(
+        self,
+        method: str,
+        path: str,
+        started_at: float,
+        response: Any,
+        error: Optional[BaseException],
+    ) -> None:
+        elapsed = time.perf_counter() - started_at
+        self.app.metrics.request_finished(
+            path, elapsed, None if response is None else response.status_code
+        )
+        for hook in self.app.hooks["response"]:
+            hook(method, path, response, error, elapsed)
+
+    def _budget(self, timeout: Optional[Timeout]) -> Budget:
+        return Budget(
+            timeout if timeout is not None else self.app.timeout, self.app.deadline
+        )
+
+    def _post(
+        self,
+        path: str,
+        payload: Dict[str, Any],
+        result_class: Type[R],
+        error_result_class: Type[E],
+        *,
+        access_token: Optional[str] = None,
+        timeout: Optional[Timeout] = None,
+    ) -> Union[R, E]:
+        budget = self._budget(timeout)
+
+        def execute() -> Union[R, E]:
+            return self._execute(
+                path,
+                lambda: self._send(path, payload, access_token, budget),
+                result_class,
+                error_result_class,
+                budget,
+            )
+
+        outbox = self.app.outbox
+        if outbox is not None and path in outbox.paths:
+            return self._post_recorded(outbox, path, payload, execute)
+        return execute()
+
+    def _post_recorded(
+        self,
+        outbox: "Outbox",
+        path: str,
+        payload: Dict[str, Any],
+        execute: Callable[[], Any],
+    ) -> Any:
+        # Recorded before sending, a crash while in flight leaves it in doubt
+        key = outbox.record(path, payload)
+        try:
+            result = execute()
+        except Exception as e:
+            outbox.failed(key, e)
+            raise
+        outbox.sent(key, result)
+        return result
+
+    def _send(
+        self,
+        path: str,
+        payload: Dict[str, Any],
+        access_token: Optional[str],
+        budget: Budget,
+    ) -> requests.Response:
+        body = self.app.json_backend.dumps(payload)
+        token = access_token or self.access_token
+        managed = token is None
+        if managed:
+            token = self.app.token_provider.get_token(budget=budget)
+        response = self._request(
+            "POST",
+            path,
+            headers={
+                "Authorization": f"Bearer {token}",
+                "Content-Type": "application/json",
+            },
+            data=body,
+            timeout=budget.request_timeout(),
+        )
+        if managed and response.status_code == 401:
+            # The cached token was revoked early, get a fresh one and try again
+            self.app.token_provider.invalidate(token)
+            token = self.app.token_provider.get_token(budget=budget)
+            response = self._request(
+                "POST",
+                path,
+                headers={
+                    "Authorization": f"Bearer {token}",
+                    "Content-Type": "application/json",
+                },
+                data=body,
+                timeout=budget.request_timeout(),
+            )
+        return response
+
+    def _execute(
+        self,
+        path: str,
+        send: Callable[[], requests.Response],
+        result_class: Type[R],
+        error_result_class: Type[E],
+        budget: Budget,
+    ) -> Union[R, E]:
+        policy = self.retry_policy or self.app.retry_policy
+        started_at = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = send()
+            except Exception as e:
+                delay = self._retry_delay(policy, path, attempt, started_at, budget, e)
+                if delay is None:
+                    if is_timeout_error(e):
+                        raise MpesaTimeoutError(f"{path} timed out: {e}") from e
+                    raise
+                _logger.warning("%s failed with %r, retrying in %.2fs", path, e, delay)
+            else:
+                result, error = self._decode_result(
+                    response, result_class, error_result_class
+                )
+                self._observe(path, result)
+                delay = self._retry_delay(
+                    policy, path, attempt, started_at, budget, result
+                )
+                if delay is None:
+                    if error is not None:
+                        raise error
+                    return self._track(path, result)
+                _logger.warning(
+                    "%s failed with status %s, retrying in %.2fs",
+                    path,
+                    response.status_code,
+                    delay,
+                )
+            time.sleep(delay)
+
+    def _acquire_circuit(self, path: str) -> Optional[Tuple[CircuitBreaker, int]]:
+        breakers = self.app.circuit_breakers
+        if breakers is None:
+            return None
+        breaker = breakers.get(path)
+        return breaker, breaker.acquire()
+
+    def _record_circuit(
+        self,
+        circuit: Optional[Tuple[CircuitBreaker, int]],
+        outcome: Any,
+        sent_at: float,
+    ) -> None:
+        if circuit is None:
+            return
+        breaker, generation = circuit
+        if isinstance(outcome, BaseException) and not is_transient_error(outcome):
+            # e.g. a request hook failed, not this endpoint's fault
+            breaker.cancel(generation)
+        else:
+            breaker.record(generation, is_failure(outcome), time.monotonic() - sent_at)
+
+    def _retry_delay(
+        self,
+        policy: Optional[RetryPolicy],
+        path: str,
+        attempt: int,
+        started_at: float,
+        budget: Budget,
+        outcome: Any,
+    ) -> Optional[float]:
+        if policy is None:
+            return None
+        if isinstance(outcome, BaseException):
+            if not policy.should_retry_exception(path, outcome):
+                return None
+        elif not policy.should_retry_result(path, outcome):
+            return None
+        delay = policy.next_delay(attempt, started_at)
+        if delay is None or not budget.allows(delay):
+            return None
+        self.app.metrics.retry(path)
+        return delay
+
+    def _observe(self, path: str, result: Union[R, E]) -> None:
+        self.app.rate_limits.feedback(path, is_throttled(result))
+        self.app.metrics.result(
+            path, result.response.status_code, getattr(result, "error_code", None)
+        )
+
+    def _track(self, path: str, result: Union[R, E]) -> Union[R, E]:
+        store = self.app.correlation_store
+        if store is not None and isinstance(result, Result):
+            self._correlate(store, path, result)
         return result
+
+    def _correlate(self, store: "CorrelationStore", path: str, result: Result) -> None:
+        correlation_id = result.correlation_id
+        if correlation_id is None:
+            return
+        store.record(
+            correlation_id,
+            {
+                "path": path,
+                **{
+                    name: getattr(result, name)
+                    for name in _fields(type(result))
+                    if name not in ("response", "status_ok")
+                },
+            },
+        )
+        result._correlation_store = store  # type: ignore[attr-defined]
+
+    def _decode_result(
+        self,
+        response: Any,
+        result_class: Type[R],
+        error_result_class: Type[E],
+    ) -> Tuple[Union[R, E], Optional[ValueError]]:
+        try:
+            return self._build_result(response, result_class, error_result_class), None
+        except ValueError as e:
+            if response.status_code == 200:
+                raise
+            # e.g. the HTML page of a gateway, retried by its status like any
+            # error result and raised when it isn't retried
+            return (
+                self._build_result(response, result_class, error_result_class, {}),
+                e,
+            )
+
+    def _build_result(
+        self,
+        response: Any,
+        result_class: Type[R],
+        error_result_class: Type[E],
+        json: Optional[Dict[str, Any]] = None,
+    ) -> Union[R, E]:
+        status_ok = response.status_code == 200
+        cls: Type[Any] = result_class if status_ok else error_result_class
+        if json is None:
+            try:
+                json = self.app.json_backend.loads(response.content)
+            except ValueError as e:
+                _logger.error(str(e))
+                # The same error whatever the backend, as raised by `response.json()`
+                raise requests.JSONDecodeError(
+                    getattr(e, "msg", str(e)), response.text, getattr(e, "pos", 0)
+                ) from e
+        attributes = _attributes(cls)
+        values: Dict[str, Any] = {
+            "response": (
+                response
+                if self.app.retain_response
+                else ResponseInfo(response.status_code, str(response.url))
+            ),
+            "status_ok": status_ok,
+        }
+        extra = None
+        for key, value in json.items():
+            try:
+                attribute = attributes[key]
+            except KeyError:
+                attribute = attributes[key] = _attribute(cls, key)
+            if attribute is None:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+            else:
+                values[attribute] = value
+        if len(values) < len(_fields(cls)):
+            for name in _fields(cls):
+                values.setdefault(name, None)
+        result = cls(**values)
+        if extra is not None:
+            result._extra = extra
+        return result
+
+
+# Daraja key to result attribute, or None for keys without a field, per class
+_ATTRIBUTES: Dict[type, Dict[str, Optional[str]]] = {}
+
+
+def _attributes(cls: type) -> Dict[str, Optional[str]]:
+    try:
+        return _ATTRIBUTES[cls]
+    except KeyError:
+        return _ATTRIBUTES.setdefault(cls, {})
+
+
+def _attribute(cls: type, key: str) -> Optional[str]:
+    attribute = convert_to_snake_case(key)
+    return attribute if attribute in _fields(cls) else None
+
+
+# Field names per class
+_FIELDS: Dict[type, FrozenSet[str]] = {}
+
+
+def _fields(cls: type) -> FrozenSet[str]:
+    try:
+        return _FIELDS[cls]
+    except KeyError:
+        return _FIELDS.setdefault(cls, frozenset(f.name for f in fields(cls)))
@@ -0,0 +1,569 @@
+import base64
+import csv
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    ClassVar,
+    Dict,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    TextIO,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
+
+from .b2c import B2C, B2CErrorResult, B2CResult
+from .qrcode import QRCode, QRCodeCache, QRCodeErrorResult, qr_code_key
+from .ratelimit import RateLimiter
+from .reversal import Reversal, ReversalErrorResult, ReversalResult
+
+_logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+O = TypeVar("O")
+
+_END: Any = object()
+
+
+@dataclass
+class BulkStats:
+    submitted: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    errors: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+    finished_at: Optional[float] = None
+
+    @property
+    def completed(self) -> int:
+        return self.succeeded + self.failed + self.errors
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        """Completed calls per second"""
+        elapsed = self.elapsed
+        return self.completed / elapsed if elapsed > 0 else 0.0
+
+
+@dataclass
+class DisbursementOutcome:
+    payee: Dict[str, Any]
+    result: Optional[Union[B2CResult, B2CErrorResult]]
+    exception: Optional[BaseException] = None
+
+
+class BulkRunner(ABC, Generic[T, O]):
+    """
+    Runs a call per item with bounded concurrency and an optional rate ceiling,
+    yielding outcomes as they complete.
+
+    Items are pulled from the source lazily, at most `concurrency` ahead of the
+    running calls, so arbitrarily large streams can be processed. When the
+    consumer stops iterating early, calls already running are waited for and
+    counted in `stats` while calls not started yet are dropped.
+    """
+
+    stats_class: ClassVar[Type[BulkStats]] = BulkStats
+
+    def __init__(
+        self,
+        *,
+        concurrency: int = 8,
+        rate: Optional[Union[float, RateLimiter]] = None,
+    ) -> None:
+        """
+        Args:
+            concurrency (int): Maximum number of calls in flight
+            rate: Maximum calls per second, or a shared `RateLimiter`
+        """
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(rate) if isinstance(rate, (int, float)) else rate
+        self.stats = BulkStats()
+
+    def run(self, items: Iterable[T]) -> Iterator[O]:
+        self.stats = self.stats_class()
+        source = iter(items)
+        pending: Set["Future[O]"] = set()
+        ready: List["Future[O]"] = []
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            try:
+                while True:
+                    while len(pending) < self.concurrency * 2:
+                        item = next(source, _END)
+                        if item is _END:
+                            break
+                        pending.add(executor.submit(self._limited_call, item))
+                        self.stats.submitted += 1
+                    if not pending:
+                        break
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    ready.extend(done)
+                    while ready:
+                        outcome = ready.pop().result()
+                        self._complete(outcome)
+                        yield outcome
+            finally:
+                # When iteration stops early calls already made still complete,
+                # their outcomes are recorded but no longer yielded
+                ready.extend(f for f in pending if not f.cancel())
+                self._drain(ready)
+                self.stats.finished_at = time.monotonic()
+                _logger.info(
+                    "Bulk run completed %s of %s calls at %.1f/s",
+                    self.stats.completed,
+                    self.stats.submitted,
+                    self.stats.throughput,
+                )
+
+    def _drain(self, futures: List["Future[O]"]) -> None:
+        for future in futures:
+            try:
+                self._complete(future.result())
+            except Exception:
+                _logger.exception("Recording the outcome of a bulk call failed")
+
+    def _complete(self, outcome: O) -> None:
+        self._tally(outcome)
+        self._record(outcome)
+
+    def _record(self, outcome: O) -> None:
+        """Called with every outcome, including those completed after the run stopped"""
+
+    def _limited_call(self, item: T) -> O:
+        if self.limiter is not None:
+            self.limiter.acquire()
+        return self._call(item)
+
+    @abstractmethod
+    def _call(self, item: T) -> O: ...
+
+    @abstractmethod
+    def _tally(self, outcome: O) -> None: ...
+
+
+class BulkDisbursement(BulkRunner[Mapping[str, Any], DisbursementOutcome]):
+    """
+    Sends a B2C payment per payee.
+
+    Each payee is a mapping of `B2C.payment_request` arguments which are merged
+    over `defaults`. Payees without an `originator_conversation_id` are given a
+    random one.
+    """
+
+    def __init__(
+        self,
+        b2c: B2C,
+        *,
+        defaults: Optional[Mapping[str, Any]] = None,
+        concurrency: int = 8,
+        rate: Optional[Union[float, RateLimiter]] = None,
+    ) -> None:
+        super().__init__(concurrency=concurrency, rate=rate)
+        self.b2c = b2c
+        self.defaults = dict(defaults or {})
+
+    def _call(self, item: Mapping[str, Any]) -> DisbursementOutcome:
+        payee = {**self.defaults, **item}
+        payee.setdefault("originator_conversation_id", str(uuid.uuid4()))
+        try:
+            result = self.b2c.payment_request(**payee)
+        except Exception as e:
+            _logger.error(str(e))
+            return DisbursementOutcome(payee=payee, result=None, exception=e)
+        return DisbursementOutcome(payee=payee, result=result)
+
+    def _tally(self, outcome: DisbursementOutcome) -> None:
+        if outcome.result is None:
+            self.stats.errors += 1
+        elif outcome.result.status_ok:
+            self.stats.succeeded += 1
+        else:
+            self.stats.failed += 1
+
+
+@dataclass
+class ReversalStats(BulkStats):
+    # Items dropped because their transaction was already seen in the run
+    duplicates: int = 0
+    # Items dropped because the results file already has their outcome
+    resumed: int = 0
+    invalid: int = 0
+
+    @property
+    def completed(self) -> int:
+        return super().completed + self.invalid
+
+
+@dataclass
+class ReversalOutcome:
+    transaction: Dict[str, Any]
+    result: Optional[Union[ReversalResult, ReversalErrorResult]]
+    exception: Optional[BaseException] = None
+    # Why the transaction failed validation and was not sent
+    invalid: Optional[str] = None
+
+    @property
+    def status(self) -> str:
+        if self.invalid is not None:
+            return "invalid"
+        if self.result is None:
+            return "error"
+        return "accepted" if self.result.status_ok else "rejected"
+
+
+# M-Pesa transaction ids, e.g. "NLJ41HAY6Q"
+_TRANSACTION_ID = re.compile(r"[A-Z0-9]{10}")
+_RESULT_FIELDS = (
+    "transaction_id",
+    "amount",
+    "receiver_party",
+    "status",
+    "originator_conversation_id",
+    "conversation_id",
+    "error_code",
+    "error_message",
+)
+# Outcomes that are not retried when a run is resumed
+_FINAL_STATUSES = frozenset(["accepted", "rejected", "invalid"])
+
+ReversalItem = Union[Tuple[str, Union[str, int], Union[str, int]], Mapping[str, Any]]
+
+
+class BulkReversal(BulkRunner[Dict[str, Any], ReversalOutcome]):
+    """
+    Requests the reversal of a batch of transactions.
+
+    Each item is a `(transaction_id, amount, receiver_party)` tuple or a
+    mapping of `Reversal.request` arguments, merged over `defaults`. A
+    transaction is only submitted once per run, and items that are not a valid
+    transaction id and positive amount are reported as invalid without being
+    sent.
+
+    Outcomes are appended to `results_file`, as CSV or as JSON lines when the
+    file name ends with `.jsonl`. Running again with the same file skips the
+    transactions whose outcome it already has, except those that raised.
+    """
+
+    stats_class = ReversalStats
+    stats: ReversalStats
+
+    def __init__(
+        self,
+        reversal: Reversal,
+        *,
+        defaults: Optional[Mapping[str, Any]] = None,
+        results_file: Optional[Union[str, "os.PathLike[str]"]] = None,
+        concurrency: int = 8,
+        rate: Optional[Union[float, RateLimiter]] = None,
+    ) -> None:
+        """
+        Args:
+            reversal (Reversal): Used to request the reversals
+            defaults (Mapping): `Reversal.request` arguments shared by every item,
+                e.g. `initiator`, `security_credential` and `result_url`
+            results_file: CSV or JSONL file the outcomes are appended to
+            concurrency (int): Maximum number of calls in flight
+            rate: Maximum calls per second, or a shared `RateLimiter`
+        """
+        super().__init__(concurrency=concurrency, rate=rate)
+        self.reversal = reversal
+        self.defaults = dict(defaults or {})
+        self.results_file = None if results_file is None else os.fspath(results_file)
+        self._results: Optional[TextIO] = None
+        self._writer: Optional["csv.DictWriter[str]"] = None
+
+    def run(self, items: Iterable[ReversalItem]) -> Iterator[ReversalOutcome]:  # type: ignore[override]
+        done = self._completed_transactions()
+        outcomes = super().run(self._unique(items, done))
+        if self.results_file is None:
+            yield from outcomes
+            return
+        new = not os.path.exists(self.results_file) or not os.path.getsize(
+            self.results_file
+        )
+        with open(self.results_file, "a", newline="", encoding="utf-8") as f:
+            self._results = f
+            self._writer = csv.DictWriter(f, _RESULT_FIELDS)
+            if new and not self.results_file.endswith(".jsonl"):
+                self._writer.writeheader()
+            try:
+                # Closing this closes the run, whose last outcomes are still written
+                yield from outcomes
+            finally:
+                self._results = self._writer = None
+
+    def _record(self, outcome: ReversalOutcome) -> None:
+        if self._results is None or self._writer is None:
+            return
+        row = self._row(outcome)
+        if self.results_file is not None and self.results_file.endswith(".jsonl"):
+            self._results.write(json.dumps(row) + "\n")
+        else:
+            self._writer.writerow(row)
+        # Flushed per outcome so a crashed run can be resumed
+        self._results.flush()
+
+    def _unique(
+        self, items: Iterable[ReversalItem], done: Set[str]
+    ) -> Iterator[Dict[str, Any]]:
+        seen: Set[str] = set()
+        for item in items:
+            if isinstance(item, Mapping):
+                transaction = {**self.defaults, **item}
+            else:
+                transaction_id, amount, receiver_party = item
+                transaction = {
+                    **self.defaults,
+                    "transaction_id": transaction_id,
+                    "amount": amount,
+                    "receiver_party": receiver_party,
+                }
+            transaction_id = str(transaction.get("transaction_id", "")).strip()
+            transaction["transaction_id"] = transaction_id
+            if transaction_id in done:
+                self.stats.resumed += 1
+            elif transaction_id in seen:
+                self.stats.duplicates += 1
+                _logger.warning("Skipping duplicate reversal of %s", transaction_id)
+            else:
+                seen.add(transaction_id)
+                yield transaction
+
+    def _call(self, item: Dict[str, Any]) -> ReversalOutcome:
+        invalid = self._validate(item)
+        if invalid is not None:
+            return ReversalOutcome(transaction=item, result=None, invalid=invalid)
+        try:
+            result = self.reversal.request(**item)
+        except Exception as e:
+            _logger.error(str(e))
+            return ReversalOutcome(transaction=item, result=None, exception=e)
+        return ReversalOutcome(transaction=item, result=result)
+
+    @staticmethod
+    def _validate(item: Dict[str, Any]) -> Optional[str]:
+        if not _TRANSACTION_ID.fullmatch(item["transaction_id"]):
+            return f"Invalid transaction id {item['transaction_id']!r}"
+        try:
+            amount = float(item.get("amount"))  # type: ignore[arg-type]
+        except (TypeError, ValueError):
+            amount = 0
+        if not amount > 0:
+            return f"Invalid amount {item.get('amount')!r}"
+        if not str(item.get("receiver_party", "")).strip():
+            return "Missing receiver party"
+        return None
+
+    def _tally(self, outcome: ReversalOutcome) -> None:
+        if outcome.invalid is not None:
+            self.stats.invalid += 1
+        elif outcome.result is None:
+            self.stats.errors += 1
+        elif outcome.result.status_ok:
+            self.stats.succeeded += 1
+        else:
+            self.stats.failed += 1
+
+    @staticmethod
+    def _row(outcome: ReversalOutcome) -> Dict[str, Any]:
+        result = outcome.result
+        if outcome.invalid is not None:
+            error_code, error_message = None, outcome.invalid
+        elif result is None:
+            error_code, error_message = None, repr(outcome.exception)
+        elif isinstance(result, ReversalErrorResult):
+            error_code, error_message = result.error_code, result.error_message
+        else:
+            error_code = error_message = None
+        return {
+            "transaction_id": outcome.transaction["transaction_id"],
+            "amount": outcome.transaction.get("amount"),
+            "receiver_party": outcome.transaction.get("receiver_party"),
+            "status": outcome.status,
+            "originator_conversation_id": getattr(
+                result, "originator_conversation_id", None
+            ),
+            "conversation_id": getattr(result, "conversation_id", None),
+            "error_code": error_code,
+            "error_message": error_message,
+        }
+
+    def _completed_transactions(self) -> Set[str]:
+        if self.results_file is None or not os.path.exists(self.results_file):
+            return set()
+        statuses: Dict[str, str] = {}
+        with open(self.results_file, newline="", encoding="utf-8") as f:
+            if self.results_file.endswith(".jsonl"):
+                rows: Iterable[Dict[str, Any]] = _json_lines(f)
+            else:
+                rows = csv.DictReader(f)
+            for row in rows:
+                # The last outcome of a transaction wins, e.g. a retried error
+                statuses[row["transaction_id"]] = row["status"]
+        return {t for t, status in statuses.items() if status in _FINAL_STATUSES}
+
+
+def _json_lines(lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            # e.g. the last line of a run that crashed while writing it
+            _logger.warning("Skipping malformed result line %r", line)
+
+
+@dataclass
+class QRCodeStats(BulkStats):
+    # QR codes served from the cache instead of generated
+    cached: int = 0
+
+
+@dataclass
+class QRCodeOutcome:
+    request: Dict[str, Any]
+    # The decoded PNG image, None when written to `path` or not generated
+    image: Optional[bytes] = None
+    path: Optional[str] = None
+    cached: bool = False
+    error: Optional[QRCodeErrorResult] = None
+    exception: Optional[BaseException] = None
+
+    @property
+    def status_ok(self) -> bool:
+        return self.error is None and self.exception is None
+
+
+def _is_file_name(name: str) -> bool:
+    return (
+        name not in ("", ".", "..")
+        and "/" not in name
+        and "\\" not in name
+        and os.path.basename(name) == name
+    )
+
+
+class _NotGenerated(Exception):
+    def __init__(self, error: QRCodeErrorResult) -> None:
+        super().__init__(error.error_message)
+        self.error = error
+
+
+class BulkQRCode(BulkRunner[Mapping[str, Any], QRCodeOutcome]):
+    """
+    Generates a QR code per request.
+
+    Each request is a mapping of `QRCode.generate` arguments merged over
+    `defaults`. Images are decoded from base64 once and, with a `cache`,
+    requests equal to an earlier one are served from it instead of Daraja.
+    With an `output_dir` images are written to `<file_name>.png` files, named
+    by the request's `file_name` or else its cache key, and outcomes only hold
+    their path. A `file_name` with a path separator is reported as an error.
+    """
+
+    stats_class = QRCodeStats
+    stats: QRCodeStats
+
+    def __init__(
+        self,
+        qrcode: QRCode,
+        *,
+        defaults: Optional[Mapping[str, Any]] = None,
+        cache: Optional[QRCodeCache] = None,
+        output_dir: Optional[str] = None,
+        concurrency: int = 8,
+        rate: Optional[Union[float, RateLimiter]] = None,
+    ) -> None:
+        """
+        Args:
+            qrcode (QRCode): Used to generate the QR codes
+            defaults (Mapping): `QRCode.generate` arguments shared by every request
+            cache (QRCodeCache): Images of earlier requests
+            output_dir (str): Directory the images are written to
+            concurrency (int): Maximum number of calls in flight
+            rate: Maximum calls per second, or a shared `RateLimiter`
+        """
+        super().__init__(concurrency=concurrency, rate=rate)
+        self.qrcode = qrcode
+        self.defaults = dict(defaults or {})
+        self.cache = cache
+        self.output_dir = output_dir
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+
+    def _limited_call(self, item: Mapping[str, Any]) -> QRCodeOutcome:
+        # Only calls to Daraja count against the rate limit, in `_generate`
+        return self._call(item)
+
+    def _call(self, item: Mapping[str, Any]) -> QRCodeOutcome:
+        request = {**self.defaults, **item}
+        file_name = request.pop("file_name", None)
+        if file_name is not None and not _is_file_name(str(file_name)):
+            # Written inside `output_dir` only
+            return QRCodeOutcome(
+                request=request,
+                exception=ValueError(f"Invalid file name {file_name!r}"),
+            )
+        key = qr_code_key(request)
+        generated = False
+
+        def generate() -> bytes:
+            nonlocal generated
+            generated = True
+            return self._generate(request)
+
+        try:
+            if self.cache is None:
+                image = generate()
+            else:
+                image = self.cache.get_or_create(key, generate)
+        except _NotGenerated as e:
+            return QRCodeOutcome(request=request, error=e.error)
+        except Exception as e:
+            _logger.error(str(e))
+            return QRCodeOutcome(request=request, exception=e)
+        outcome = QRCodeOutcome(request=request, cached=not generated)
+        if self.output_dir is None:
+            outcome.image = image
+        else:
+            outcome.path = os.path.join(self.output_dir, f"{file_name or key}.png")
+            with open(outcome.path, "wb") as f:
+                f.write(image)
+        return outcome
+
+    def _generate(self, request: Dict[str, Any]) -> bytes:
+        if self.limiter is not None:
+            self.limiter.acquire()
+        result = self.qrcode.generate(**request)
+        if not result.status_ok:
+            raise _NotGenerated(result)
+        return base64.b64decode(result.qr_code)
+
+    def _tally(self, outcome: QRCodeOutcome) -> None:
+        if outcome.exception is not None:
+            self.stats.errors += 1
+        elif outcome.error is not None:
+            self.stats.failed += 1
+        else:
+            self.stats.succeeded += 1
+            self.stats.cached += outcome.cached
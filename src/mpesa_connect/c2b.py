@@ -1,11 +1,10 @@
 from dataclasses import dataclass
 from typing import Optional, Union
 
-import requests
-
 from .app import AppEnv
 from .base import API, ErrorResult, Result
 from .enums import CommandID, ResponseType
+from .timeouts import Timeout
 from .urls import PATH_C2B_REGISTERURL, PATH_C2B_SIMULATE
 
 
@@ -40,6 +39,7 @@ class C2B(API):
         confirmation_url: str,
         response_type: Union[ResponseType, str],
         access_token: Optional[str] = None,
+        timeout: Optional[Timeout] = None,
     ) -> Union[C2BResult, C2BErrorResult]:
         payload = {
             "ShortCode": short_code,
@@ -51,15 +51,14 @@ class C2B(API):
                 else response_type
             ),
         }
-        response = requests.post(
-            self.get_url(PATH_C2B_REGISTERURL),
-            headers={"Authorization": f"Bearer {access_token or self.access_token}"},
-            json=payload,
+        return self._post(
+            PATH_C2B_REGISTERURL,
+            payload,
+            C2BResult,
+            C2BErrorResult,
+            access_token=access_token,
+            timeout=timeout,
         )
-        result_dict = self._make_result(response)
-        if response.status_code != 200:
-            return C2BErrorResult(**result_dict)
-        return C2BResult(**result_dict)
 
     def simulate(
         self,
@@ -70,6 +69,7 @@ class C2B(API):
         msisdn: Union[str, int],
         bill_ref_number: Optional[str] = None,
         access_token: Optional[str] = None,
+        timeout: Optional[Timeout] = None,
     ) -> Union[C2BSimulateResult, C2BSimulateErrorResult]:
         if self.app.env != AppEnv.SANDBOX:
             raise Exception("Simulate is available on sandbox only")
@@ -82,12 +82,11 @@ class C2B(API):
             "Msisdn": msisdn,
             "BillRefNumber": bill_ref_number,
         }
-        response = requests.post(
-            self.get_url(PATH_C2B_SIMULATE),
-            headers={"Authorization": f"Bearer {access_token or self.access_token}"},
-            json=payload,
+        return self._post(
+            PATH_C2B_SIMULATE,
+            payload,
+            C2BSimulateResult,
+            C2BSimulateErrorResult,
+            access_token=access_token,
+            timeout=timeout,
         )
-        result_dict = self._make_result(response)
-        if response.status_code != 200:
-            return C2BSimulateErrorResult(**result_dict)
-        return C2BSimulateResult(**result_dict)
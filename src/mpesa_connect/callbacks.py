@@ -0,0 +1,459 @@
+"""
+Parsing and ingestion of the asynchronous callbacks Daraja posts to the
+`CallBackURL`, `ResultURL`, `ValidationURL` and `ConfirmationURL` of a request.
+"""
+
+import asyncio
+import inspect
+import json
+import logging
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from functools import cached_property
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    ClassVar,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from .enums import CallbackType, ValidationResultCode
+from .utils import convert_to_snake_case
+
+if TYPE_CHECKING:
+    from .correlation import CorrelationStore
+
+_logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Callback:
+    callback_type: ClassVar[CallbackType]
+
+    raw: Dict[str, Any] = field(repr=False, compare=False)
+
+    @property
+    def status_ok(self) -> bool:
+        return str(getattr(self, "result_code", 0)) == "0"
+
+    @property
+    def correlation_id(self) -> Optional[str]:
+        """The id linking the callback to the request it belongs to"""
+        return None
+
+
+@dataclass
+class STKPushCallback(Callback):
+    callback_type = CallbackType.STK_PUSH
+
+    merchant_request_id: str
+    checkout_request_id: str
+    result_code: int
+    result_desc: str
+    metadata: Dict[str, Any]
+
+    @property
+    def correlation_id(self) -> Optional[str]:
+        return self.checkout_request_id
+
+    @property
+    def amount(self) -> Optional[float]:
+        return self.metadata.get("Amount")
+
+    @property
+    def mpesa_receipt_number(self) -> Optional[str]:
+        return self.metadata.get("MpesaReceiptNumber")
+
+    @property
+    def phone_number(self) -> Optional[int]:
+        return self.metadata.get("PhoneNumber")
+
+
+@dataclass
+class ResultCallback(Callback):
+    result_type: int
+    result_code: int
+    result_desc: str
+    originator_conversation_id: str
+    conversation_id: str
+    transaction_id: str
+    result_parameters: Dict[str, Any]
+    reference_data: Dict[str, Any]
+
+    @property
+    def correlation_id(self) -> Optional[str]:
+        return self.conversation_id
+
+
+@dataclass
+class B2CCallback(ResultCallback):
+    callback_type = CallbackType.B2C
+
+
+@dataclass
+class ReversalCallback(ResultCallback):
+    callback_type = CallbackType.REVERSAL
+
+
+@dataclass(frozen=True)
+class AccountBalanceRecord:
+    """The balances of one account of a short code"""
+
+    name: str
+    currency: str
+    current_balance: Decimal
+    available_balance: Decimal
+    reserved_balance: Decimal
+    uncleared_balance: Decimal
+
+
+def parse_account_balance(value: str) -> Dict[str, AccountBalanceRecord]:
+    """
+    Parse the `AccountBalance` result parameter of an account balance callback,
+    e.g. `Working Account|KES|46713.00|46713.00|0.00|0.00&Utility Account|...`
+
+    Returns:
+        dict: Records keyed by account name
+    """
+    records = {}
+    for account in value.split("&"):
+        if not account.strip():
+            continue
+        parts = account.split("|")
+        if len(parts) != 6:
+            raise ValueError(f"Malformed account balance {account!r}")
+        try:
+            balances = [Decimal(part or "0") for part in parts[2:]]
+        except InvalidOperation as e:
+            raise ValueError(f"Malformed account balance {account!r}") from e
+        record = AccountBalanceRecord(parts[0].strip(), parts[1].strip(), *balances)
+        records[record.name] = record
+    return records
+
+
+@dataclass
+class AccountBalanceCallback(ResultCallback):
+    callback_type = CallbackType.ACCOUNT_BALANCE
+
+    @cached_property
+    def accounts(self) -> Dict[str, AccountBalanceRecord]:
+        """The balances of every account keyed by name, parsed once"""
+        return parse_account_balance(
+            str(self.result_parameters.get("AccountBalance") or "")
+        )
+
+
+@dataclass
+class TransactionStatusCallback(ResultCallback):
+    callback_type = CallbackType.TRANSACTION_STATUS
+
+
+@dataclass
+class C2BCallback(Callback):
+    transaction_type: str
+    trans_id: str
+    trans_time: str
+    trans_amount: str
+    business_short_code: str
+    bill_ref_number: str
+    invoice_number: str
+    org_account_balance: str
+    third_party_trans_id: str
+    msisdn: str
+    first_name: str
+    middle_name: str
+    last_name: str
+
+
+@dataclass
+class C2BValidationCallback(C2BCallback):
+    callback_type = CallbackType.C2B_VALIDATION
+
+
+@dataclass
+class C2BConfirmationCallback(C2BCallback):
+    callback_type = CallbackType.C2B_CONFIRMATION
+
+
+_RESULT_CALLBACKS = {
+    CallbackType.B2C: B2CCallback,
+    CallbackType.REVERSAL: ReversalCallback,
+    CallbackType.ACCOUNT_BALANCE: AccountBalanceCallback,
+    CallbackType.TRANSACTION_STATUS: TransactionStatusCallback,
+}
+_C2B_CALLBACKS = {
+    CallbackType.C2B_VALIDATION: C2BValidationCallback,
+    CallbackType.C2B_CONFIRMATION: C2BConfirmationCallback,
+}
+_C2B_FIELDS = [
+    "transaction_type",
+    "trans_id",
+    "trans_time",
+    "trans_amount",
+    "business_short_code",
+    "bill_ref_number",
+    "invoice_number",
+    "org_account_balance",
+    "third_party_trans_id",
+    "msisdn",
+    "first_name",
+    "middle_name",
+    "last_name",
+]
+
+
+def _items(items: Any) -> Dict[str, Any]:
+    # Daraja sends key/value lists as either a list or a single object
+    if isinstance(items, dict):
+        items = [items]
+    return {
+        item["Key" if "Key" in item else "Name"]: item.get("Value")
+        for item in items or []
+    }
+
+
+def parse_callback(
+    callback_type: Union[CallbackType, str], body: Union[bytes, str, Mapping[str, Any]]
+) -> Callback:
+    """
+    Parse the body of a Daraja callback
+
+    Args:
+        callback_type (CallbackType): The kind of request the callback belongs to
+        body: The raw request body or the decoded JSON object
+
+    Returns:
+        Callback: The typed callback
+    """
+    if isinstance(callback_type, str):
+        callback_type = CallbackType(callback_type)
+    data: Dict[str, Any] = dict(body) if isinstance(body, Mapping) else json.loads(body)
+    if not isinstance(data, dict):
+        raise ValueError(f"Expected a JSON object, got {type(data).__name__}")
+    if callback_type == CallbackType.STK_PUSH:
+        stk = data["Body"]["stkCallback"]
+        return STKPushCallback(
+            raw=data,
+            merchant_request_id=stk["MerchantRequestID"],
+            checkout_request_id=stk["CheckoutRequestID"],
+            result_code=stk["ResultCode"],
+            result_desc=stk["ResultDesc"],
+            metadata=_items(stk.get("CallbackMetadata", {}).get("Item")),
+        )
+    if callback_type in _RESULT_CALLBACKS:
+        result = data["Result"]
+        return _RESULT_CALLBACKS[callback_type](
+            raw=data,
+            result_type=result.get("ResultType", 0),
+            result_code=result["ResultCode"],
+            result_desc=result["ResultDesc"],
+            originator_conversation_id=result["OriginatorConversationID"],
+            conversation_id=result["ConversationID"],
+            transaction_id=result.get("TransactionID", ""),
+            result_parameters=_items(
+                (result.get("ResultParameters") or {}).get("ResultParameter")
+            ),
+            reference_data=_items(
+                (result.get("ReferenceData") or {}).get("ReferenceItem")
+            ),
+        )
+    values = {convert_to_snake_case(k): v for k, v in data.items()}
+    return _C2B_CALLBACKS[callback_type](
+        raw=data, **{name: values.get(name, "") for name in _C2B_FIELDS}
+    )
+
+
+def acknowledgement(
+    result_code: Union[str, int] = 0, result_desc: str = "Accepted"
+) -> Dict[str, Any]:
+    """The response body Daraja expects from a callback URL"""
+    return {"ResultCode": result_code, "ResultDesc": result_desc}
+
+
+CallbackHandler = Callable[[Callback], Union[None, Awaitable[None]]]
+Validator = Callable[["C2BValidationCallback"], ValidationResultCode]
+
+
+class CallbackApp:
+    """
+    ASGI application receiving Daraja callbacks.
+
+    Callbacks are parsed and put on a bounded queue and acknowledged straight
+    away, so slow processing never delays the response to Safaricom. A pool of
+    worker tasks hands queued callbacks to `handler`, or, without a handler,
+    consumers can read `queue` themselves. When the queue is full the
+    callback is refused with a 503 so that Safaricom retries it later.
+
+    C2B validation requests are answered with the decision of `validator`,
+    which runs on the event loop and so must not block, see `C2BValidator`.
+    """
+
+    def __init__(
+        self,
+        routes: Mapping[str, Union[CallbackType, str]],
+        handler: Optional[CallbackHandler] = None,
+        *,
+        queue_size: int = 10000,
+        workers: int = 4,
+        correlation_store: Optional["CorrelationStore"] = None,
+        validator: Optional[Validator] = None,
+    ) -> None:
+        """
+        Args:
+            routes: Callback type keyed by the URL path it is posted to
+            handler (Callable): Called with every callback, may be a coroutine function
+            queue_size (int): Maximum number of callbacks waiting to be handled
+            workers (int): Number of callbacks handled concurrently
+            correlation_store (CorrelationStore): Resolves callbacks to their
+                requests as they are received
+            validator (Callable): Decides whether to accept C2B payments,
+                they are all accepted when omitted
+        """
+        self.routes = {
+            path: CallbackType(t) if isinstance(t, str) else t
+            for path, t in routes.items()
+        }
+        self.handler = handler
+        self.queue_size = queue_size
+        self.workers = workers
+        self.correlation_store = correlation_store
+        self.validator = validator
+        self._queue: Optional["asyncio.Queue[Callback]"] = None
+        self._tasks: List["asyncio.Task[None]"] = []
+
+    @property
+    def queue(self) -> "asyncio.Queue[Callback]":
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.queue_size)
+        return self._queue
+
+    async def __call__(
+        self,
+        scope: Dict[str, Any],
+        receive: Callable[[], Awaitable[Dict[str, Any]]],
+        send: Callable[[Dict[str, Any]], Awaitable[None]],
+    ) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        status, body = await self._handle(scope, receive)
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [(b"content-type", b"application/json")],
+            }
+        )
+        await send({"type": "http.response.body", "body": json.dumps(body).encode()})
+
+    async def _handle(
+        self,
+        scope: Dict[str, Any],
+        receive: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Tuple[int, Dict[str, Any]]:
+        callback_type = self.routes.get(scope["path"])
+        if callback_type is None:
+            return 404, acknowledgement(1, "Not Found")
+        if scope["method"] != "POST":
+            return 405, acknowledgement(1, "Method Not Allowed")
+        body = await _read_body(receive)
+        try:
+            callback = parse_callback(callback_type, body)
+        except (ValueError, KeyError, TypeError) as e:
+            _logger.error("Invalid %s callback: %r", callback_type.value, e)
+            return 400, acknowledgement(1, "Invalid callback")
+        if self.correlation_store is not None:
+            # Stores may write to disk, which must not block the event loop
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.correlation_store.resolve, callback
+            )
+        if self.validator is not None and isinstance(callback, C2BValidationCallback):
+            return 200, self._validate(callback)
+        self.start()
+        try:
+            self.queue.put_nowait(callback)
+        except asyncio.QueueFull:
+            _logger.warning("Callback queue is full, refusing %s", callback_type.value)
+            return 503, acknowledgement(1, "Busy")
+        return 200, acknowledgement()
+
+    def _validate(self, callback: "C2BValidationCallback") -> Dict[str, Any]:
+        assert self.validator is not None
+        try:
+            result_code = self.validator(callback)
+        except Exception:
+            _logger.exception("Error validating %s", callback.trans_id)
+            result_code = ValidationResultCode.OTHER_ERROR
+        self.start()
+        try:
+            self.queue.put_nowait(callback)
+        except asyncio.QueueFull:
+            # The payment is still answered, only its handling is skipped
+            _logger.warning("Callback queue is full, not handling c2b_validation")
+        if result_code is ValidationResultCode.ACCEPTED:
+            return acknowledgement(result_code.value, "Accepted")
+        return acknowledgement(result_code.value, "Rejected")
+
+    def start(self) -> None:
+        """Start the handler workers, if not already running"""
+        if self.handler is None or self._tasks:
+            return
+        self._tasks = [asyncio.ensure_future(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Wait for queued callbacks to be handled, then stop the workers"""
+        if self._tasks:
+            await self.queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _work(self) -> None:
+        assert self.handler is not None
+        while True:
+            callback = await self.queue.get()
+            try:
+                if inspect.iscoroutinefunction(self.handler):
+                    await self.handler(callback)  # type: ignore[misc]
+                else:
+                    await asyncio.get_running_loop().run_in_executor(
+                        None, self.handler, callback
+                    )
+            except Exception:
+                _logger.exception("Error handling %s", type(callback).__name__)
+            finally:
+                self.queue.task_done()
+
+    async def _lifespan(
+        self,
+        receive: Callable[[], Awaitable[Dict[str, Any]]],
+        send: Callable[[Dict[str, Any]], Awaitable[None]],
+    ) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self.start()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.stop()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+async def _read_body(receive: Callable[[], Awaitable[Dict[str, Any]]]) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            return b"".join(chunks)
@@ -0,0 +1,251 @@
+"""
+Circuit breakers failing calls to a degraded endpoint fast instead of letting
+callers pile up waiting on it, while calls to other endpoints keep flowing.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from enum import Enum
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from .exceptions import CircuitOpenError
+
+_logger = logging.getLogger(__name__)
+
+
+class CircuitState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+Listener = Callable[[str, CircuitState, CircuitState], Any]
+
+
+def is_failure(outcome: Any) -> bool:
+    """Whether an exception or HTTP response counts against an endpoint's health"""
+    if isinstance(outcome, BaseException):
+        return True
+    return outcome.status_code >= 500 or outcome.status_code == 429
+
+
+class CircuitBreaker:
+    """
+    Tracks the outcome of the last `window_size` calls to an endpoint.
+
+    The circuit opens when at least `minimum_calls` were made and the share of
+    failed calls, or of calls slower than `slow_call_duration`, reaches its
+    threshold. While open, calls fail with `CircuitOpenError` without being
+    sent. After `open_timeout` seconds up to `half_open_calls` probe calls are
+    let through, the circuit closes when they all succeed and opens again
+    otherwise.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        failure_rate_threshold: float = 0.5,
+        slow_call_duration: Optional[float] = None,
+        slow_call_rate_threshold: float = 0.5,
+        window_size: int = 20,
+        minimum_calls: int = 10,
+        open_timeout: float = 30.0,
+        half_open_calls: int = 1,
+        listeners: Optional[List[Listener]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        Args:
+            path (str): The endpoint path guarded by the breaker
+            failure_rate_threshold (float): Share of failed calls opening the circuit
+            slow_call_duration (float): Seconds after which a call counts as slow,
+                call durations are ignored when omitted
+            slow_call_rate_threshold (float): Share of slow calls opening the circuit
+            window_size (int): Number of most recent calls the rates are taken over
+            minimum_calls (int): Calls needed before the circuit can open
+            open_timeout (float): Seconds the circuit stays open before probing
+            half_open_calls (int): Probe calls deciding whether to close the circuit
+            listeners (list): Called as `listener(path, previous_state, state)`
+            clock (Callable): Monotonic time source
+        """
+        self.path = path
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_duration = slow_call_duration
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.minimum_calls = minimum_calls
+        self.open_timeout = open_timeout
+        self.half_open_calls = half_open_calls
+        self.listeners = listeners if listeners is not None else []
+        self._clock = clock
+        self._state = CircuitState.CLOSED
+        self._window: Deque[Tuple[bool, bool]] = deque(maxlen=window_size)
+        self._failures = 0
+        self._slow = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+        # Changes with the state, outcomes of calls from an earlier one are ignored
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> CircuitState:
+        return self._state
+
+    def acquire(self) -> int:
+        """
+        Allow a call or raise `CircuitOpenError`, every allowed call must be
+        followed by `record` or `cancel`
+
+        Returns:
+            int: The generation of the circuit state to pass to `record` or `cancel`
+        """
+        with self._lock:
+            changed = None
+            if self._state is CircuitState.OPEN:
+                retry_after = self._opened_at + self.open_timeout - self._clock()
+                if retry_after > 0:
+                    raise CircuitOpenError(self.path, retry_after)
+                changed = self._transition(CircuitState.HALF_OPEN)
+            if self._state is CircuitState.HALF_OPEN:
+                if self._probes >= self.half_open_calls:
+                    raise CircuitOpenError(self.path, 0.0)
+                self._probes += 1
+            generation = self._generation
+        self._notify(changed)
+        return generation
+
+    def record(self, generation: int, failed: bool, duration: float) -> None:
+        """Record the outcome of a call allowed by `acquire`"""
+        slow = (
+            self.slow_call_duration is not None and duration >= self.slow_call_duration
+        )
+        with self._lock:
+            if generation != self._generation:
+                # e.g. a call started while closed finishing after the circuit
+                # opened, it is not a probe
+                return
+            changed = None
+            if self._state is CircuitState.HALF_OPEN:
+                self._probes -= 1
+                if failed or slow:
+                    changed = self._transition(CircuitState.OPEN)
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_calls:
+                        changed = self._transition(CircuitState.CLOSED)
+            elif self._state is CircuitState.CLOSED:
+                if len(self._window) == self._window.maxlen:
+                    old_failed, old_slow = self._window[0]
+                    self._failures -= old_failed
+                    self._slow -= old_slow
+                self._window.append((failed, slow))
+                self._failures += failed
+                self._slow += slow
+                if self._tripped():
+                    changed = self._transition(CircuitState.OPEN)
+        self._notify(changed)
+
+    def cancel(self, generation: int) -> None:
+        """Release a call allowed by `acquire` without recording an outcome"""
+        with self._lock:
+            if (
+                generation == self._generation
+                and self._state is CircuitState.HALF_OPEN
+                and self._probes > 0
+            ):
+                self._probes -= 1
+
+    def reset(self) -> None:
+        with self._lock:
+            changed = self._transition(CircuitState.CLOSED)
+        self._notify(changed)
+
+    def _tripped(self) -> bool:
+        calls = len(self._window)
+        if calls < self.minimum_calls:
+            return False
+        if self._failures / calls >= self.failure_rate_threshold:
+            return True
+        return (
+            self.slow_call_duration is not None
+            and self._slow / calls >= self.slow_call_rate_threshold
+        )
+
+    def _transition(
+        self, state: CircuitState
+    ) -> Optional[Tuple[CircuitState, CircuitState]]:
+        previous, self._state = self._state, state
+        self._generation += 1
+        self._probes = self._probe_successes = 0
+        if state is CircuitState.OPEN:
+            self._opened_at = self._clock()
+        elif state is CircuitState.CLOSED:
+            self._window.clear()
+            self._failures = self._slow = 0
+        return None if previous is state else (previous, state)
+
+    def _notify(self, changed: Optional[Tuple[CircuitState, CircuitState]]) -> None:
+        if changed is None:
+            return
+        previous, state = changed
+        log = _logger.warning if state is CircuitState.OPEN else _logger.info
+        log(
+            "Circuit of %s changed from %s to %s",
+            self.path,
+            previous.value,
+            state.value,
+        )
+        for listener in self.listeners:
+            try:
+                listener(self.path, previous, state)
+            except Exception:
+                _logger.exception("Circuit breaker listener failed")
+
+
+class CircuitBreakers:
+    """
+    A `CircuitBreaker` per endpoint path, all created with the same settings
+    unless overridden per path.
+    """
+
+    def __init__(
+        self,
+        *,
+        paths: Optional[Dict[str, Dict[str, Any]]] = None,
+        **settings: Any,
+    ) -> None:
+        """
+        Args:
+            paths (dict): Settings overrides keyed by endpoint path, e.g.
+                `{PATH_B2C_PAYMENTREQUEST: {"slow_call_duration": 10}}`
+            settings: Keyword arguments of every `CircuitBreaker`
+        """
+        self.settings = settings
+        self.paths = paths or {}
+        self.listeners: List[Listener] = []
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener: Listener) -> None:
+        """Call `listener(path, previous_state, state)` on every state change"""
+        self.listeners.append(listener)
+
+    def get(self, path: str) -> CircuitBreaker:
+        try:
+            return self._breakers[path]
+        except KeyError:
+            with self._lock:
+                if path not in self._breakers:
+                    self._breakers[path] = CircuitBreaker(
+                        path,
+                        listeners=self.listeners,
+                        **{**self.settings, **self.paths.get(path, {})},
+                    )
+                return self._breakers[path]
+
+    def states(self) -> Dict[str, CircuitState]:
+        return {path: breaker.state for path, breaker in self._breakers.items()}
@@ -0,0 +1,325 @@
+"""
+Stores matching outbound requests to the callbacks Daraja later posts for them.
+
+Requests are keyed by their correlation id, the `CheckoutRequestID` of STK
+pushes and the `ConversationID` of B2C, reversal, account balance and
+transaction status requests.
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from .callbacks import Callback, parse_callback
+from .exceptions import MpesaTimeoutError
+
+
+@dataclass
+class Correlation:
+    correlation_id: str
+    request: Dict[str, Any] = field(default_factory=dict)
+    created_at: float = field(default_factory=time.time)
+    callback: Optional[Callback] = None
+
+
+class CorrelationStore(ABC):
+    """
+    Base class of correlation stores.
+
+    Subclasses implement the storage, waiting for callbacks is handled here.
+    Waiters are woken as soon as a callback is resolved in this process; a
+    `poll_interval` makes waiters also poll the storage, for backends shared
+    between processes.
+    """
+
+    poll_interval: Optional[float] = None
+
+    def __init__(self, *, ttl: float = 86400) -> None:
+        """
+        Args:
+            ttl (float): Seconds after which unresolved entries are evicted
+        """
+        self.ttl = ttl
+        self._waiters: Dict[str, List["Future[Callback]"]] = {}
+        self._waiters_lock = threading.Lock()
+
+    @abstractmethod
+    def record(self, correlation_id: str, request: Dict[str, Any]) -> None:
+        """Record an outbound request awaiting its callback"""
+
+    @abstractmethod
+    def get(self, correlation_id: str) -> Optional[Correlation]: ...
+
+    @abstractmethod
+    def _save_callback(self, correlation_id: str, callback: Callback) -> None: ...
+
+    def resolve(self, callback: Callback) -> None:
+        """Store a received callback and wake up everyone waiting for it"""
+        correlation_id = callback.correlation_id
+        if correlation_id is None:
+            return
+        self._save_callback(correlation_id, callback)
+        with self._waiters_lock:
+            waiters = self._waiters.pop(correlation_id, [])
+        for future in waiters:
+            if not future.done():
+                future.set_result(callback)
+
+    def future(self, correlation_id: str) -> "Future[Callback]":
+        """A future completed with the callback of `correlation_id`"""
+        future = self._register(correlation_id)
+        callback = self._stored_callback(correlation_id)
+        if callback is not None:
+            self._discard(correlation_id, future)
+            future.set_result(callback)
+        return future
+
+    def wait(self, correlation_id: str, timeout: Optional[float] = None) -> Callback:
+        """Block until the callback of `correlation_id` is received"""
+        future = self.future(correlation_id)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        try:
+            while True:
+                remaining = (
+                    max(deadline - time.monotonic(), 0)
+                    if deadline is not None
+                    else None
+                )
+                wait = self.poll_interval
+                if remaining is not None:
+                    wait = min(wait, remaining) if wait is not None else remaining
+                try:
+                    return future.result(wait)
+                except FutureTimeoutError:
+                    correlation = self.get(correlation_id)
+                    if correlation is not None and correlation.callback is not None:
+                        return correlation.callback
+                    if remaining is not None and remaining <= (wait or 0):
+                        raise MpesaTimeoutError(
+                            f"No callback received for {correlation_id}"
+                        )
+        finally:
+            self._discard(correlation_id, future)
+
+    async def wait_async(
+        self, correlation_id: str, timeout: Optional[float] = None
+    ) -> Callback:
+        """Wait for the callback of `correlation_id` without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        future = self._register(correlation_id)
+        waiter = asyncio.wrap_future(future)
+        deadline = loop.time() + timeout if timeout is not None else None
+        try:
+            while True:
+                # Only the lookup runs in the executor, which callbacks are
+                # resolved in too, not a thread per waiter
+                callback = await loop.run_in_executor(
+                    None, self._stored_callback, correlation_id
+                )
+                if callback is not None:
+                    return callback
+                remaining = deadline - loop.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    raise MpesaTimeoutError(
+                        f"No callback received for {correlation_id}"
+                    )
+                wait = self.poll_interval
+                if remaining is not None:
+                    wait = min(wait, remaining) if wait is not None else remaining
+                try:
+                    return await asyncio.wait_for(asyncio.shield(waiter), wait)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._discard(correlation_id, future)
+
+    def _register(self, correlation_id: str) -> "Future[Callback]":
+        future: "Future[Callback]" = Future()
+        with self._waiters_lock:
+            self._waiters.setdefault(correlation_id, []).append(future)
+        return future
+
+    def _stored_callback(self, correlation_id: str) -> Optional[Callback]:
+        correlation = self.get(correlation_id)
+        return correlation.callback if correlation is not None else None
+
+    def _discard(self, correlation_id: str, future: "Future[Callback]") -> None:
+        with self._waiters_lock:
+            waiters = self._waiters.get(correlation_id)
+            if waiters and future in waiters:
+                waiters.remove(future)
+                if not waiters:
+                    del self._waiters[correlation_id]
+
+
+class InMemoryCorrelationStore(CorrelationStore):
+    """
+    Correlation store kept in a dict, evicting entries older than `ttl`.
+
+    Entries are kept in insertion order so expired ones are always at the
+    front and eviction is amortized O(1).
+    """
+
+    def __init__(self, *, ttl: float = 86400, max_size: Optional[int] = None) -> None:
+        """
+        Args:
+            ttl (float): Seconds after which entries are evicted
+            max_size (int): Maximum number of entries, the oldest are evicted first
+        """
+        super().__init__(ttl=ttl)
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Correlation]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def record(self, correlation_id: str, request: Dict[str, Any]) -> None:
+        with self._lock:
+            correlation = self._entries.pop(correlation_id, None)
+            if correlation is None:
+                correlation = Correlation(correlation_id)
+            # A callback may have arrived before the request was recorded
+            correlation.request = request
+            self._entries[correlation_id] = correlation
+            self._evict()
+
+    def get(self, correlation_id: str) -> Optional[Correlation]:
+        with self._lock:
+            self._evict()
+            return self._entries.get(correlation_id)
+
+    def _save_callback(self, correlation_id: str, callback: Callback) -> None:
+        with self._lock:
+            correlation = self._entries.get(correlation_id)
+            if correlation is None:
+                correlation = self._entries[correlation_id] = Correlation(
+                    correlation_id
+                )
+            correlation.callback = callback
+            self._evict()
+
+    def _evict(self) -> None:
+        expired_before = time.time() - self.ttl
+        while self._entries:
+            oldest = next(iter(self._entries.values()))
+            if oldest.created_at >= expired_before and (
+                self.max_size is None or len(self._entries) <= self.max_size
+            ):
+                break
+            self._entries.popitem(last=False)
+
+
+class SQLiteCorrelationStore(CorrelationStore):
+    """
+    Correlation store persisted in a SQLite database, which can be shared by
+    the process sending requests and the one receiving callbacks.
+    """
+
+    poll_interval: Optional[float] = 0.5
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        ttl: float = 86400,
+        poll_interval: Optional[float] = 0.5,
+    ) -> None:
+        """
+        Args:
+            path (str): The database file
+            ttl (float): Seconds after which entries are evicted
+            poll_interval (float): Seconds between checks of the database while
+                waiting for a callback resolved by another process
+        """
+        super().__init__(ttl=ttl)
+        self.path = path
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self._evicted_at = 0.0
+        with self._connection() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS mpesa_correlations ("
+                "correlation_id TEXT PRIMARY KEY, request TEXT, created_at REAL,"
+                " callback_type TEXT, callback TEXT)"
+            )
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS mpesa_correlations_created_at"
+                " ON mpesa_correlations (created_at)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        db: Optional[sqlite3.Connection] = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def record(self, correlation_id: str, request: Dict[str, Any]) -> None:
+        with self._connection() as db:
+            db.execute(
+                "INSERT INTO mpesa_correlations (correlation_id, request, created_at)"
+                " VALUES (?, ?, ?) ON CONFLICT (correlation_id)"
+                " DO UPDATE SET request = excluded.request",
+                (correlation_id, json.dumps(request, default=str), time.time()),
+            )
+            self._evict(db)
+
+    def get(self, correlation_id: str) -> Optional[Correlation]:
+        row = (
+            self._connection()
+            .execute(
+                "SELECT request, created_at, callback_type, callback"
+                " FROM mpesa_correlations WHERE correlation_id = ? AND created_at >= ?",
+                (correlation_id, time.time() - self.ttl),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        request, created_at, callback_type, callback = row
+        return Correlation(
+            correlation_id,
+            json.loads(request) if request else {},
+            created_at,
+            parse_callback(callback_type, callback) if callback else None,
+        )
+
+    def _save_callback(self, correlation_id: str, callback: Callback) -> None:
+        with self._connection() as db:
+            db.execute(
+                "INSERT INTO mpesa_correlations"
+                " (correlation_id, created_at, callback_type, callback)"
+                " VALUES (?, ?, ?, ?) ON CONFLICT (correlation_id) DO UPDATE SET"
+                " callback_type = excluded.callback_type, callback = excluded.callback",
+                (
+                    correlation_id,
+                    time.time(),
+                    callback.callback_type.value,
+                    json.dumps(callback.raw),
+                ),
+            )
+            self._evict(db)
+
+    def _evict(self, db: sqlite3.Connection) -> None:
+        now = time.time()
+        if now - self._evicted_at < 60:
+            return
+        self._evicted_at = now
+        db.execute(
+            "DELETE FROM mpesa_correlations WHERE created_at < ?", (now - self.ttl,)
+        )
+
+    def close(self) -> None:
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+            self._local.db = None
@@ -0,0 +1,117 @@
+import hashlib
+import logging
+import os
+import pathlib
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple, Union
+
+from .utils import encrypt_security_credential, load_public_key
+
+_logger = logging.getLogger(__name__)
+
+
+class SecurityCredentialProvider:
+    """
+    Generates security credentials from a certificate that is read and parsed
+    only once.
+
+    A certificate given as a file path is reloaded when the file changes, so
+    certificates can be rotated without a restart. When the new file can't be
+    loaded the previous certificate keeps being used. Encrypted credentials can
+    also be cached per initiator password for `cache_ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        cer: Union[pathlib.Path, str, bytes],
+        *,
+        cache_ttl: Optional[float] = None,
+        check_interval: float = 5.0,
+    ) -> None:
+        """
+        Args:
+            cer: X509 certificate - either the path to a file or the PEM string in bytes
+            cache_ttl (float): Seconds to reuse an encrypted credential, no
+                caching when omitted
+            check_interval (float): Minimum seconds between checks of the
+                certificate file for changes
+        """
+        self.path = None if isinstance(cer, bytes) else pathlib.Path(cer)
+        self.cache_ttl = cache_ttl
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Tuple[str, float]] = {}
+        self._signature: Optional[Tuple[int, int]] = None
+        self._checked_at = 0.0
+        if self.path is None:
+            self._public_key = load_public_key(cer)  # type: ignore[arg-type]
+        else:
+            self._public_key = self._load()
+
+    @property
+    def public_key(self) -> Any:
+        if self.path is not None:
+            now = time.monotonic()
+            if now - self._checked_at >= self.check_interval:
+                with self._lock:
+                    if now - self._checked_at >= self.check_interval:
+                        self._checked_at = now
+                        self._reload()
+        return self._public_key
+
+    def generate(self, password: str) -> str:
+        """
+        Args:
+            password (str): The unencrypted initiator password
+
+        Returns:
+            str: Base64 encoded security credential
+        """
+        public_key = self.public_key
+        if self.cache_ttl is None:
+            return encrypt_security_credential(password, public_key)
+        key = hashlib.sha256(password.encode()).hexdigest()
+        cached = self._cache.get(key)
+        now = time.monotonic()
+        if cached is not None and cached[1] > now:
+            return cached[0]
+        credential = encrypt_security_credential(password, public_key)
+        with self._lock:
+            # Expired credentials are dropped so the cache doesn't keep growing
+            expired = [
+                k for k, (_, expires_at) in self._cache.items() if expires_at <= now
+            ]
+            for k in expired:
+                del self._cache[k]
+            self._cache[key] = (credential, now + self.cache_ttl)
+        return credential
+
+    def _reload(self) -> None:
+        try:
+            if self._stat() == self._signature:
+                return
+            public_key = self._load()
+        except Exception:
+            # e.g. the file is missing or half written during a rotation, the
+            # previous certificate is used until the next check succeeds
+            _logger.exception(
+                "Reloading certificate %s failed, keeping the previous one", self.path
+            )
+            return
+        self._public_key = public_key
+        self._cache.clear()
+
+    def _stat(self) -> Tuple[int, int]:
+        assert self.path is not None
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self) -> Any:
+        assert self.path is not None
+        signature = self._stat()
+        public_key = load_public_key(self.path.read_bytes())
+        if self._signature is not None:
+            _logger.info("Reloaded certificate %s", self.path)
+        self._signature = signature
+        return public_key
@@ -20,6 +20,16 @@ class ResponseType(Enum):
     CANCELED = "Canceled"
 
 
+class ValidationResultCode(Enum):
+    ACCEPTED = "0"
+    INVALID_MSISDN = "C2B00011"
+    INVALID_ACCOUNT_NUMBER = "C2B00012"
+    INVALID_AMOUNT = "C2B00013"
+    INVALID_KYC_DETAILS = "C2B00014"
+    INVALID_SHORTCODE = "C2B00015"
+    OTHER_ERROR = "C2B00016"
+
+
 class IdentifierType(Enum):
     MSISDN = 1
     TILL_NUMBER = 2
@@ -32,3 +42,13 @@ class TrxCode(Enum):
     SB = "SB"
     SM = "SM"
     WA = "WA"
+
+
+class CallbackType(Enum):
+    STK_PUSH = "stk_push"
+    B2C = "b2c"
+    REVERSAL = "reversal"
+    ACCOUNT_BALANCE = "account_balance"
+    TRANSACTION_STATUS = "transaction_status"
+    C2B_VALIDATION = "c2b_validation"
+    C2B_CONFIRMATION = "c2b_confirmation"
@@ -0,0 +1,31 @@
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .authorization import OAuthErrorResult
+
+
+class MpesaConnectError(Exception):
+    pass
+
+
+class AuthorizationError(MpesaConnectError):
+    def __init__(self, result: "OAuthErrorResult") -> None:
+        super().__init__(
+            f"Error generating access token: {result.error_code} {result.error_message}"
+        )
+        self.result = result
+
+
+class MpesaTimeoutError(MpesaConnectError, TimeoutError):
+    pass
+
+
+class CircuitOpenError(MpesaConnectError):
+    """Raised instead of calling an endpoint whose circuit breaker is open"""
+
+    def __init__(self, path: str, retry_after: float) -> None:
+        super().__init__(
+            f"Circuit of {path} is open, retry in {max(retry_after, 0):.1f}s"
+        )
+        self.path = path
+        self.retry_after = retry_after
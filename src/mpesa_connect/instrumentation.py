@@ -0,0 +1,218 @@
+"""
+Metrics and request hooks for every API call.
+
+`Metrics` receives one event per HTTP attempt, per result, per retry, per
+access token refresh and per C2B validation decision, labeled by the path
+constants in `urls.py`. It does nothing by default; `PrometheusMetrics` and
+`OpenTelemetryMetrics` forward the events to those libraries, or subclass
+`Metrics` for anything else.
+
+Hooks follow the `requests` convention of a dict of event name to callables:
+
+    App(..., hooks={"request": [inject_trace_headers], "response": [log]})
+
+`request` hooks are called as `hook(method, path, kwargs)` before each attempt
+and may modify the request keyword arguments, e.g. add tracing headers.
+`response` hooks are called as `hook(method, path, response, error, elapsed)`
+after each attempt, with either the response or the raised error.
+"""
+
+import logging
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence
+
+_logger = logging.getLogger(__name__)
+
+HOOKS = ("request", "response")
+
+# Seconds, Daraja calls usually take between a few hundred ms and a few seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Seconds, validation decisions are made in memory
+VALIDATION_BUCKETS = (1e-6, 5e-6, 1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 0.01)
+
+
+def default_hooks(
+    hooks: Optional[Mapping[str, Sequence[Callable[..., Any]]]] = None,
+) -> Dict[str, List[Callable[..., Any]]]:
+    """
+    Args:
+        hooks (dict): Event name to callables
+
+    Returns:
+        dict: A list of callables for every known event
+    """
+    hooks = hooks or {}
+    unknown = set(hooks) - set(HOOKS)
+    if unknown:
+        raise ValueError(f"Unknown hook events: {', '.join(sorted(unknown))}")
+    return {event: list(hooks.get(event, ())) for event in HOOKS}
+
+
+class Metrics:
+    """Receives instrumentation events, every method is a no-op by default"""
+
+    def request_started(self, path: str) -> None:
+        """An HTTP attempt to `path` is about to be sent"""
+
+    def request_finished(
+        self, path: str, seconds: float, status_code: Optional[int]
+    ) -> None:
+        """An HTTP attempt completed, `status_code` is None when it raised"""
+
+    def result(self, path: str, status_code: int, error_code: Optional[str]) -> None:
+        """A response was turned into a result"""
+
+    def retry(self, path: str) -> None:
+        """A failed attempt is going to be retried"""
+
+    def token_refresh(self, ok: bool) -> None:
+        """An access token was generated"""
+
+    def validation(self, result_code: str, seconds: float) -> None:
+        """A C2B validation request was answered with `result_code`"""
+
+
+class PrometheusMetrics(Metrics):
+    """
+    Records into `prometheus_client` collectors:
+
+    - `<namespace>_request_duration_seconds` histogram by path
+    - `<namespace>_requests_in_flight` gauge by path, i.e. pooled connections in use
+    - `<namespace>_responses_total` counter by path, status and error code
+    - `<namespace>_retries_total` counter by path
+    - `<namespace>_token_refreshes_total` counter by outcome
+    - `<namespace>_validation_duration_seconds` histogram by result code
+    """
+
+    def __init__(
+        self,
+        *,
+        namespace: str = "mpesa",
+        registry: Any = None,
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+        validation_buckets: Sequence[float] = VALIDATION_BUCKETS,
+    ) -> None:
+        """
+        Args:
+            namespace (str): Prefix of the metric names
+            registry (CollectorRegistry): Defaults to the global registry
+            buckets (Sequence): Latency histogram buckets in seconds
+            validation_buckets (Sequence): Validation latency histogram buckets
+        """
+        try:
+            import prometheus_client
+        except ImportError as e:
+            _logger.error(str(e))
+            raise Exception(
+                "Prometheus client library is not installed, please install with `pip install mpesa-connect[prometheus]`"
+            ) from e
+        options: Dict[str, Any] = {"namespace": namespace}
+        if registry is not None:
+            options["registry"] = registry
+        self.latency = prometheus_client.Histogram(
+            "request_duration_seconds",
+            "Daraja HTTP request latency",
+            ["path"],
+            buckets=tuple(buckets),
+            **options,
+        )
+        self.in_flight = prometheus_client.Gauge(
+            "requests_in_flight", "Daraja HTTP requests in flight", ["path"], **options
+        )
+        self.responses = prometheus_client.Counter(
+            "responses",
+            "Daraja responses",
+            ["path", "status", "error_code"],
+            **options,
+        )
+        self.retries = prometheus_client.Counter(
+            "retries", "Retried Daraja requests", ["path"], **options
+        )
+        self.token_refreshes = prometheus_client.Counter(
+            "token_refreshes", "Access token refreshes", ["outcome"], **options
+        )
+        self.validations = prometheus_client.Histogram(
+            "validation_duration_seconds",
+            "C2B validation decision latency",
+            ["result_code"],
+            buckets=tuple(validation_buckets),
+            **options,
+        )
+
+    def request_started(self, path: str) -> None:
+        self.in_flight.labels(path).inc()
+
+    def request_finished(
+        self, path: str, seconds: float, status_code: Optional[int]
+    ) -> None:
+        self.in_flight.labels(path).dec()
+        self.latency.labels(path).observe(seconds)
+        if status_code is None:
+            self.responses.labels(path, "error", "").inc()
+
+    def result(self, path: str, status_code: int, error_code: Optional[str]) -> None:
+        self.responses.labels(path, str(status_code), error_code or "").inc()
+
+    def retry(self, path: str) -> None:
+        self.retries.labels(path).inc()
+
+    def token_refresh(self, ok: bool) -> None:
+        self.token_refreshes.labels("ok" if ok else "error").inc()
+
+    def validation(self, result_code: str, seconds: float) -> None:
+        self.validations.labels(result_code).observe(seconds)
+
+
+class OpenTelemetryMetrics(Metrics):
+    """
+    Records into OpenTelemetry instruments of the given meter, using the same
+    names and attributes as `PrometheusMetrics` with `.` separators.
+    """
+
+    def __init__(self, meter: Any = None, *, namespace: str = "mpesa") -> None:
+        """
+        Args:
+            meter (Meter): Defaults to the meter `mpesa_connect` of the global provider
+            namespace (str): Prefix of the instrument names
+        """
+        try:
+            from opentelemetry import metrics
+        except ImportError as e:
+            _logger.error(str(e))
+            raise Exception(
+                "OpenTelemetry API is not installed, please install with `pip install mpesa-connect[opentelemetry]`"
+            ) from e
+        meter = meter or metrics.get_meter("mpesa_connect")
+        self.latency = meter.create_histogram(f"{namespace}.request.duration", unit="s")
+        self.in_flight = meter.create_up_down_counter(f"{namespace}.requests.in_flight")
+        self.responses = meter.create_counter(f"{namespace}.responses")
+        self.retries = meter.create_counter(f"{namespace}.retries")
+        self.token_refreshes = meter.create_counter(f"{namespace}.token_refreshes")
+        self.validations = meter.create_histogram(
+            f"{namespace}.validation.duration", unit="s"
+        )
+
+    def request_started(self, path: str) -> None:
+        self.in_flight.add(1, {"path": path})
+
+    def request_finished(
+        self, path: str, seconds: float, status_code: Optional[int]
+    ) -> None:
+        self.in_flight.add(-1, {"path": path})
+        self.latency.record(seconds, {"path": path})
+        if status_code is None:
+            self.responses.add(1, {"path": path, "status": "error", "error_code": ""})
+
+    def result(self, path: str, status_code: int, error_code: Optional[str]) -> None:
+        self.responses.add(
+            1,
+            {"path": path, "status": str(status_code), "error_code": error_code or ""},
+        )
+
+    def retry(self, path: str) -> None:
+        self.retries.add(1, {"path": path})
+
+    def token_refresh(self, ok: bool) -> None:
+        self.token_refreshes.add(1, {"outcome": "ok" if ok else "error"})
+
+    def validation(self, result_code: str, seconds: float) -> None:
+        self.validations.record(seconds, {"result_code": result_code})
@@ -0,0 +1,75 @@
+"""
+Pluggable JSON encoding and decoding of request and response bodies.
+
+The fastest installed library is used by default: `orjson`, then `ujson`,
+falling back to the standard library `json` module.
+"""
+
+import json
+from typing import Any, Callable, Dict, Optional, Union
+
+
+class JSONBackend:
+    def __init__(
+        self,
+        name: str,
+        dumps: Callable[[Any], bytes],
+        loads: Callable[[Union[bytes, str]], Any],
+    ) -> None:
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+
+    def __repr__(self) -> str:
+        return f"JSONBackend({self.name!r})"
+
+
+def _stdlib() -> JSONBackend:
+    encoder = json.JSONEncoder(separators=(",", ":"))
+    return JSONBackend(
+        "json", lambda obj: encoder.encode(obj).encode("utf8"), json.loads
+    )
+
+
+def _orjson() -> JSONBackend:
+    import orjson
+
+    return JSONBackend("orjson", orjson.dumps, orjson.loads)
+
+
+def _ujson() -> JSONBackend:
+    import ujson  # type: ignore[import]
+
+    return JSONBackend(
+        "ujson", lambda obj: ujson.dumps(obj).encode("utf8"), ujson.loads
+    )
+
+
+_FACTORIES: Dict[str, Callable[[], JSONBackend]] = {
+    "orjson": _orjson,
+    "ujson": _ujson,
+    "json": _stdlib,
+}
+_backends: Dict[str, JSONBackend] = {}
+
+
+def get_json_backend(name: Optional[str] = None) -> JSONBackend:
+    """
+    Args:
+        name (str): One of `orjson`, `ujson` or `json`, defaults to the fastest installed
+
+    Returns:
+        JSONBackend: The backend
+    """
+    if name is not None:
+        if name not in _FACTORIES:
+            raise ValueError(f"Unknown JSON backend {name!r}")
+        if name not in _backends:
+            _backends[name] = _FACTORIES[name]()
+        return _backends[name]
+    for name in ("orjson", "ujson"):
+        try:
+            return get_json_backend(name)
+        except ImportError:
+            continue
+    return get_json_backend("json")
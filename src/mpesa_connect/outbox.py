@@ -0,0 +1,507 @@
+"""
+A write-ahead outbox of money moving requests.
+
+Every request is durably recorded before it is sent, so that when the
+process dies mid-call the request is known to be in doubt rather than lost.
+In-doubt requests are reconciled with a transaction status query instead of
+being blindly sent again.
+
+Writes of concurrent callers are committed together in one transaction, so
+that many in-flight requests share a single fsync.
+"""
+
+import asyncio
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from dataclasses import dataclass
+from enum import Enum
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+from .callbacks import (
+    B2CCallback,
+    Callback,
+    ReversalCallback,
+    TransactionStatusCallback,
+)
+from .exceptions import AuthorizationError, CircuitOpenError, MpesaTimeoutError
+from .retry import is_connect_error
+from .urls import PATH_B2C_PAYMENTREQUEST
+
+if TYPE_CHECKING:
+    from .transaction_status import TransactionStatus
+
+_logger = logging.getLogger(__name__)
+
+_STOP: Any = object()
+
+# Result codes of transaction status queries meaning Daraja has no record of
+# the transaction, any other failure says nothing about whether it went out
+NOT_FOUND_RESULT_CODES = frozenset({"R000001", "R000002"})
+
+
+class OutboxStatus(Enum):
+    # Recorded, possibly sent, the outcome is unknown
+    PENDING = "pending"
+    # Could not connect to Daraja, safe to send again
+    NOT_SENT = "not_sent"
+    # Rejected by Daraja, e.g. invalid parameters
+    REJECTED = "rejected"
+    # Accepted by Daraja, waiting for the result callback
+    ACCEPTED = "accepted"
+    # A transaction status query was made for the in-doubt request
+    RECONCILING = "reconciling"
+    # Daraja has no record of the request, safe to send again
+    NOT_FOUND = "not_found"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+# A request may only be recorded again when it is known not to have gone out
+_RESENDABLE = frozenset(
+    {
+        OutboxStatus.NOT_SENT.value,
+        OutboxStatus.NOT_FOUND.value,
+        OutboxStatus.REJECTED.value,
+    }
+)
+
+
+@dataclass
+class OutboxEntry:
+    originator_conversation_id: str
+    path: str
+    payload: Dict[str, Any]
+    status: OutboxStatus
+    created_at: float
+    updated_at: float
+    conversation_id: Optional[str] = None
+    result_code: Optional[str] = None
+    result_desc: Optional[str] = None
+    reconcile_conversation_id: Optional[str] = None
+
+
+_COLUMNS = (
+    "originator_conversation_id, path, payload, status, created_at, updated_at,"
+    " conversation_id, result_code, result_desc, reconcile_conversation_id"
+)
+
+
+def _entry(row: Tuple[Any, ...]) -> OutboxEntry:
+    return OutboxEntry(
+        row[0],
+        row[1],
+        json.loads(row[2]),
+        OutboxStatus(row[3]),
+        *row[4:],
+    )
+
+
+class Outbox:
+    """
+    Outbox persisted in a SQLite database in WAL mode.
+
+    Give it to an app with `App(outbox=...)` to record calls to `paths`, keyed
+    by their `OriginatorConversationID`, and pass result callbacks to
+    `handle_callback` to complete them.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        paths: Iterable[str] = (PATH_B2C_PAYMENTREQUEST,),
+        commit_interval: float = 0.002,
+        max_batch: int = 512,
+        not_found_codes: Iterable[str] = NOT_FOUND_RESULT_CODES,
+    ) -> None:
+        """
+        Args:
+            path (str): The database file
+            paths (Iterable): Endpoint paths whose calls are recorded
+            commit_interval (float): Seconds to wait for more writes to commit
+                together with the first one
+            max_batch (int): Maximum number of writes committed together
+            not_found_codes (Iterable): Transaction status result codes meaning
+                the transaction does not exist
+        """
+        self.path = path
+        self.paths = frozenset(paths)
+        self.not_found_codes = frozenset(map(str, not_found_codes))
+        self.commit_interval = commit_interval
+        self.max_batch = max_batch
+        self._local = threading.local()
+        self._writes: "queue.Queue[Any]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        db = self._connection()
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS mpesa_outbox ("
+            "originator_conversation_id TEXT PRIMARY KEY, path TEXT, payload TEXT,"
+            " status TEXT, created_at REAL, updated_at REAL, conversation_id TEXT,"
+            " result_code TEXT, result_desc TEXT, reconcile_conversation_id TEXT)"
+        )
+        db.execute(
+            "CREATE INDEX IF NOT EXISTS mpesa_outbox_status"
+            " ON mpesa_outbox (status, created_at)"
+        )
+        db.execute(
+            "CREATE INDEX IF NOT EXISTS mpesa_outbox_reconcile"
+            " ON mpesa_outbox (reconcile_conversation_id)"
+        )
+        db.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        db: Optional[sqlite3.Connection] = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            # Every commit reaches the disk, commits are batched instead
+            db.execute("PRAGMA synchronous=FULL")
+        return db
+
+    def record(self, path: str, payload: Dict[str, Any]) -> str:
+        """
+        Durably record a request before it is sent, blocks until committed
+
+        A request already recorded can only be recorded again, i.e. resent,
+        when it was not sent, was rejected or was not found by a status query.
+
+        Args:
+            path (str): The endpoint path
+            payload (dict): The request body, keyed by its `OriginatorConversationID`
+
+        Returns:
+            str: The `OriginatorConversationID` of the request
+        """
+        return self._submit(self._insert, path, payload).result()
+
+    async def record_async(self, path: str, payload: Dict[str, Any]) -> str:
+        return await asyncio.wrap_future(self._submit(self._insert, path, payload))
+
+    def sent(self, originator_conversation_id: str, result: Any) -> None:
+        """Record the result of sending a request"""
+        update = self._sent(result)
+        if update is not None:
+            self._update(originator_conversation_id, *update)
+
+    async def sent_async(self, originator_conversation_id: str, result: Any) -> None:
+        update = self._sent(result)
+        if update is not None:
+            await self._update_async(originator_conversation_id, *update)
+
+    def failed(self, originator_conversation_id: str, error: BaseException) -> None:
+        """Record an exception raised sending a request"""
+        if self._not_sent(error):
+            self._update(originator_conversation_id, OutboxStatus.NOT_SENT)
+
+    async def failed_async(
+        self, originator_conversation_id: str, error: BaseException
+    ) -> None:
+        if self._not_sent(error):
+            await self._update_async(originator_conversation_id, OutboxStatus.NOT_SENT)
+
+    def handle_callback(self, callback: Callback) -> Optional[OutboxEntry]:
+        """
+        Complete the entry a result or transaction status callback belongs to,
+        e.g. as or from the handler of a `CallbackApp`
+
+        Returns:
+            OutboxEntry: The updated entry, None if the callback has no entry
+        """
+        if isinstance(callback, TransactionStatusCallback):
+            entry = self._fetchone(
+                "WHERE reconcile_conversation_id = ?", (callback.conversation_id,)
+            )
+            if entry is None:
+                return None
+            if callback.status_ok:
+                status = OutboxStatus.COMPLETED
+            elif str(callback.result_code) in self.not_found_codes:
+                status = OutboxStatus.NOT_FOUND
+            else:
+                # The query failed, e.g. invalid credentials, query again later
+                _logger.warning(
+                    "Status query of %s failed: %s %s",
+                    entry.originator_conversation_id,
+                    callback.result_code,
+                    callback.result_desc,
+                )
+                return entry
+        elif isinstance(callback, (B2CCallback, ReversalCallback)):
+            entry = self.get(callback.originator_conversation_id)
+            if entry is None:
+                return None
+            status = (
+                OutboxStatus.COMPLETED if callback.status_ok else OutboxStatus.FAILED
+            )
+        else:
+            return None
+        self._update(
+            entry.originator_conversation_id,
+            status,
+            {
+                "result_code": str(callback.result_code),
+                "result_desc": callback.result_desc,
+            },
+        )
+        return self.get(entry.originator_conversation_id)
+
+    def get(self, originator_conversation_id: str) -> Optional[OutboxEntry]:
+        return self._fetchone(
+            "WHERE originator_conversation_id = ?", (originator_conversation_id,)
+        )
+
+    def entries(self, *statuses: OutboxStatus) -> List[OutboxEntry]:
+        """Entries with any of `statuses`, oldest first"""
+        placeholders = ", ".join("?" * len(statuses))
+        rows = (
+            self._connection()
+            .execute(
+                f"SELECT {_COLUMNS} FROM mpesa_outbox WHERE status IN ({placeholders})"
+                " ORDER BY created_at",
+                [status.value for status in statuses],
+            )
+            .fetchall()
+        )
+        return [_entry(row) for row in rows]
+
+    def in_doubt(self, older_than: float = 300) -> List[OutboxEntry]:
+        """Requests recorded more than `older_than` seconds ago whose outcome is unknown"""
+        cutoff = time.time() - older_than
+        return [e for e in self.entries(OutboxStatus.PENDING) if e.created_at < cutoff]
+
+    def reconcile(
+        self,
+        transaction_status: "TransactionStatus",
+        *,
+        older_than: float = 300,
+        **query: Any,
+    ) -> List[OutboxEntry]:
+        """
+        Query the status of every in-doubt request, the answers arrive as
+        transaction status callbacks to pass to `handle_callback`
+
+        Requests still reconciling `older_than` seconds after their last query,
+        e.g. because it failed, are queried again.
+
+        Args:
+            transaction_status (TransactionStatus): Used to make the queries
+            older_than (float): Only reconcile requests recorded this many seconds ago
+            query: The other arguments of `TransactionStatus.query`, e.g.
+                `initiator`, `security_credential`, `party_a` and `result_url`
+
+        Returns:
+            list: The entries queried
+        """
+        cutoff = time.time() - older_than
+        stale = [
+            e for e in self.entries(OutboxStatus.RECONCILING) if e.updated_at < cutoff
+        ]
+        queried = []
+        for entry in self.in_doubt(older_than) + stale:
+            # The query has its own id, the request is looked up by its id
+            result = transaction_status.query(
+                originator_conversation_id=str(uuid.uuid4()),
+                original_conversation_id=entry.originator_conversation_id,
+                transaction_id="",
+                **query,
+            )
+            if not result.status_ok:
+                _logger.warning(
+                    "Status query of %s failed: %s %s",
+                    entry.originator_conversation_id,
+                    result.error_code,
+                    result.error_message,
+                )
+                continue
+            self._update(
+                entry.originator_conversation_id,
+                OutboxStatus.RECONCILING,
+                {"reconcile_conversation_id": result.conversation_id},
+            )
+            queried.append(entry)
+        return queried
+
+    def close(self) -> None:
+        """Commit outstanding writes and stop the writer thread"""
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._writes.put(_STOP)
+            writer.join()
+
+    def _fetchone(self, where: str, params: Tuple[Any, ...]) -> Optional[OutboxEntry]:
+        row = (
+            self._connection()
+            .execute(f"SELECT {_COLUMNS} FROM mpesa_outbox {where}", params)
+            .fetchone()
+        )
+        return None if row is None else _entry(row)
+
+    @staticmethod
+    def _sent(result: Any) -> Optional[Tuple[OutboxStatus, Dict[str, Any]]]:
+        if result.status_ok:
+            return OutboxStatus.ACCEPTED, {
+                "conversation_id": getattr(result, "conversation_id", None)
+            }
+        if result.response.status_code < 500:
+            return OutboxStatus.REJECTED, {
+                "result_code": result.error_code,
+                "result_desc": result.error_message,
+            }
+        # Daraja failed while handling it, the request stays in doubt
+        return None
+
+    @staticmethod
+    def _not_sent(error: BaseException) -> bool:
+        if isinstance(error, MpesaTimeoutError) and error.__cause__ is not None:
+            error = error.__cause__
+        # Any other error may have happened after the request reached Daraja
+        return isinstance(
+            error, (AuthorizationError, CircuitOpenError)
+        ) or is_connect_error(error)
+
+    def _update(
+        self,
+        originator_conversation_id: str,
+        status: OutboxStatus,
+        values: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self._submit(
+            self._set, originator_conversation_id, status, values or {}
+        ).result()
+
+    async def _update_async(
+        self,
+        originator_conversation_id: str,
+        status: OutboxStatus,
+        values: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        await asyncio.wrap_future(
+            self._submit(self._set, originator_conversation_id, status, values or {})
+        )
+
+    @staticmethod
+    def _insert(db: sqlite3.Connection, path: str, payload: Dict[str, Any]) -> str:
+        originator_conversation_id = payload.get("OriginatorConversationID")
+        if not originator_conversation_id:
+            raise ValueError("Requests need an OriginatorConversationID to be recorded")
+        row = db.execute(
+            "SELECT status FROM mpesa_outbox WHERE originator_conversation_id = ?",
+            (originator_conversation_id,),
+        ).fetchone()
+        if row is not None and row[0] not in _RESENDABLE:
+            raise ValueError(
+                f"Request {originator_conversation_id} is {row[0]}, sending it again"
+                " could repeat it"
+            )
+        now = time.time()
+        # Recording the same request again, e.g. when resending, keeps its history
+        db.execute(
+            "INSERT INTO mpesa_outbox (originator_conversation_id, path, payload,"
+            " status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (originator_conversation_id) DO UPDATE SET"
+            " path = excluded.path, payload = excluded.payload,"
+            " status = excluded.status, updated_at = excluded.updated_at",
+            (
+                originator_conversation_id,
+                path,
+                json.dumps(payload, default=str),
+                OutboxStatus.PENDING.value,
+                now,
+                now,
+            ),
+        )
+        return originator_conversation_id
+
+    @staticmethod
+    def _set(
+        db: sqlite3.Connection,
+        originator_conversation_id: str,
+        status: OutboxStatus,
+        values: Dict[str, Any],
+    ) -> None:
+        values = {**values, "status": status.value, "updated_at": time.time()}
+        db.execute(
+            "UPDATE mpesa_outbox SET "
+            + ", ".join(f"{column} = ?" for column in values)
+            + " WHERE originator_conversation_id = ?",
+            (*values.values(), originator_conversation_id),
+        )
+
+    def _submit(self, write: Callable[..., Any], *args: Any) -> "Future[Any]":
+        future: "Future[Any]" = Future()
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(
+                        target=self._write, name="mpesa-outbox", daemon=True
+                    )
+                    self._writer.start()
+        self._writes.put((write, args, future))
+        return future
+
+    def _write(self) -> None:
+        db = self._connection()
+        while True:
+            batch = [self._writes.get()]
+            deadline = time.monotonic() + self.commit_interval
+            while batch[-1] is not _STOP and len(batch) < self.max_batch:
+                try:
+                    batch.append(
+                        self._writes.get(timeout=max(deadline - time.monotonic(), 0))
+                    )
+                except queue.Empty:
+                    break
+            stop = batch[-1] is _STOP
+            if stop:
+                batch.pop()
+            self._commit(db, batch)
+            if stop:
+                return
+
+    def _commit(
+        self,
+        db: sqlite3.Connection,
+        batch: List[Tuple[Callable[..., Any], Tuple[Any, ...], "Future[Any]"]],
+    ) -> None:
+        results: List[Tuple["Future[Any]", Any, Optional[Exception]]] = []
+        try:
+            # Or the outermost savepoint would commit, and sync, every write
+            db.execute("BEGIN")
+            for write, args, future in batch:
+                # A failing write is rolled back on its own, not with the batch
+                db.execute("SAVEPOINT write")
+                try:
+                    results.append((future, write(db, *args), None))
+                except Exception as e:
+                    db.execute("ROLLBACK TO write")
+                    results.append((future, None, e))
+                db.execute("RELEASE write")
+            db.commit()
+        except Exception as e:
+            _logger.exception("Outbox commit failed")
+            db.rollback()
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
@@ -0,0 +1,304 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Collection,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from .ratelimit import RateLimiter
+from .stkpush import STKPush, STKPushQueryErrorResult, STKPushQueryResult
+
+_logger = logging.getLogger(__name__)
+
+# Returned by the query API while the customer has not yet acted on the prompt
+PENDING_ERROR_CODES = frozenset({"500.001.1001"})
+# Result codes of a successful query for a transaction that is still in progress
+PENDING_RESULT_CODES = frozenset({"4999"})
+
+QueryResult = Union[STKPushQueryResult, STKPushQueryErrorResult]
+
+
+@dataclass
+class PollOutcome:
+    checkout_request_id: str
+    result: Optional[QueryResult]
+    attempts: int
+    exception: Optional[BaseException] = None
+
+    @property
+    def status_ok(self) -> bool:
+        return (
+            isinstance(self.result, STKPushQueryResult)
+            and str(self.result.result_code) == "0"
+        )
+
+
+@dataclass
+class _Checkout:
+    checkout_request_id: str
+    query_kwargs: Dict[str, Any]
+    expires_at: float
+    future: "Future[PollOutcome]" = field(default_factory=Future)
+    attempts: int = 0
+    interval: float = 0.0
+    last_result: Optional[QueryResult] = None
+    last_exception: Optional[BaseException] = None
+
+
+class STKPushPoller:
+    """
+    Polls `STKPush.query` for many pending checkouts until each reaches a final
+    result.
+
+    Each checkout is queried on its own backoff schedule with jitter, the
+    queries of all checkouts share a global rate limit, and a checkout tracked
+    more than once is still queried only once at a time. Outcomes are delivered
+    to `on_result`, to the future returned by `track` and to `results()`.
+    """
+
+    def __init__(
+        self,
+        stkpush: STKPush,
+        *,
+        business_short_code: Optional[Union[str, int]] = None,
+        pass_key: Optional[str] = None,
+        on_result: Optional[Callable[[PollOutcome], None]] = None,
+        rate: Optional[Union[float, RateLimiter]] = 5.0,
+        initial_delay: float = 10.0,
+        backoff: float = 1.5,
+        max_interval: float = 60.0,
+        jitter: float = 0.2,
+        timeout: float = 300.0,
+        workers: int = 4,
+        pending_result_codes: Collection[str] = PENDING_RESULT_CODES,
+    ) -> None:
+        """
+        Args:
+            stkpush (STKPush): The API used to query
+            business_short_code: Default short code of tracked checkouts
+            pass_key (str): Default pass key of tracked checkouts
+            on_result (Callable): Called with the outcome of every checkout
+            rate: Maximum queries per second across all checkouts
+            initial_delay (float): Seconds before the first query of a checkout
+            backoff (float): Multiplier of the interval between queries
+            max_interval (float): Maximum seconds between queries
+            jitter (float): Fraction by which each interval is randomized
+            timeout (float): Seconds after which a checkout is given up on
+            workers (int): Maximum number of queries in flight
+            pending_result_codes: `ResultCode`s of queries that keep polling
+        """
+        self.stkpush = stkpush
+        self.business_short_code = business_short_code
+        self.pass_key = pass_key
+        self.on_result = on_result
+        self.limiter = RateLimiter(rate) if isinstance(rate, (int, float)) else rate
+        self.initial_delay = initial_delay
+        self.backoff = backoff
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.timeout = timeout
+        self.workers = workers
+        self.pending_result_codes = pending_result_codes
+        self._checkouts: Dict[str, _Checkout] = {}
+        self._schedule: List[Tuple[float, int, str]] = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._outcomes: "queue.Queue[PollOutcome]" = queue.Queue()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def track(
+        self, checkout_request_id: str, **query_kwargs: Any
+    ) -> "Future[PollOutcome]":
+        """
+        Start polling a checkout
+
+        Args:
+            checkout_request_id (str): The `CheckoutRequestID` of the STK push
+            query_kwargs: Arguments of `STKPush.query` overriding the defaults
+
+        Returns:
+            Future: Completed with the outcome of the checkout
+        """
+        with self._condition:
+            checkout = self._checkouts.get(checkout_request_id)
+            if checkout is not None:
+                return checkout.future
+            query_kwargs.setdefault("business_short_code", self.business_short_code)
+            query_kwargs.setdefault("pass_key", self.pass_key)
+            checkout = _Checkout(
+                checkout_request_id,
+                query_kwargs,
+                time.monotonic() + self.timeout,
+                interval=self.initial_delay,
+            )
+            self._checkouts[checkout_request_id] = checkout
+            self._push(checkout, self.initial_delay)
+        self.start()
+        return checkout.future
+
+    def complete(
+        self, checkout_request_id: str, result: Optional[QueryResult] = None
+    ) -> None:
+        """Stop polling a checkout, e.g. because its callback was received"""
+        with self._condition:
+            checkout = self._checkouts.get(checkout_request_id)
+        if checkout is not None:
+            if result is not None:
+                checkout.last_result = result
+            self._finish(checkout)
+
+    def __len__(self) -> int:
+        return len(self._checkouts)
+
+    def results(self, timeout: Optional[float] = None) -> Iterator[PollOutcome]:
+        """Yield outcomes as checkouts finish, until none are left"""
+        while self._checkouts or not self._outcomes.empty():
+            try:
+                yield self._outcomes.get(timeout=timeout)
+            except queue.Empty:
+                return
+
+    async def __aiter__(self) -> AsyncIterator[PollOutcome]:
+        loop = asyncio.get_running_loop()
+        while self._checkouts or not self._outcomes.empty():
+            yield await loop.run_in_executor(None, self._outcomes.get)
+
+    def start(self) -> None:
+        with self._condition:
+            if self._thread is not None:
+                return
+            self._stopped = False
+            self._executor = ThreadPoolExecutor(max_workers=self.workers)
+            self._thread = threading.Thread(
+                target=self._run, name="stkpush-poller", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop polling, checkouts still pending are finished with their last result"""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        # Or their futures and results() would wait for queries that never come
+        with self._condition:
+            pending = list(self._checkouts.values())
+            self._schedule.clear()
+        for checkout in pending:
+            self._finish(checkout)
+
+    def __enter__(self) -> "STKPushPoller":
+        self.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.stop()
+
+    def _push(self, checkout: _Checkout, delay: float) -> None:
+        if self.jitter:
+            delay *= 1 + random.uniform(-self.jitter, self.jitter)
+        heapq.heappush(
+            self._schedule,
+            (
+                time.monotonic() + delay,
+                next(self._counter),
+                checkout.checkout_request_id,
+            ),
+        )
+        self._condition.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._stopped:
+                    if self._schedule:
+                        wait = self._schedule[0][0] - time.monotonic()
+                        if wait <= 0:
+                            break
+                        self._condition.wait(wait)
+                    else:
+                        self._condition.wait()
+                if self._stopped:
+                    return
+                _, _, checkout_request_id = heapq.heappop(self._schedule)
+                checkout = self._checkouts.get(checkout_request_id)
+            if checkout is None:
+                continue
+            if self.limiter is not None:
+                self.limiter.acquire()
+            assert self._executor is not None
+            self._executor.submit(self._query, checkout)
+
+    def _query(self, checkout: _Checkout) -> None:
+        checkout.attempts += 1
+        try:
+            result = self.stkpush.query(
+                checkout_request_id=checkout.checkout_request_id,
+                **checkout.query_kwargs,
+            )
+        except Exception as e:
+            _logger.warning("Query of %s failed: %r", checkout.checkout_request_id, e)
+            checkout.last_exception = e
+        else:
+            checkout.last_result = result
+            checkout.last_exception = None
+            if self._is_final(result):
+                self._finish(checkout)
+                return
+        if time.monotonic() >= checkout.expires_at:
+            self._finish(checkout)
+            return
+        checkout.interval = min(self.max_interval, checkout.interval * self.backoff)
+        with self._condition:
+            if checkout.checkout_request_id in self._checkouts:
+                self._push(checkout, checkout.interval)
+
+    def _is_final(self, result: QueryResult) -> bool:
+        if isinstance(result, STKPushQueryResult):
+            return str(result.result_code) not in self.pending_result_codes
+        return (
+            result.error_code not in PENDING_ERROR_CODES
+            and result.response.status_code < 500
+            and result.response.status_code != 429
+        )
+
+    def _finish(self, checkout: _Checkout) -> None:
+        with self._condition:
+            if self._checkouts.pop(checkout.checkout_request_id, None) is None:
+                return
+        outcome = PollOutcome(
+            checkout.checkout_request_id,
+            checkout.last_result,
+            checkout.attempts,
+            checkout.last_exception,
+        )
+        checkout.future.set_result(outcome)
+        self._outcomes.put(outcome)
+        if self.on_result is not None:
+            try:
+                self.on_result(outcome)
+            except Exception:
+                _logger.exception("Error handling %s", checkout.checkout_request_id)
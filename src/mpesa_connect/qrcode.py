@@ -1,10 +1,16 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
 from dataclasses import dataclass
-from typing import Optional, Union
-
-import requests
+from typing import Any, Callable, Dict, Mapping, Optional, Union
 
 from .base import API, ErrorResult, Result
 from .enums import TrxCode
+from .timeouts import Timeout
 from .urls import PATH_QRCODE_GENERATE
 
 
@@ -31,6 +37,7 @@ class QRCode(API):
         cpi: str,
         size: Union[str, int],
         access_token: Optional[str] = None,
+        timeout: Optional[Timeout] = None,
     ) -> Union[QRCodeResult, QRCodeErrorResult]:
         payload = {
             "MerchantName": merchant_name,
@@ -40,12 +47,145 @@ class QRCode(API):
             "CPI": cpi,
             "Size": size,
         }
-        response = requests.post(
-            self.get_url(PATH_QRCODE_GENERATE),
-            headers={"Authorization": f"Bearer {access_token or self.access_token}"},
-            json=payload,
+        return self._post(
+            PATH_QRCODE_GENERATE,
+            payload,
+            QRCodeResult,
+            QRCodeErrorResult,
+            access_token=access_token,
+            timeout=timeout,
         )
-        result_dict = self._make_result(response)
-        if response.status_code != 200:
-            return QRCodeErrorResult(**result_dict)
-        return QRCodeResult(**result_dict)
+
+
+def qr_code_key(request: Mapping[str, Any]) -> str:
+    """
+    The content address of a QR code, the same for every request with equal
+    `merchant_name`, `ref_no`, `amount`, `trx_code`, `cpi` and `size`
+    """
+    values = {
+        name: request.get(name)
+        for name in ("merchant_name", "ref_no", "amount", "trx_code", "cpi", "size")
+    }
+    trx_code = values["trx_code"]
+    values["trx_code"] = trx_code.value if isinstance(trx_code, TrxCode) else trx_code
+    canonical = json.dumps({k: str(v) for k, v in values.items()}, sort_keys=True)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class QRCodeCache:
+    """
+    Decoded QR code images by `qr_code_key`, the `max_size` most recently used
+    kept in memory and, when a `directory` is given, all of them on disk.
+
+    Concurrent lookups of a missing image share a single `create` call.
+    """
+
+    def __init__(
+        self, *, max_size: int = 1024, directory: Optional[str] = None
+    ) -> None:
+        """
+        Args:
+            max_size (int): Number of images kept in memory
+            directory (str): Where images are stored as `<key>.png` files
+        """
+        self.max_size = max_size
+        self.directory = directory
+        self._images: "OrderedDict[str, bytes]" = OrderedDict()
+        self._creating: Dict[str, "Future[bytes]"] = {}
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+    def path(self, key: str) -> Optional[str]:
+        """The file of the image on disk, None without a `directory`"""
+        if self.directory is None:
+            return None
+        return os.path.join(self.directory, f"{key}.png")
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                return image
+        image = self._read(key)
+        if image is not None:
+            self._remember(key, image)
+        return image
+
+    def put(self, key: str, image: bytes) -> None:
+        path = self.path(key)
+        if path is not None:
+            _write_atomic(path, image)
+        self._remember(key, image)
+
+    def get_or_create(self, key: str, create: Callable[[], bytes]) -> bytes:
+        """The cached image of `key`, created and cached when missing"""
+        image = self.get(key)
+        if image is not None:
+            return image
+        with self._lock:
+            # Created by a leader that finished after our lookup
+            image = self._images.get(key)
+            if image is not None:
+                return image
+            future = self._creating.get(key)
+            leader = future is None
+            if future is None:
+                future = self._creating[key] = Future()
+        if not leader:
+            return future.result()
+        try:
+            # Only in a file when evicted from memory since our lookup
+            image = self._read(key)
+            if image is None:
+                image = create()
+                self.put(key, image)
+            else:
+                self._remember(key, image)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(image)
+            return image
+        finally:
+            with self._lock:
+                del self._creating[key]
+
+    def clear(self) -> None:
+        """Drop the images kept in memory, files on disk are kept"""
+        with self._lock:
+            self._images.clear()
+
+    def _read(self, key: str) -> Optional[bytes]:
+        path = self.path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _remember(self, key: str, image: bytes) -> None:
+        with self._lock:
+            self._images[key] = image
+            self._images.move_to_end(key)
+            while len(self._images) > self.max_size:
+                self._images.popitem(last=False)
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    # Readers never see a partly written file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
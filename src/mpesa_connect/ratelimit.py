@@ -0,0 +1,195 @@
+import asyncio
+import threading
+import time
+from typing import Any, Callable, Dict, FrozenSet, Iterator, Mapping, Optional, Union
+
+# Spike arrest and quota violation
+THROTTLING_ERROR_CODES: FrozenSet[str] = frozenset({"500.003.02", "500.003.03"})
+
+
+class RateLimiter:
+    """
+    Token bucket rate limiter.
+
+    Tokens are added at `rate` per second up to `burst`. Callers that find the
+    bucket empty reserve a future token and sleep until it is available, so
+    waiting callers are served in arrival order.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        *,
+        burst: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        Args:
+            rate (float): Sustained number of calls per second
+            burst (float): Maximum number of calls allowed back to back, defaults to `rate`
+            clock (Callable): Monotonic time source
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self._clock = clock
+        self._tokens = self.burst
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Block until `tokens` are available, returns the time spent waiting"""
+        delay = self._reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    async def acquire_async(self, tokens: float = 1.0) -> float:
+        delay = self._reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        with self._lock:
+            self._fill()
+            if self._tokens < tokens:
+                return False
+            self._tokens -= tokens
+            return True
+
+    def _reserve(self, tokens: float) -> float:
+        with self._lock:
+            self._fill()
+            self._tokens -= tokens
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+    def _fill(self) -> None:
+        now = self._clock()
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._updated_at) * self.rate
+        )
+        self._updated_at = now
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """
+    Token bucket whose rate backs off multiplicatively when Daraja reports
+    throttling and recovers additively on successful calls, up to `max_rate`.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        *,
+        burst: Optional[float] = None,
+        min_rate: Optional[float] = None,
+        decrease_factor: float = 0.5,
+        increase_step: Optional[float] = None,
+        cooldown: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        Args:
+            rate (float): Initial and maximum calls per second
+            burst (float): Maximum number of calls allowed back to back
+            min_rate (float): Lower bound of the rate, defaults to 5% of `rate`
+            decrease_factor (float): Rate multiplier applied when throttled
+            increase_step (float): Rate added per successful call, defaults to 1% of `rate`
+            cooldown (float): Minimum seconds between two decreases, so that a
+                burst of throttled calls already in flight backs off only once
+            clock (Callable): Monotonic time source
+        """
+        super().__init__(rate, burst=burst, clock=clock)
+        self.max_rate = rate
+        self.min_rate = min_rate if min_rate is not None else rate * 0.05
+        self.decrease_factor = decrease_factor
+        self.increase_step = increase_step if increase_step is not None else rate * 0.01
+        self.cooldown = cooldown
+        self._decreased_at: Optional[float] = None
+
+    def on_throttled(self) -> None:
+        with self._lock:
+            now = self._clock()
+            if (
+                self._decreased_at is not None
+                and now - self._decreased_at < self.cooldown
+            ):
+                return
+            self._fill()
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            self._decreased_at = now
+
+    def on_success(self) -> None:
+        if self.rate >= self.max_rate:
+            return
+        with self._lock:
+            self._fill()
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+
+class RateLimits:
+    """
+    The rate limiters applied to API calls of an app, an optional global one
+    plus optional limiters per endpoint path.
+    """
+
+    def __init__(
+        self,
+        rate: Optional[Union[float, RateLimiter]] = None,
+        paths: Optional[Mapping[str, Union[float, RateLimiter]]] = None,
+        *,
+        adaptive: bool = True,
+    ) -> None:
+        """
+        Args:
+            rate: Calls per second across all endpoints, or a `RateLimiter`
+            paths: Calls per second, or a `RateLimiter`, keyed by path e.g. `PATH_STKPUSH_PROCESSREQUEST`
+            adaptive (bool): Back off the rates given as numbers when throttled
+        """
+        self.adaptive = adaptive
+        self.limiter = self._make(rate)
+        self.path_limiters: Dict[str, RateLimiter] = {
+            path: limiter
+            for path, limiter in ((p, self._make(r)) for p, r in (paths or {}).items())
+            if limiter is not None
+        }
+
+    def _make(self, rate: Optional[Union[float, RateLimiter]]) -> Optional[RateLimiter]:
+        if rate is None or isinstance(rate, RateLimiter):
+            return rate
+        return AdaptiveRateLimiter(rate) if self.adaptive else RateLimiter(rate)
+
+    def limiters(self, path: str) -> Iterator[RateLimiter]:
+        if self.limiter is not None:
+            yield self.limiter
+        limiter = self.path_limiters.get(path)
+        if limiter is not None:
+            yield limiter
+
+    def acquire(self, path: str) -> None:
+        for limiter in self.limiters(path):
+            limiter.acquire()
+
+    async def acquire_async(self, path: str) -> None:
+        for limiter in self.limiters(path):
+            await limiter.acquire_async()
+
+    def feedback(self, path: str, throttled: bool) -> None:
+        for limiter in self.limiters(path):
+            if isinstance(limiter, AdaptiveRateLimiter):
+                if throttled:
+                    limiter.on_throttled()
+                else:
+                    limiter.on_success()
+
+
+def is_throttled(result: Any) -> bool:
+    """Whether a result shows the call was rejected by Daraja rate limiting"""
+    if result.status_ok:
+        return False
+    return (
+        result.response.status_code == 429
+        or result.error_code in THROTTLING_ERROR_CODES
+    )
@@ -0,0 +1,481 @@
+"""
+Reconciliation of C2B confirmations against account statements.
+
+Both sides are streamed and joined on `TransID` with a hash join. When the
+statement has more rows than fit in `memory_rows`, both sides are spilled to
+partition files on disk and joined a partition at a time, so memory stays
+bounded over millions of rows. Rows left unmatched are joined again on their
+`BillRefNumber`, or the hash of their MSISDN, and amount, to tell payments
+recorded under a different transaction id from missing ones.
+"""
+
+import csv
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import zlib
+from collections import Counter
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from enum import Enum
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from .callbacks import C2BCallback
+
+_logger = logging.getLogger(__name__)
+
+Source = Union[str, "os.PathLike[str]", Iterable[Any]]
+
+# Where the fields are found in Daraja confirmations, and by default statements
+DARAJA_COLUMNS = {
+    "trans_id": "TransID",
+    "amount": "TransAmount",
+    "bill_ref_number": "BillRefNumber",
+    "msisdn": "MSISDN",
+    "trans_time": "TransTime",
+}
+
+_SHA256 = re.compile(r"[0-9a-f]{64}")
+_PHONE_NUMBER = re.compile(r"\d{9,12}")
+
+
+def hash_msisdn(msisdn: Any) -> Optional[str]:
+    """
+    The SHA-256 hex digest of a phone number in `2547XXXXXXXX` form, as sent
+    in the `MSISDN` of recent confirmations. Digests are returned as is, and
+    masked numbers such as `2547******149` give None.
+    """
+    value = str(msisdn or "").strip().lower()
+    if _SHA256.fullmatch(value):
+        return value
+    match = _PHONE_NUMBER.search(value)
+    if match is None:
+        return None
+    digits = match.group()
+    if len(digits) == 10 and digits.startswith("0"):
+        digits = "254" + digits[1:]
+    elif len(digits) == 9:
+        digits = "254" + digits
+    return hashlib.sha256(digits.encode()).hexdigest()
+
+
+def _amount(value: Any) -> Optional[Decimal]:
+    try:
+        return Decimal(str(value).replace(",", "").strip())
+    except InvalidOperation:
+        return None
+
+
+@dataclass
+class Payment:
+    trans_id: str
+    amount: Optional[Decimal]
+    bill_ref_number: str
+    msisdn_hash: Optional[str]
+    trans_time: str
+    raw: Dict[str, Any] = field(repr=False, compare=False)
+
+    @classmethod
+    def from_row(
+        cls, row: Union[C2BCallback, Mapping[str, Any]], columns: Mapping[str, str]
+    ) -> "Payment":
+        if isinstance(row, C2BCallback):
+            return cls(
+                row.trans_id.strip(),
+                _amount(row.trans_amount),
+                row.bill_ref_number.strip(),
+                hash_msisdn(row.msisdn),
+                row.trans_time,
+                row.raw,
+            )
+        return cls(
+            str(row.get(columns["trans_id"]) or "").strip(),
+            _amount(row.get(columns["amount"])),
+            str(row.get(columns["bill_ref_number"]) or "").strip(),
+            hash_msisdn(row.get(columns["msisdn"])),
+            str(row.get(columns["trans_time"]) or ""),
+            dict(row),
+        )
+
+    def dumps(self) -> str:
+        return json.dumps(
+            [
+                self.trans_id,
+                None if self.amount is None else str(self.amount),
+                self.bill_ref_number,
+                self.msisdn_hash,
+                self.trans_time,
+                self.raw,
+            ],
+            default=str,
+        )
+
+    @classmethod
+    def loads(cls, line: str) -> "Payment":
+        trans_id, amount, bill_ref_number, msisdn_hash, trans_time, raw = json.loads(
+            line
+        )
+        return cls(
+            trans_id,
+            None if amount is None else Decimal(amount),
+            bill_ref_number,
+            msisdn_hash,
+            trans_time,
+            raw,
+        )
+
+
+class MatchStatus(Enum):
+    MATCHED = "matched"
+    # Matched, but the amount, account reference or phone number differ
+    MISMATCHED = "mismatched"
+    # A confirmation with no statement row
+    MISSING_FROM_STATEMENT = "missing_from_statement"
+    # A statement row with no confirmation
+    MISSING_CONFIRMATION = "missing_confirmation"
+    # A confirmation received again, e.g. a retried delivery
+    DUPLICATE = "duplicate"
+
+
+@dataclass
+class ReconciliationRecord:
+    status: MatchStatus
+    confirmation: Optional[Payment]
+    statement: Optional[Payment]
+    # The fields that differ between the confirmation and statement row
+    differences: Tuple[str, ...] = ()
+
+
+def _trans_id(payment: Payment) -> Optional[str]:
+    return payment.trans_id or None
+
+
+def _reference(payment: Payment) -> Optional[str]:
+    if payment.amount is None:
+        return None
+    if payment.bill_ref_number:
+        return f"ref:{payment.bill_ref_number.upper()}|{payment.amount:.2f}"
+    if payment.msisdn_hash:
+        return f"msisdn:{payment.msisdn_hash}|{payment.amount:.2f}"
+    return None
+
+
+Key = Callable[[Payment], Optional[str]]
+Pair = Tuple[Optional[Payment], Optional[Payment], bool]
+
+
+class _Spill:
+    """Rows kept in memory until there are more than `limit`, then in a file"""
+
+    def __init__(self, directory: str, limit: int) -> None:
+        self.directory = directory
+        self.limit = limit
+        self.rows: List[Payment] = []
+        self.file: Optional[IO[str]] = None
+
+    def append(self, payment: Payment) -> None:
+        if self.file is None:
+            self.rows.append(payment)
+            if len(self.rows) <= self.limit:
+                return
+            self.file = tempfile.TemporaryFile(
+                "w+", dir=self.directory, encoding="utf-8"
+            )
+            rows, self.rows = self.rows, []
+            for row in rows:
+                self.file.write(row.dumps() + "\n")
+        else:
+            self.file.write(payment.dumps() + "\n")
+
+    def __iter__(self) -> Iterator[Payment]:
+        if self.file is None:
+            yield from self.rows
+            return
+        self.file.seek(0)
+        for line in self.file:
+            yield Payment.loads(line)
+
+    def close(self) -> None:
+        self.rows = []
+        if self.file is not None:
+            self.file.close()
+
+
+class Reconciler:
+    """
+    Matches C2B confirmations with statement rows.
+
+    Confirmations are `C2BConfirmationCallback` instances or mappings with the
+    keys Daraja posts to the `ConfirmationURL`. Statement rows are mappings
+    whose columns are named by `statement_columns`. Either side can also be
+    the path of a CSV file, or of a JSON lines file ending with `.jsonl`.
+    """
+
+    def __init__(
+        self,
+        *,
+        statement_columns: Optional[Mapping[str, str]] = None,
+        amount_tolerance: Union[Decimal, str, int] = 0,
+        memory_rows: int = 500_000,
+        partitions: int = 64,
+        spill_dir: Optional[str] = None,
+    ) -> None:
+        """
+        Args:
+            statement_columns (Mapping): Statement column names of `trans_id`,
+                `amount`, `bill_ref_number`, `msisdn` and `trans_time`,
+                defaults to the Daraja names, e.g. `TransID`
+            amount_tolerance: Largest amount difference still considered equal
+            memory_rows (int): Rows of a side held in memory before spilling to disk
+            partitions (int): Number of partition files of a spilled join
+            spill_dir (str): Directory of the partition files, defaults to the
+                system temporary directory
+        """
+        self.statement_columns = {**DARAJA_COLUMNS, **(statement_columns or {})}
+        self.amount_tolerance = Decimal(amount_tolerance)
+        self.memory_rows = memory_rows
+        self.partitions = partitions
+        self.spill_dir = spill_dir
+        self.counts: "Counter[MatchStatus]" = Counter()
+        self.spilled = False
+
+    def reconcile(
+        self, confirmations: Source, statement: Source
+    ) -> Iterator[ReconciliationRecord]:
+        """
+        Args:
+            confirmations: The C2B confirmations
+            statement: The statement rows
+
+        Returns:
+            Iterator: A record per confirmation and per unmatched statement row
+        """
+        self.counts = Counter()
+        self.spilled = False
+        with tempfile.TemporaryDirectory(dir=self.spill_dir) as directory:
+            unconfirmed = _Spill(directory, self.memory_rows)
+            unmatched = _Spill(directory, self.memory_rows)
+            try:
+                pairs = self._join(
+                    directory,
+                    self._payments(statement, self.statement_columns),
+                    self._payments(confirmations, DARAJA_COLUMNS),
+                    _trans_id,
+                    duplicates=True,
+                )
+                for confirmation, row, duplicate in pairs:
+                    if confirmation is None:
+                        unconfirmed.append(row)  # type: ignore[arg-type]
+                    elif row is None:
+                        unmatched.append(confirmation)
+                    elif duplicate:
+                        yield self._emit(MatchStatus.DUPLICATE, confirmation, row)
+                    else:
+                        differences = self._differences(confirmation, row)
+                        status = (
+                            MatchStatus.MISMATCHED
+                            if differences
+                            else MatchStatus.MATCHED
+                        )
+                        yield self._emit(status, confirmation, row, differences)
+                # Payments recorded under another transaction id
+                pairs = self._join(
+                    directory, unconfirmed, unmatched, _reference, duplicates=False
+                )
+                for confirmation, row, _ in pairs:
+                    if confirmation is None:
+                        yield self._emit(MatchStatus.MISSING_CONFIRMATION, None, row)
+                    elif row is None:
+                        yield self._emit(
+                            MatchStatus.MISSING_FROM_STATEMENT, confirmation, None
+                        )
+                    else:
+                        differences = ("trans_id",) + self._differences(
+                            confirmation, row
+                        )
+                        yield self._emit(
+                            MatchStatus.MISMATCHED, confirmation, row, differences
+                        )
+            finally:
+                unconfirmed.close()
+                unmatched.close()
+        _logger.info(
+            "Reconciled %s", ", ".join(f"{n} {s.value}" for s, n in self.counts.items())
+        )
+
+    def _emit(
+        self,
+        status: MatchStatus,
+        confirmation: Optional[Payment],
+        row: Optional[Payment],
+        differences: Tuple[str, ...] = (),
+    ) -> ReconciliationRecord:
+        self.counts[status] += 1
+        return ReconciliationRecord(status, confirmation, row, differences)
+
+    def _differences(self, confirmation: Payment, row: Payment) -> Tuple[str, ...]:
+        differences = []
+        if (
+            confirmation.amount is None
+            or row.amount is None
+            or abs(confirmation.amount - row.amount) > self.amount_tolerance
+        ):
+            differences.append("amount")
+        if (
+            confirmation.bill_ref_number
+            and row.bill_ref_number
+            and confirmation.bill_ref_number.upper() != row.bill_ref_number.upper()
+        ):
+            differences.append("bill_ref_number")
+        if (
+            confirmation.msisdn_hash
+            and row.msisdn_hash
+            and confirmation.msisdn_hash != row.msisdn_hash
+        ):
+            differences.append("msisdn")
+        return tuple(differences)
+
+    def _payments(
+        self, source: Source, columns: Mapping[str, str]
+    ) -> Iterator[Payment]:
+        for row in _rows(source):
+            yield Payment.from_row(row, columns)
+
+    def _join(
+        self,
+        directory: str,
+        build: Iterable[Payment],
+        probe: Iterable[Payment],
+        key: Key,
+        *,
+        duplicates: bool,
+    ) -> Iterator[Pair]:
+        """
+        Yield `(probe, build, duplicate)` for every probe row, with None as the
+        build row when it has no match, then `(None, build, False)` for every
+        build row left unmatched
+        """
+        table: Dict[str, List[Payment]] = {}
+        size = 0
+        rows = iter(build)
+        for row in rows:
+            k = key(row)
+            if k is None:
+                yield None, row, False
+                continue
+            table.setdefault(k, []).append(row)
+            size += 1
+            if size > self.memory_rows:
+                yield from self._grace_join(
+                    directory, table, rows, probe, key, duplicates
+                )
+                return
+        yield from self._probe(table, probe, key, duplicates)
+
+    def _grace_join(
+        self,
+        directory: str,
+        table: Dict[str, List[Payment]],
+        build: Iterator[Payment],
+        probe: Iterable[Payment],
+        key: Key,
+        duplicates: bool,
+    ) -> Iterator[Pair]:
+        self.spilled = True
+        _logger.debug("Spilling join to %d partitions", self.partitions)
+        build_files = self._partition_files(directory)
+        probe_files = self._partition_files(directory)
+        try:
+            for table_key, rows in table.items():
+                for row in rows:
+                    self._spill(build_files, table_key, row)
+            table.clear()
+            for row in build:
+                k = key(row)
+                if k is None:
+                    yield None, row, False
+                else:
+                    self._spill(build_files, k, row)
+            for row in probe:
+                k = key(row)
+                if k is None:
+                    yield row, None, False
+                else:
+                    self._spill(probe_files, k, row)
+            for build_file, probe_file in zip(build_files, probe_files):
+                build_file.seek(0)
+                probe_file.seek(0)
+                for line in build_file:
+                    row = Payment.loads(line)
+                    table.setdefault(key(row), []).append(row)  # type: ignore[arg-type]
+                yield from self._probe(
+                    table, map(Payment.loads, probe_file), key, duplicates
+                )
+                table = {}
+        finally:
+            for f in build_files + probe_files:
+                f.close()
+
+    def _partition_files(self, directory: str) -> List[IO[str]]:
+        return [
+            tempfile.TemporaryFile("w+", dir=directory, encoding="utf-8")
+            for _ in range(self.partitions)
+        ]
+
+    def _spill(self, files: List[IO[str]], k: str, row: Payment) -> None:
+        files[zlib.crc32(k.encode()) % len(files)].write(row.dumps() + "\n")
+
+    @staticmethod
+    def _probe(
+        table: Dict[str, List[Payment]],
+        probe: Iterable[Payment],
+        key: Key,
+        duplicates: bool,
+    ) -> Iterator[Pair]:
+        matched: Dict[str, Payment] = {}
+        for row in probe:
+            k = key(row)
+            rows = table.get(k) if k is not None else None
+            if rows:
+                match = rows.pop()
+                if not rows:
+                    del table[k]  # type: ignore[arg-type]
+                if duplicates:
+                    matched[k] = match  # type: ignore[index]
+                yield row, match, False
+            elif duplicates and k in matched:
+                yield row, matched[k], True  # type: ignore[index]
+            else:
+                yield row, None, False
+        for rows in table.values():
+            for match in rows:
+                yield None, match, False
+
+
+def _rows(source: Source) -> Iterator[Any]:
+    if not isinstance(source, (str, os.PathLike)):
+        yield from source
+        return
+    path = os.fspath(source)
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
@@ -0,0 +1,128 @@
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, FrozenSet, Optional
+
+import requests
+from urllib3.exceptions import NewConnectionError
+
+from .ratelimit import THROTTLING_ERROR_CODES
+from .urls import (
+    PATH_ACCOUNTBALANCE_QUERY,
+    PATH_C2B_REGISTERURL,
+    PATH_OAUTH_GENERATE,
+    PATH_QRCODE_GENERATE,
+    PATH_STKPUSHQUERY_QUERY,
+    PATH_TRANSACTIONSTATUS_QUERY,
+)
+
+# Endpoints that can be called again without side effects
+IDEMPOTENT_PATHS: FrozenSet[str] = frozenset(
+    {
+        PATH_OAUTH_GENERATE,
+        PATH_STKPUSHQUERY_QUERY,
+        PATH_TRANSACTIONSTATUS_QUERY,
+        PATH_ACCOUNTBALANCE_QUERY,
+        PATH_QRCODE_GENERATE,
+        PATH_C2B_REGISTERURL,
+    }
+)
+
+
+@dataclass
+class RetryPolicy:
+    """
+    When and how often to retry a failed API call.
+
+    Calls to idempotent endpoints are retried on connection errors, timeouts
+    and the retryable statuses and error codes. Money moving calls (STK push,
+    B2C, reversal, ...) are only retried when the request provably never
+    reached Daraja: the connection could not be established or the call was
+    rejected by rate limiting. The same payload is resent, so B2C retries keep
+    their `OriginatorConversationID`.
+    """
+
+    max_attempts: int = 3
+    backoff: float = 0.5
+    max_backoff: float = 10.0
+    jitter: bool = True
+    deadline: Optional[float] = None
+    retry_statuses: FrozenSet[int] = frozenset({429, 500, 502, 503, 504})
+    retry_error_codes: FrozenSet[str] = THROTTLING_ERROR_CODES
+    idempotent_paths: FrozenSet[str] = field(default=IDEMPOTENT_PATHS)
+
+    def should_retry_exception(self, path: str, exception: BaseException) -> bool:
+        if is_connect_error(exception):
+            return True
+        return path in self.idempotent_paths and is_transient_error(exception)
+
+    def should_retry_result(self, path: str, result: Any) -> bool:
+        if result.status_ok:
+            return False
+        if path in self.idempotent_paths:
+            return (
+                result.response.status_code in self.retry_statuses
+                or result.error_code in self.retry_error_codes
+            )
+        return (
+            result.response.status_code == 429
+            or result.error_code in THROTTLING_ERROR_CODES
+        )
+
+    def next_delay(self, attempt: int, started_at: float) -> Optional[float]:
+        """
+        Seconds to wait before the next attempt, or None when attempts or the
+        deadline are exhausted.
+
+        Args:
+            attempt (int): The number of attempts made so far
+            started_at (float): `time.monotonic()` when the first attempt started
+        """
+        if attempt >= self.max_attempts:
+            return None
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        if (
+            self.deadline is not None
+            and time.monotonic() + delay - started_at >= self.deadline
+        ):
+            return None
+        return delay
+
+
+def is_connect_error(exception: BaseException) -> bool:
+    """Whether the request failed before a connection to the server was made"""
+    if isinstance(exception, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(exception, requests.exceptions.ConnectionError):
+        reason = exception.args[0] if exception.args else None
+        reason = getattr(reason, "reason", reason)
+        return isinstance(reason, NewConnectionError)
+    try:
+        import httpx
+    except ImportError:
+        return False
+    return isinstance(exception, (httpx.ConnectError, httpx.ConnectTimeout))
+
+
+def is_transient_error(exception: BaseException) -> bool:
+    if isinstance(
+        exception, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+    ):
+        return True
+    try:
+        import httpx
+    except ImportError:
+        return False
+    return isinstance(exception, httpx.TransportError)
+
+
+def is_timeout_error(exception: BaseException) -> bool:
+    if isinstance(exception, requests.exceptions.Timeout):
+        return True
+    try:
+        import httpx
+    except ImportError:
+        return False
+    return isinstance(exception, httpx.TimeoutException)
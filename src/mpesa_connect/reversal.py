@@ -1,15 +1,16 @@
 from dataclasses import dataclass
 from typing import Optional, Union
 
-import requests
-
 from .base import API, ErrorResult, Result
 from .enums import CommandID
+from .timeouts import Timeout
 from .urls import PATH_REVERSAL_REQUEST
 
 
 @dataclass
 class ReversalResult(Result):
+    correlation_key = "conversation_id"
+
     originator_conversation_id: str
     conversation_id: str
     response_code: str
@@ -37,6 +38,7 @@ class Reversal(API):
         remarks: str,
         occasion: str = "",
         access_token: Optional[str] = None,
+        timeout: Optional[Timeout] = None,
     ) -> Union[ReversalResult, ReversalErrorResult]:
         payload = {
             "Initiator": initiator,
@@ -53,12 +55,11 @@ class Reversal(API):
             "Remarks": remarks,
             "Occasion": occasion,
         }
-        response = requests.post(
-            self.get_url(PATH_REVERSAL_REQUEST),
-            headers={"Authorization": f"Bearer {access_token or self.access_token}"},
-            json=payload,
+        return self._post(
+            PATH_REVERSAL_REQUEST,
+            payload,
+            ReversalResult,
+            ReversalErrorResult,
+            access_token=access_token,
+            timeout=timeout,
         )
-        result_dict = self._make_result(response)
-        if response.status_code != 200:
-            return ReversalErrorResult(**result_dict)
-        return ReversalResult(**result_dict)
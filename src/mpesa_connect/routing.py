@@ -0,0 +1,169 @@
+"""
+Routing of API calls over one or more base URLs, e.g. egress gateways or
+proxies in different regions, with failover when an endpoint can't be reached.
+"""
+
+import logging
+import socket
+import threading
+import time
+from typing import Callable, Iterable, List, Literal, Optional
+from urllib.parse import urlsplit
+
+_logger = logging.getLogger(__name__)
+
+
+class Endpoint:
+    __slots__ = ("url", "failures", "down_until")
+
+    def __init__(self, url: str) -> None:
+        self.url = url.rstrip("/")
+        self.failures = 0
+        self.down_until = 0.0
+
+    def __repr__(self) -> str:
+        return f"Endpoint({self.url!r})"
+
+
+class EndpointRouter:
+    """
+    Picks the base URL of every request.
+
+    An endpoint is taken out of rotation for `cooldown` seconds after
+    `failure_threshold` consecutive connection failures, and failed requests
+    are sent to the next endpoint right away since they never reached Daraja.
+    When `health_check_interval` is set, endpoints are also probed in the
+    background and brought back as soon as they accept connections again.
+    """
+
+    def __init__(
+        self,
+        urls: Iterable[str],
+        *,
+        strategy: Literal["round_robin", "priority"] = "round_robin",
+        failure_threshold: int = 1,
+        cooldown: float = 30.0,
+        health_check_interval: Optional[float] = None,
+        health_check_timeout: float = 2.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        Args:
+            urls (Iterable): Base URLs to route to
+            strategy (str): `round_robin` spreads calls over healthy endpoints,
+                `priority` sends them to the first healthy one in order
+            failure_threshold (int): Consecutive connection failures after which
+                an endpoint is considered down
+            cooldown (float): Seconds before a down endpoint is tried again
+            health_check_interval (float): Seconds between background probes of
+                every endpoint, no probes are made when omitted
+            health_check_timeout (float): Connect timeout of a probe
+            clock (Callable): Monotonic time source
+        """
+        self.endpoints = [Endpoint(url) for url in urls]
+        if not self.endpoints:
+            raise ValueError("At least one URL is required")
+        if strategy not in ("round_robin", "priority"):
+            raise ValueError(f"Unknown routing strategy {strategy!r}")
+        self.strategy = strategy
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.health_check_interval = health_check_interval
+        self.health_check_timeout = health_check_timeout
+        self._clock = clock
+        self._next = 0
+        self._lock = threading.Lock()
+        self._checking: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    def select(self) -> str:
+        """The base URL to send the next request to"""
+        if self.health_check_interval is not None and self._checking is None:
+            self.start()
+        if len(self.endpoints) == 1:
+            return self.endpoints[0].url
+        now = self._clock()
+        with self._lock:
+            healthy = [e for e in self.endpoints if e.down_until <= now]
+            if not healthy:
+                # Everything is down, try the one that comes back first
+                return min(self.endpoints, key=lambda e: e.down_until).url
+            if self.strategy == "priority":
+                return healthy[0].url
+            self._next += 1
+            return healthy[self._next % len(healthy)].url
+
+    def report_success(self, url: str) -> None:
+        endpoint = self._endpoint(url)
+        if endpoint is not None and endpoint.failures:
+            with self._lock:
+                endpoint.failures = 0
+                endpoint.down_until = 0.0
+
+    def report_failure(self, url: str) -> None:
+        """Record a failed connection to the endpoint serving `url`"""
+        endpoint = self._endpoint(url)
+        if endpoint is None:
+            return
+        with self._lock:
+            endpoint.failures += 1
+            if endpoint.failures >= self.failure_threshold:
+                endpoint.down_until = self._clock() + self.cooldown
+                _logger.warning(
+                    "%s is down after %d failures", endpoint.url, endpoint.failures
+                )
+
+    def check(self) -> List[Endpoint]:
+        """
+        Probe every endpoint by opening a connection to it
+
+        Returns:
+            list: The endpoints that are up
+        """
+        up = []
+        for endpoint in self.endpoints:
+            parts = urlsplit(endpoint.url)
+            port = parts.port or (443 if parts.scheme == "https" else 80)
+            try:
+                with socket.create_connection(
+                    (parts.hostname, port), self.health_check_timeout
+                ):
+                    pass
+            except OSError as e:
+                _logger.warning("Health check of %s failed: %r", endpoint.url, e)
+                self.report_failure(endpoint.url)
+            else:
+                self.report_success(endpoint.url)
+                up.append(endpoint)
+        return up
+
+    def start(self) -> None:
+        """Probe the endpoints every `health_check_interval` seconds"""
+        with self._lock:
+            if self._checking is not None or self.health_check_interval is None:
+                return
+            self._stopped.clear()
+            self._checking = threading.Thread(
+                target=self._check_periodically, name="mpesa-health-check", daemon=True
+            )
+            self._checking.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        checking, self._checking = self._checking, None
+        if checking is not None:
+            checking.join()
+
+    def _check_periodically(self) -> None:
+        assert self.health_check_interval is not None
+        while not self._stopped.wait(self.health_check_interval):
+            self.check()
+
+    def _endpoint(self, url: str) -> Optional[Endpoint]:
+        for endpoint in self.endpoints:
+            if url == endpoint.url or url.startswith(endpoint.url + "/"):
+                return endpoint
+        return None
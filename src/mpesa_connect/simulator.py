@@ -0,0 +1,575 @@
+"""
+A local stand-in for the Daraja API, for load testing and integration tests.
+
+Every path in `urls.py` is served with responses shaped like Daraja's, and the
+callbacks of asynchronous APIs are posted to the `CallBackURL`, `ResultURL` or
+registered `ConfirmationURL` of the request after a delay. Latency, random
+errors and throttling can be injected.
+
+    with DarajaSimulator(latency=0.05, error_rate=0.01, rate_limit=200) as simulator:
+        app = App(env=AppEnv.SANDBOX, consumer_key="", consumer_secret="", base_url=simulator.url)
+        ...
+"""
+
+import base64
+import heapq
+import itertools
+import json
+import logging
+import random
+import struct
+import threading
+import time
+import urllib.request
+import uuid
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+from urllib.parse import urlsplit
+
+from .ratelimit import RateLimiter
+from .urls import (
+    PATH_ACCOUNTBALANCE_QUERY,
+    PATH_B2C_PAYMENTREQUEST,
+    PATH_C2B_REGISTERURL,
+    PATH_C2B_SIMULATE,
+    PATH_OAUTH_GENERATE,
+    PATH_QRCODE_GENERATE,
+    PATH_REVERSAL_REQUEST,
+    PATH_STKPUSH_PROCESSREQUEST,
+    PATH_STKPUSHQUERY_QUERY,
+    PATH_TRANSACTIONSTATUS_QUERY,
+)
+
+_logger = logging.getLogger(__name__)
+
+V = TypeVar("V")
+
+
+def _png() -> bytes:
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return (
+            struct.pack(">I", len(data))
+            + kind
+            + data
+            + struct.pack(">I", zlib.crc32(kind + data))
+        )
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 0, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(b"\x00\x00"))
+        + chunk(b"IEND", b"")
+    )
+
+
+# A blank 1x1 PNG, the image of every generated QR code
+_QR_CODE = base64.b64encode(_png()).decode()
+
+_Reply = Tuple[int, Dict[str, Any]]
+
+
+def _error(status: int, code: str, message: str) -> _Reply:
+    return status, {
+        "requestId": uuid.uuid4().hex,
+        "errorCode": code,
+        "errorMessage": message,
+    }
+
+
+class DarajaSimulator:
+    """
+    Serves the Daraja API on a local port from a background thread.
+
+    Issued access tokens are checked, STK push queries report the transaction
+    as being processed until its callback is due, and C2B simulations are
+    confirmed to the URLs registered for the short code.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        *,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit: Optional[float] = None,
+        callback_delay: float = 0.5,
+        deliver_callbacks: bool = True,
+        result_code: int = 0,
+        token_ttl: int = 3599,
+        query_retention: float = 60.0,
+        seed: Optional[int] = None,
+    ) -> None:
+        """
+        Args:
+            host (str): Interface to listen on
+            port (int): Port to listen on, a free one when 0
+            latency (float): Seconds every request takes
+            jitter (float): Up to this many seconds are randomly added to `latency`
+            error_rate (float): Fraction of requests failed with 503 Service Unavailable
+            rate_limit (float): Requests per second above which requests are
+                throttled with 429 spike arrest errors
+            callback_delay (float): Seconds after which callbacks are delivered
+            deliver_callbacks (bool): Post callbacks to the URLs of the requests
+            result_code (int): `ResultCode` of every callback, 0 for success
+            token_ttl (int): Seconds issued access tokens are valid for
+            query_retention (float): Seconds an STK push can still be queried
+                after its callback is due
+            seed (int): Seed of the latency and error randomness
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.callback_delay = callback_delay
+        self.deliver_callbacks = deliver_callbacks
+        self.result_code = result_code
+        self.token_ttl = token_ttl
+        self.query_retention = query_retention
+        self.requests: Counter[str] = Counter()
+        self.callbacks_sent = 0
+        self._limiter = RateLimiter(rate_limit) if rate_limit else None
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._tokens: Dict[str, float] = {}
+        self._stk: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._c2b_urls: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._routes: Dict[str, Callable[[Dict[str, Any]], _Reply]] = {
+            PATH_OAUTH_GENERATE: lambda payload: (200, self._oauth()),
+            PATH_STKPUSH_PROCESSREQUEST: self._stkpush,
+            PATH_STKPUSHQUERY_QUERY: self._stkpush_query,
+            PATH_C2B_REGISTERURL: self._c2b_register,
+            PATH_C2B_SIMULATE: self._c2b_simulate,
+            PATH_B2C_PAYMENTREQUEST: self._b2c,
+            PATH_REVERSAL_REQUEST: self._reversal,
+            PATH_ACCOUNTBALANCE_QUERY: self._account_balance,
+            PATH_TRANSACTIONSTATUS_QUERY: self._transaction_status,
+            PATH_QRCODE_GENERATE: self._qrcode,
+        }
+        self._server = _Server((host, port), _Handler)
+        self._server.simulator = self
+        self._serving: Optional[threading.Thread] = None
+        self._outbox: List[Tuple[float, int, str, Dict[str, Any]]] = []
+        self._outbox_ready = threading.Condition()
+        self._delivering: Optional[threading.Thread] = None
+        self._senders: Optional[ThreadPoolExecutor] = None
+        self._running = False
+
+    @property
+    def url(self) -> str:
+        """The base URL to give to `App`"""
+        host, port = self._server.server_address[:2]
+        if isinstance(host, bytes):
+            host = host.decode()
+        return f"http://{host}:{port}"
+
+    def start(self) -> "DarajaSimulator":
+        if self._running:
+            return self
+        self._running = True
+        self._senders = ThreadPoolExecutor(4, thread_name_prefix="daraja-callback")
+        self._delivering = threading.Thread(
+            target=self._deliver, name="daraja-callbacks", daemon=True
+        )
+        self._delivering.start()
+        self._serving = threading.Thread(
+            target=self._server.serve_forever, name="daraja-simulator", daemon=True
+        )
+        self._serving.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving, callbacks that are not yet due are dropped"""
+        if not self._running:
+            return
+        self._running = False
+        self._server.shutdown()
+        self._server.server_close()
+        with self._outbox_ready:
+            self._outbox_ready.notify()
+        if self._delivering is not None:
+            self._delivering.join()
+        if self._senders is not None:
+            self._senders.shutdown()
+
+    def __enter__(self) -> "DarajaSimulator":
+        return self.start()
+
+    def __exit__(self, *args: Any) -> None:
+        self.stop()
+
+    def handle(self, method: str, path: str, headers: Any, body: bytes) -> _Reply:
+        """Produce the status code and JSON body of a request"""
+        route = self._routes.get(path)
+        if route is None:
+            return _error(404, "404.001.01", "Resource not found")
+        with self._lock:
+            self.requests[path] += 1
+        delay = self.latency + (
+            self._random.uniform(0, self.jitter) if self.jitter else 0
+        )
+        if delay > 0:
+            time.sleep(delay)
+        if self._limiter is not None and not self._limiter.try_acquire():
+            return _error(429, "500.003.02", "Spike arrest violation")
+        if path == PATH_OAUTH_GENERATE:
+            if method != "GET":
+                return _error(405, "405.001.01", "Method not allowed")
+            if not headers.get("Authorization", "").startswith("Basic "):
+                return _error(400, "400.008.01", "Invalid Authentication passed")
+            return route({})
+        if method != "POST":
+            return _error(405, "405.001.01", "Method not allowed")
+        if not self._authorized(headers.get("Authorization", "")):
+            return _error(401, "404.001.03", "Invalid Access Token")
+        if self.error_rate and self._random.random() < self.error_rate:
+            return _error(503, "503.001.01", "Service Unavailable")
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return _error(400, "400.002.02", "Bad Request - Invalid JSON")
+        return route(payload)
+
+    def _authorized(self, authorization: str) -> bool:
+        scheme, _, token = authorization.partition(" ")
+        expires_at = self._tokens.get(token)
+        return (
+            scheme == "Bearer" and expires_at is not None and time.time() < expires_at
+        )
+
+    def _next_id(self) -> int:
+        with self._lock:
+            return next(self._ids)
+
+    def _conversation_ids(self, payload: Dict[str, Any]) -> Tuple[str, str]:
+        n = self._next_id()
+        return (
+            f"AG_{datetime.now():%Y%m%d}_{n:020x}",
+            payload.get("OriginatorConversationID") or f"{n}-{n}-1",
+        )
+
+    def _oauth(self) -> Dict[str, Any]:
+        token = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            _prune(self._tokens, lambda expires_at: expires_at <= now)
+            self._tokens[token] = now + self.token_ttl
+        return {"access_token": token, "expires_in": str(self.token_ttl)}
+
+    def _stkpush(self, payload: Dict[str, Any]) -> _Reply:
+        n = self._next_id()
+        merchant_request_id = f"{n}-{n}-1"
+        checkout_request_id = f"ws_CO_{datetime.now():%d%m%Y%H%M%S}{n:06d}"
+        callback = {
+            "MerchantRequestID": merchant_request_id,
+            "CheckoutRequestID": checkout_request_id,
+            "ResultCode": self.result_code,
+            "ResultDesc": self._result_desc(),
+        }
+        if self.result_code == 0:
+            callback["CallbackMetadata"] = {
+                "Item": [
+                    {"Name": "Amount", "Value": payload.get("Amount")},
+                    {"Name": "MpesaReceiptNumber", "Value": self._receipt(n)},
+                    {
+                        "Name": "TransactionDate",
+                        "Value": int(f"{datetime.now():%Y%m%d%H%M%S}"),
+                    },
+                    {"Name": "PhoneNumber", "Value": payload.get("PhoneNumber")},
+                ]
+            }
+        now = time.monotonic()
+        due = now + self.callback_delay
+        with self._lock:
+            _prune(self._stk, lambda entry: entry[0] + self.query_retention <= now)
+            self._stk[checkout_request_id] = (due, callback)
+        self._schedule(
+            due, payload.get("CallBackURL"), {"Body": {"stkCallback": callback}}
+        )
+        return 200, {
+            "MerchantRequestID": merchant_request_id,
+            "CheckoutRequestID": checkout_request_id,
+            "ResponseCode": "0",
+            "ResponseDescription": "Success. Request accepted for processing",
+            "CustomerMessage": "Success. Request accepted for processing",
+        }
+
+    def _stkpush_query(self, payload: Dict[str, Any]) -> _Reply:
+        checkout_request_id = payload.get("CheckoutRequestID", "")
+        with self._lock:
+            entry = self._stk.get(checkout_request_id)
+        if entry is None:
+            return _error(400, "400.002.02", "Bad Request - Invalid CheckoutRequestID")
+        due, callback = entry
+        if time.monotonic() < due:
+            return _error(500, "500.001.1001", "The transaction is being processed")
+        return 200, {
+            "ResponseCode": "0",
+            "ResponseDescription": "The service request has been accepted successsfully",
+            "MerchantRequestID": callback["MerchantRequestID"],
+            "CheckoutRequestID": checkout_request_id,
+            "ResultCode": str(callback["ResultCode"]),
+            "ResultDesc": callback["ResultDesc"],
+        }
+
+    def _c2b_register(self, payload: Dict[str, Any]) -> _Reply:
+        with self._lock:
+            self._c2b_urls[str(payload.get("ShortCode"))] = payload.get(
+                "ConfirmationURL", ""
+            )
+        return 200, {
+            "OriginatorCoversationID": self._conversation_ids(payload)[1],
+            "ResponseCode": "0",
+            "ResponseDescription": "Success",
+        }
+
+    def _c2b_simulate(self, payload: Dict[str, Any]) -> _Reply:
+        short_code = str(payload.get("ShortCode"))
+        n = self._next_id()
+        self._schedule(
+            time.monotonic() + self.callback_delay,
+            self._c2b_urls.get(short_code),
+            {
+                "TransactionType": "Pay Bill",
+                "TransID": self._receipt(n),
+                "TransTime": f"{datetime.now():%Y%m%d%H%M%S}",
+                "TransAmount": str(payload.get("Amount")),
+                "BusinessShortCode": short_code,
+                "BillRefNumber": payload.get("BillRefNumber") or "",
+                "InvoiceNumber": "",
+                "OrgAccountBalance": "",
+                "ThirdPartyTransID": "",
+                "MSISDN": str(payload.get("Msisdn")),
+                "FirstName": "John",
+                "MiddleName": "",
+                "LastName": "Doe",
+            },
+        )
+        return 200, {
+            "OriginatorCoversationID": self._conversation_ids(payload)[1],
+            "ResponseCode": "0",
+            "ResponseDescription": "Accept the service request successfully.",
+        }
+
+    def _b2c(self, payload: Dict[str, Any]) -> _Reply:
+        return self._accept_result(
+            payload,
+            lambda receipt: [
+                {"Key": "TransactionAmount", "Value": payload.get("Amount")},
+                {"Key": "TransactionReceipt", "Value": receipt},
+                {"Key": "ReceiverPartyPublicName", "Value": payload.get("PartyB")},
+                {
+                    "Key": "TransactionCompletedDateTime",
+                    "Value": f"{datetime.now():%d.%m.%Y %H:%M:%S}",
+                },
+            ],
+        )
+
+    def _reversal(self, payload: Dict[str, Any]) -> _Reply:
+        return self._accept_result(
+            payload,
+            lambda receipt: [
+                {"Key": "Amount", "Value": payload.get("Amount")},
+                {"Key": "OriginalTransactionID", "Value": payload.get("TransactionID")},
+            ],
+        )
+
+    def _account_balance(self, payload: Dict[str, Any]) -> _Reply:
+        return self._accept_result(
+            payload,
+            lambda receipt: [
+                {
+                    "Key": "AccountBalance",
+                    "Value": "Working Account|KES|700000.00|700000.00|0.00|0.00"
+                    "&Utility Account|KES|228037.00|228037.00|0.00|0.00",
+                },
+                {
+                    "Key": "BOCompletedTime",
+                    "Value": int(f"{datetime.now():%Y%m%d%H%M%S}"),
+                },
+            ],
+        )
+
+    def _transaction_status(self, payload: Dict[str, Any]) -> _Reply:
+        return self._accept_result(
+            payload,
+            lambda receipt: [
+                {"Key": "ReceiptNo", "Value": payload.get("TransactionID")},
+                {"Key": "TransactionStatus", "Value": "Completed"},
+                {"Key": "Amount", "Value": 100},
+            ],
+        )
+
+    def _qrcode(self, payload: Dict[str, Any]) -> _Reply:
+        n = self._next_id()
+        return 200, {
+            "ResponseCode": f"AG_{datetime.now():%Y%m%d}_{n:020x}",
+            "RequestID": f"{n:020x}",
+            "ResponseDescription": "QR Code Successfully Generated.",
+            "QRCode": _QR_CODE,
+        }
+
+    def _accept_result(self, payload: Dict[str, Any], parameters: Any) -> _Reply:
+        conversation_id, originator_conversation_id = self._conversation_ids(payload)
+        result: Dict[str, Any] = {
+            "ResultType": 0,
+            "ResultCode": self.result_code,
+            "ResultDesc": self._result_desc(),
+            "OriginatorConversationID": originator_conversation_id,
+            "ConversationID": conversation_id,
+            "TransactionID": self._receipt(self._next_id()),
+            "ReferenceData": {
+                "ReferenceItem": {
+                    "Key": "QueueTimeoutURL",
+                    "Value": payload.get("QueueTimeOutURL"),
+                }
+            },
+        }
+        if self.result_code == 0:
+            result["ResultParameters"] = {
+                "ResultParameter": parameters(result["TransactionID"])
+            }
+        self._schedule(
+            time.monotonic() + self.callback_delay,
+            payload.get("ResultURL"),
+            {"Result": result},
+        )
+        return 200, {
+            "ConversationID": conversation_id,
+            "OriginatorConversationID": originator_conversation_id,
+            "ResponseCode": "0",
+            "ResponseDescription": "Accept the service request successfully.",
+        }
+
+    def _result_desc(self) -> str:
+        if self.result_code == 0:
+            return "The service request is processed successfully."
+        return "The transaction has failed."
+
+    def _receipt(self, n: int) -> str:
+        return f"SIM{n:07X}"
+
+    def _schedule(self, due: float, url: Optional[str], body: Dict[str, Any]) -> None:
+        if not self.deliver_callbacks or not url:
+            return
+        with self._outbox_ready:
+            heapq.heappush(self._outbox, (due, self._next_id(), url, body))
+            self._outbox_ready.notify()
+
+    def _deliver(self) -> None:
+        while True:
+            with self._outbox_ready:
+                while self._running:
+                    now = time.monotonic()
+                    if self._outbox and self._outbox[0][0] <= now:
+                        _, _, url, body = heapq.heappop(self._outbox)
+                        break
+                    self._outbox_ready.wait(
+                        self._outbox[0][0] - now if self._outbox else None
+                    )
+                else:
+                    return
+            assert self._senders is not None
+            self._senders.submit(self._post_callback, url, body)
+
+    def _post_callback(self, url: str, body: Dict[str, Any]) -> None:
+        request = urllib.request.Request(
+            url,
+            data=json.dumps(body).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                response.read()
+        except Exception as e:
+            _logger.warning("Callback to %s failed: %r", url, e)
+        else:
+            with self._lock:
+                self.callbacks_sent += 1
+
+
+def _prune(entries: Dict[str, V], expired: Callable[[V], bool]) -> None:
+    # Entries are added in the order they expire, stop at the first live one
+    while entries:
+        key = next(iter(entries))
+        if not expired(entries[key]):
+            return
+        del entries[key]
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Load tests open many connections at once
+    request_queue_size = 1024
+    simulator: DarajaSimulator
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, don't let them wait on delayed ACKs
+    disable_nagle_algorithm = True
+    server: _Server
+
+    def do_GET(self) -> None:
+        self._reply("GET")
+
+    def do_POST(self) -> None:
+        self._reply("POST")
+
+    def _reply(self, method: str) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        status, payload = self.server.simulator.handle(
+            method, urlsplit(self.path).path, self.headers, body
+        )
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve a local Daraja simulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=None)
+    parser.add_argument("--callback-delay", type=float, default=0.5)
+    parser.add_argument("--result-code", type=int, default=0)
+    args = parser.parse_args()
+    simulator = DarajaSimulator(
+        args.host,
+        args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        callback_delay=args.callback_delay,
+        result_code=args.result_code,
+    )
+    with simulator:
+        print(f"Daraja simulator listening on {simulator.url}", flush=True)
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
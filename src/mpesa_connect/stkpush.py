@@ -1,16 +1,17 @@
 from dataclasses import dataclass
 from typing import Optional, Tuple, Union
 
-import requests
-
 from .base import API, ErrorResult, Result
 from .enums import TransactionType
+from .timeouts import Timeout
 from .urls import PATH_STKPUSH_PROCESSREQUEST, PATH_STKPUSHQUERY_QUERY
 from .utils import generate_password, str_now
 
 
 @dataclass
 class STKPushResult(Result):
+    correlation_key = "checkout_request_id"
+
     response_code: str
     response_description: str
     customer_message: str
@@ -55,6 +56,7 @@ class STKPush(API):
         timestamp: Optional[str] = None,
         pass_key: Optional[str] = None,
         access_token: Optional[str] = None,
+        timeout: Optional[Timeout] = None,
     ) -> Union[STKPushResult, STKPushErrorResult]:
         if not password:
             password, timestamp = self._generate_password(
@@ -79,15 +81,14 @@ class STKPush(API):
             "AccountReference": account_reference,
             "TransactionDesc": transaction_desc,
         }
-        response = requests.post(
-            self.get_url(PATH_STKPUSH_PROCESSREQUEST),
-            headers={"Authorization": f"Bearer {access_token or self.access_token}"},
-            json=payload,
+        return self._post(
+            PATH_STKPUSH_PROCESSREQUEST,
+            payload,
+            STKPushResult,
+            STKPushErrorResult,
+            access_token=access_token,
+            timeout=timeout,
         )
-        result_dict = self._make_result(response)
-        if response.status_code != 200:
-            return STKPushErrorResult(**result_dict)
-        return STKPushResult(**result_dict)
 
     def query(
         self,
@@ -98,6 +99,7 @@ class STKPush(API):
         timestamp: Optional[str] = None,
         pass_key: Optional[str] = None,
         access_token: Optional[str] = None,
+        timeout: Optional[Timeout] = None,
     ) -> Union[STKPushQueryResult, STKPushQueryErrorResult]:
         if not password:
             password, timestamp = self._generate_password(
@@ -111,15 +113,14 @@ class STKPush(API):
             "Timestamp": timestamp,
             "CheckoutRequestID": checkout_request_id,
         }
-        response = requests.post(
-            self.get_url(PATH_STKPUSHQUERY_QUERY),
-            headers={"Authorization": f"Bearer {access_token or self.access_token}"},
-            json=payload,
+        return self._post(
+            PATH_STKPUSHQUERY_QUERY,
+            payload,
+            STKPushQueryResult,
+            STKPushQueryErrorResult,
+            access_token=access_token,
+            timeout=timeout,
         )
-        result_dict = self._make_result(response)
-        if response.status_code != 200:
-            return STKPushQueryErrorResult(**result_dict)
-        return STKPushQueryResult(**result_dict)
 
     def _generate_password(
         self,
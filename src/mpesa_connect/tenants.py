@@ -0,0 +1,230 @@
+"""
+Long lived apps for many merchants, each with its own consumer key, short code
+and initiator credentials, so that switching merchants reuses their access
+token and pooled connections instead of creating them again.
+"""
+
+import logging
+import pathlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Literal,
+    Mapping,
+    Optional,
+    Type,
+    TypeVar,
+    Union,
+)
+
+from .app import App, AppEnv
+from .base import API
+from .credentials import SecurityCredentialProvider
+from .exceptions import MpesaConnectError
+
+_logger = logging.getLogger(__name__)
+
+A = TypeVar("A", bound=API)
+
+
+@dataclass
+class TenantConfig:
+    consumer_key: str
+    consumer_secret: str
+    env: Union[AppEnv, Literal["sandbox", "live"]] = AppEnv.LIVE
+    business_short_code: Optional[str] = None
+    pass_key: Optional[str] = None
+    initiator_name: Optional[str] = None
+    initiator_password: Optional[str] = field(default=None, repr=False)
+    certificate: Optional[Union[pathlib.Path, str, bytes]] = field(
+        default=None, repr=False
+    )
+    # Extra keyword arguments of the tenant's `App`
+    app_options: Dict[str, Any] = field(default_factory=dict)
+
+
+class Tenant:
+    """The app and credentials of one merchant"""
+
+    __slots__ = ("tenant_id", "config", "app", "last_used", "_credentials", "_apis")
+
+    def __init__(self, tenant_id: str, config: TenantConfig, app: App) -> None:
+        self.tenant_id = tenant_id
+        self.config = config
+        self.app = app
+        self.last_used = 0.0
+        self._credentials: Optional[SecurityCredentialProvider] = None
+        self._apis: Dict[type, API] = {}
+
+    def api(self, api_class: Type[A]) -> A:
+        """An instance of `api_class` bound to the tenant's app, e.g. `tenant.api(B2C)`"""
+        try:
+            return self._apis[api_class]  # type: ignore[return-value]
+        except KeyError:
+            return self._apis.setdefault(api_class, api_class(self.app))  # type: ignore[return-value]
+
+    @property
+    def credentials(self) -> SecurityCredentialProvider:
+        if self._credentials is None:
+            if self.config.certificate is None:
+                raise MpesaConnectError(f"Tenant {self.tenant_id} has no certificate")
+            self._credentials = SecurityCredentialProvider(
+                self.config.certificate, cache_ttl=3600
+            )
+        return self._credentials
+
+    def security_credential(self) -> str:
+        """The encrypted initiator password of the tenant"""
+        if self.config.initiator_password is None:
+            raise MpesaConnectError(
+                f"Tenant {self.tenant_id} has no initiator password"
+            )
+        return self.credentials.generate(self.config.initiator_password)
+
+
+class TenantRegistry:
+    """
+    Creates a `Tenant` the first time it is used and keeps it for later calls.
+
+    At most `max_tenants` are kept, the least recently used are evicted first,
+    as are tenants idle for longer than `idle_timeout`. Evicted tenants have
+    their connections closed and are recreated from their config when used again.
+    """
+
+    def __init__(
+        self,
+        configs: Union[
+            Mapping[str, TenantConfig], Callable[[str], Optional[TenantConfig]]
+        ],
+        *,
+        max_tenants: int = 256,
+        idle_timeout: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        **app_options: Any,
+    ) -> None:
+        """
+        Args:
+            configs: Tenant configs by id, or a function looking up the config
+                of a tenant id, e.g. in a database
+            max_tenants (int): Maximum number of tenants kept
+            idle_timeout (float): Seconds after which an unused tenant is evicted
+            clock (Callable): Monotonic time source
+            app_options: Keyword arguments of every tenant's `App`, e.g. `timeout`
+        """
+        self._configs = configs
+        self.max_tenants = max_tenants
+        self.idle_timeout = idle_timeout
+        self.app_options = app_options
+        self._clock = clock
+        self._tenants: "OrderedDict[str, Tenant]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._tenants)
+
+    def __contains__(self, tenant_id: str) -> bool:
+        return tenant_id in self._tenants
+
+    def get(self, tenant_id: str) -> Tenant:
+        """
+        Args:
+            tenant_id (str): The id of the tenant
+
+        Returns:
+            Tenant: The cached tenant, created from its config if needed
+        """
+        now = self._clock()
+        config = None
+        while True:
+            with self._lock:
+                tenant = self._tenants.get(tenant_id)
+                if tenant is None and config is not None:
+                    tenant = Tenant(tenant_id, config, self._create_app(config))
+                    self._tenants[tenant_id] = tenant
+                if tenant is not None:
+                    self._tenants.move_to_end(tenant_id)
+                    tenant.last_used = now
+                    evicted = self._expire(now)
+                    break
+            # Loaded without holding the lock, the loader may be slow
+            config = self._config(tenant_id)
+        for stale in evicted:
+            self._close(stale)
+        return tenant
+
+    def __getitem__(self, tenant_id: str) -> Tenant:
+        return self.get(tenant_id)
+
+    def evict(self, tenant_id: str) -> None:
+        """Drop a tenant, e.g. after its credentials changed"""
+        with self._lock:
+            tenant = self._tenants.pop(tenant_id, None)
+        if tenant is not None:
+            self._close(tenant)
+
+    def close(self) -> None:
+        """Close the connections of every tenant"""
+        with self._lock:
+            tenants = list(self._tenants.values())
+            self._tenants.clear()
+        for tenant in tenants:
+            tenant.app.close()
+
+    async def aclose(self) -> None:
+        """Close the connections of every tenant, including async clients"""
+        with self._lock:
+            tenants = list(self._tenants.values())
+            self._tenants.clear()
+        for tenant in tenants:
+            await tenant.app.aclose()
+
+    def __enter__(self) -> "TenantRegistry":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    async def __aenter__(self) -> "TenantRegistry":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.aclose()
+
+    def _config(self, tenant_id: str) -> TenantConfig:
+        if callable(self._configs):
+            config = self._configs(tenant_id)
+        else:
+            config = self._configs.get(tenant_id)
+        if config is None:
+            raise KeyError(tenant_id)
+        return config
+
+    def _create_app(self, config: TenantConfig) -> App:
+        return App(
+            env=config.env,
+            consumer_key=config.consumer_key,
+            consumer_secret=config.consumer_secret,
+            **{**self.app_options, **config.app_options},
+        )
+
+    def _expire(self, now: float) -> List[Tenant]:
+        evicted = []
+        while len(self._tenants) > self.max_tenants:
+            evicted.append(self._tenants.popitem(last=False)[1])
+        if self.idle_timeout is not None:
+            # Least recently used first, stop at the first one still in use
+            for tenant_id, tenant in list(self._tenants.items()):
+                if now - tenant.last_used < self.idle_timeout:
+                    break
+                evicted.append(self._tenants.pop(tenant_id))
+        return evicted
+
+    def _close(self, tenant: Tenant) -> None:
+        _logger.debug("Evicting tenant %s", tenant.tenant_id)
+        tenant.app.close()
@@ -0,0 +1,56 @@
+import time
+from typing import Optional, Tuple, Union
+
+from .exceptions import MpesaTimeoutError
+
+Timeout = Union[float, Tuple[float, float]]
+
+DEFAULT_TIMEOUT: Timeout = (5.0, 30.0)
+
+
+class Budget:
+    """
+    The time allowed for one API call, shared by its retries and any token
+    refresh made on its behalf.
+    """
+
+    def __init__(
+        self,
+        timeout: Optional[Timeout] = None,
+        deadline: Optional[float] = None,
+    ) -> None:
+        """
+        Args:
+            timeout: `(connect, read)` timeout in seconds of each HTTP request
+            deadline (float): Seconds the whole call may take
+        """
+        self.timeout = timeout
+        self.deadline_at = time.monotonic() + deadline if deadline is not None else None
+
+    def remaining(self) -> Optional[float]:
+        if self.deadline_at is None:
+            return None
+        return self.deadline_at - time.monotonic()
+
+    def check(self) -> None:
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            raise MpesaTimeoutError("Deadline exceeded")
+
+    def allows(self, delay: float) -> bool:
+        """Whether there is time left after waiting `delay` seconds"""
+        remaining = self.remaining()
+        return remaining is None or delay < remaining
+
+    def request_timeout(self) -> Optional[Timeout]:
+        """The timeout of the next HTTP request, cut short by the deadline"""
+        self.check()
+        remaining = self.remaining()
+        if remaining is None:
+            return self.timeout
+        if self.timeout is None:
+            return remaining
+        if isinstance(self.timeout, tuple):
+            connect, read = self.timeout
+            return min(connect, remaining), min(read, remaining)
+        return min(self.timeout, remaining)
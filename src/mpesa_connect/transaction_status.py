@@ -1,15 +1,16 @@
 from dataclasses import dataclass
 from typing import Optional, Union
 
-import requests
-
 from .base import API, ErrorResult, Result
 from .enums import CommandID, IdentifierType
+from .timeouts import Timeout
 from .urls import PATH_TRANSACTIONSTATUS_QUERY
 
 
 @dataclass
 class TransactionStatusResult(Result):
+    correlation_key = "conversation_id"
+
     conversation_id: str
     originator_conversation_id: str
     response_code: str
@@ -36,7 +37,9 @@ class TransactionStatus(API):
         result_url: str,
         command_id: Union[CommandID, str] = CommandID.TRANSACTION_STATUS_QUERY,
         occassion: Optional[str] = None,
+        original_conversation_id: Optional[str] = None,
         access_token: Optional[str] = None,
+        timeout: Optional[Timeout] = None,
     ) -> Union[TransactionStatusResult, TransactionStatusErrorResult]:
         payload = {
             "OriginatorConversationID": originator_conversation_id,
@@ -57,12 +60,14 @@ class TransactionStatus(API):
             "ResultURL": result_url,
             "Occassion": occassion,
         }
-        response = requests.post(
-            self.get_url(PATH_TRANSACTIONSTATUS_QUERY),
-            headers={"Authorization": f"Bearer {access_token or self.access_token}"},
-            json=payload,
+        if original_conversation_id is not None:
+            # Looks the transaction up by the request id when there is no receipt
+            payload["OriginalConversationID"] = original_conversation_id
+        return self._post(
+            PATH_TRANSACTIONSTATUS_QUERY,
+            payload,
+            TransactionStatusResult,
+            TransactionStatusErrorResult,
+            access_token=access_token,
+            timeout=timeout,
         )
-        result_dict = self._make_result(response)
-        if response.status_code != 200:
-            return TransactionStatusErrorResult(**result_dict)
-        return TransactionStatusResult(**result_dict)
@@ -3,7 +3,8 @@ import logging
 import pathlib
 import re
 from datetime import datetime
-from typing import Union
+from functools import lru_cache
+from typing import Any, Union
 
 _logger = logging.getLogger(__name__)
 
@@ -16,6 +17,7 @@ def str_now() -> str:
     return datetime.now().strftime("%Y%m%d%H%M%S")
 
 
+@lru_cache(maxsize=4096)
 def convert_to_snake_case(str: str) -> str:
     return re.sub(r"((?<=[a-z0-9])[A-Z]|(?!^)[A-Z](?=[a-z]))", r"_\1", str).lower()
 
@@ -42,14 +44,6 @@ def generate_security_credential(
     Returns:
         str: Base64 encoded security credential
     """
-    try:
-        from cryptography import x509
-        from cryptography.hazmat.primitives.asymmetric import padding
-    except ImportError as e:
-        _logger.error(str(e))
-        raise Exception(
-            "Cryptography library is not installed, please install with `pip install mpesa-connect[cryptography]`"
-        ) from e
     try:
         # Read the certificate
         if isinstance(cer, pathlib.Path):
@@ -60,13 +54,36 @@ def generate_security_credential(
                 data = f.read()
         else:
             data = cer
-        # Extract public key
-        certificate = x509.load_pem_x509_certificate(data)
-        public_key = certificate.public_key()
-        # Encrypt using RSA with PKCS1v1.5 padding
-        encrypted_bytes = public_key.encrypt(password.encode(), padding.PKCS1v15())
-        # Convert to base64 string
-        return base64.b64encode(encrypted_bytes).decode()
+        return encrypt_security_credential(password, load_public_key(data))
     except Exception as e:
         _logger.error(str(e))
         raise Exception(f"Error generating security credential: {str(e)}") from e
+
+
+def load_public_key(data: bytes) -> Any:
+    """
+    Extract the public key from a PEM certificate
+
+    Args:
+        data (bytes): X509 certificate as a PEM string in bytes
+
+    Returns:
+        RSAPublicKey: The public key
+    """
+    try:
+        from cryptography import x509
+    except ImportError as e:
+        _logger.error(str(e))
+        raise Exception(
+            "Cryptography library is not installed, please install with `pip install mpesa-connect[cryptography]`"
+        ) from e
+    return x509.load_pem_x509_certificate(data).public_key()
+
+
+def encrypt_security_credential(password: str, public_key: Any) -> str:
+    from cryptography.hazmat.primitives.asymmetric import padding
+
+    # Encrypt using RSA with PKCS1v1.5 padding
+    encrypted_bytes = public_key.encrypt(password.encode(), padding.PKCS1v15())
+    # Convert to base64 string
+    return base64.b64encode(encrypted_bytes).decode()
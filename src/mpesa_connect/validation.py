@@ -0,0 +1,195 @@
+"""
+Answering C2B validation requests from rules held in memory.
+
+With `ResponseType.CANCELED` Safaricom waits for the `ValidationURL` to accept
+or reject each payment and cancels it when the answer is late, so decisions
+are made from an index built once per rule set: a hash set of accounts, a
+table of prefixes by length and a single combined regular expression.
+"""
+
+import logging
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Set, Union
+
+from .callbacks import C2BCallback
+from .enums import ValidationResultCode
+from .instrumentation import Metrics
+
+_logger = logging.getLogger(__name__)
+
+
+class ValidationRules:
+    """
+    An immutable index of the account numbers (`BillRefNumber`) to accept.
+
+    An account is accepted when it is in `accounts`, starts with one of
+    `prefixes` or fully matches one of `patterns`, and is not in `blocked`.
+    Without any of `accounts`, `prefixes` and `patterns` every account not
+    blocked is accepted. Amounts outside `min_amount` and `max_amount` are
+    rejected.
+    """
+
+    def __init__(
+        self,
+        *,
+        accounts: Iterable[str] = (),
+        prefixes: Iterable[str] = (),
+        patterns: Iterable[str] = (),
+        blocked: Iterable[str] = (),
+        min_amount: Optional[float] = None,
+        max_amount: Optional[float] = None,
+        case_sensitive: bool = False,
+    ) -> None:
+        """
+        Args:
+            accounts (Iterable): Account numbers accepted as they are
+            prefixes (Iterable): Prefixes of accepted account numbers
+            patterns (Iterable): Regular expressions of accepted account numbers
+            blocked (Iterable): Account numbers rejected in any case
+            min_amount (float): Smallest amount accepted
+            max_amount (float): Largest amount accepted
+            case_sensitive (bool): Compare account numbers as they are instead
+                of ignoring case and surrounding whitespace
+        """
+        self.case_sensitive = case_sensitive
+        self.accounts = frozenset(map(self.normalize, accounts))
+        self.blocked = frozenset(map(self.normalize, blocked))
+        by_length: Dict[int, Set[str]] = {}
+        for prefix in map(self.normalize, prefixes):
+            by_length.setdefault(len(prefix), set()).add(prefix)
+        # Longest first, each length is a single set lookup
+        self.prefixes = tuple(
+            (length, frozenset(by_length[length]))
+            for length in sorted(by_length, reverse=True)
+        )
+        patterns = list(patterns)
+        self.pattern = (
+            re.compile(
+                "|".join(f"(?:{pattern})" for pattern in patterns),
+                0 if case_sensitive else re.IGNORECASE,
+            )
+            if patterns
+            else None
+        )
+        self.min_amount = min_amount
+        self.max_amount = max_amount
+        self.restricted = bool(self.accounts or self.prefixes or self.pattern)
+
+    def normalize(self, account: str) -> str:
+        account = str(account).strip()
+        return account if self.case_sensitive else account.upper()
+
+    def check(self, account: str, amount: float) -> ValidationResultCode:
+        if (self.min_amount is not None and amount < self.min_amount) or (
+            self.max_amount is not None and amount > self.max_amount
+        ):
+            return ValidationResultCode.INVALID_AMOUNT
+        account = self.normalize(account)
+        if account in self.blocked:
+            return ValidationResultCode.INVALID_ACCOUNT_NUMBER
+        if not self.restricted or account in self.accounts:
+            return ValidationResultCode.ACCEPTED
+        for length, prefixes in self.prefixes:
+            if account[:length] in prefixes:
+                return ValidationResultCode.ACCEPTED
+        if self.pattern is not None and self.pattern.fullmatch(account):
+            return ValidationResultCode.ACCEPTED
+        return ValidationResultCode.INVALID_ACCOUNT_NUMBER
+
+
+class C2BValidator:
+    """
+    Decides C2B validation requests, e.g. as the `validator` of a `CallbackApp`.
+
+    Rules can be given as they are or as a loader, e.g. reading them from a
+    database, which is called again every `refresh_interval` seconds in the
+    background. Lookups keep using the previous rules while new ones load, and
+    when loading fails.
+    """
+
+    def __init__(
+        self,
+        rules: Union[ValidationRules, Callable[[], ValidationRules]],
+        *,
+        refresh_interval: Optional[float] = None,
+        metrics: Optional[Metrics] = None,
+        on_error: ValidationResultCode = ValidationResultCode.OTHER_ERROR,
+    ) -> None:
+        """
+        Args:
+            rules: The rules, or a function loading them
+            refresh_interval (float): Seconds between reloads of the rules, they
+                are not reloaded when omitted
+            metrics (Metrics): Receives the result code and latency of every decision
+            on_error (ValidationResultCode): The answer when a request can't be
+                validated, e.g. it has no valid amount
+        """
+        if isinstance(rules, ValidationRules):
+            self._loader: Optional[Callable[[], ValidationRules]] = None
+            self.rules = rules
+        else:
+            self._loader = rules
+            self.rules = rules()
+        self.refresh_interval = refresh_interval
+        self.metrics = metrics or Metrics()
+        self.on_error = on_error
+        self._refreshing: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        if self._loader is not None and refresh_interval is not None:
+            self.start()
+
+    def __call__(self, callback: C2BCallback) -> ValidationResultCode:
+        return self.validate(callback.bill_ref_number, callback.trans_amount)
+
+    def validate(self, account: str, amount: Union[str, float]) -> ValidationResultCode:
+        started_at = time.perf_counter()
+        try:
+            result_code = self.rules.check(account, float(amount))
+        except Exception as e:
+            _logger.warning("Could not validate %r of %r: %r", account, amount, e)
+            result_code = self.on_error
+        self.metrics.validation(result_code.value, time.perf_counter() - started_at)
+        return result_code
+
+    def refresh(self) -> bool:
+        """
+        Reload the rules
+
+        Returns:
+            bool: Whether new rules were loaded
+        """
+        if self._loader is None:
+            return False
+        try:
+            rules = self._loader()
+        except Exception:
+            _logger.exception("Loading validation rules failed")
+            return False
+        # Swapped in one assignment, lookups see either the old or the new rules
+        self.rules = rules
+        return True
+
+    def start(self) -> None:
+        """Reload the rules every `refresh_interval` seconds"""
+        if self._refreshing is not None or self.refresh_interval is None:
+            return
+        self._stopped.clear()
+        self._refreshing = threading.Thread(
+            target=self._refresh_periodically,
+            name="mpesa-validation-rules",
+            daemon=True,
+        )
+        self._refreshing.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        refreshing, self._refreshing = self._refreshing, None
+        if refreshing is not None:
+            refreshing.join()
+
+    def _refresh_periodically(self) -> None:
+        assert self.refresh_interval is not None
+        while not self._stopped.wait(self.refresh_interval):
+            self.refresh()
@@ -0,0 +1,172 @@
+import asyncio
+import json
+from typing import List
+
+import httpx
+
+from mpesa_connect import (
+    App,
+    AppEnv,
+    AsyncB2C,
+    AsyncOAuth,
+    AsyncSTKPush,
+    B2CErrorResult,
+    CommandID,
+    OAuthResult,
+    RetryPolicy,
+    STKPushQueryResult,
+    STKPushResult,
+    TransactionType,
+)
+
+SANDBOX_URL = "https://sandbox.safaricom.co.ke"
+
+
+def _app(handler) -> App:  # type: ignore[no-untyped-def]
+    app = App(env=AppEnv.SANDBOX, consumer_key="key", consumer_secret="secret")
+    app._async_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return app
+
+
+def test_async_oauth_generate() -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert (
+            request.url
+            == f"{SANDBOX_URL}/oauth/v1/generate?grant_type=client_credentials"
+        )
+        return httpx.Response(200, json={"access_token": "token", "expires_in": "3599"})
+
+    async def main() -> None:
+        async with _app(handler) as app:
+            result = await AsyncOAuth(app).generate()
+            assert result == OAuthResult(
+                response=result.response,
+                status_ok=True,
+                access_token="token",
+                expires_in="3599",
+            )
+
+    asyncio.run(main())
+
+
+def test_async_stkpush_process_request() -> None:
+    oauth_calls: List[httpx.Request] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/oauth/v1/generate":
+            oauth_calls.append(request)
+            await asyncio.sleep(0.05)
+            return httpx.Response(
+                200, json={"access_token": "token", "expires_in": "3599"}
+            )
+        assert request.headers["Authorization"] == "Bearer token"
+        assert json.loads(request.content)["PhoneNumber"] == "254708374149"
+        return httpx.Response(
+            200,
+            json={
+                "MerchantRequestID": "29115-34620561-1",
+                "CheckoutRequestID": "ws_CO_191220191020363925",
+                "ResponseCode": "0",
+                "ResponseDescription": "Success. Request accepted for processing",
+                "CustomerMessage": "Success. Request accepted for processing",
+            },
+        )
+
+    async def main() -> None:
+        async with _app(handler) as app:
+            stkpush = AsyncSTKPush(app)
+            results = await asyncio.gather(
+                *(
+                    stkpush.process_request(
+                        business_short_code="174379",
+                        phone_number="254708374149",
+                        amount="1",
+                        call_back_url="https://mydomain.com/pat",
+                        account_reference="Test",
+                        transaction_desc="Test",
+                        transaction_type=TransactionType.CUSTOMER_PAY_BILL_ONLINE,
+                        pass_key="passkey",
+                    )
+                    for _ in range(20)
+                )
+            )
+        assert all(isinstance(r, STKPushResult) for r in results)
+        assert len(oauth_calls) == 1
+
+    asyncio.run(main())
+
+
+def test_async_b2c_error_result() -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(
+            400,
+            json={
+                "requestId": "11728-2929992-1",
+                "errorCode": "401.002.01",
+                "errorMessage": "Error Occurred - Invalid Access Token",
+            },
+        )
+
+    async def main() -> None:
+        async with _app(handler) as app:
+            result = await AsyncB2C(app, access_token="bad").payment_request(
+                originator_conversation_id="2dc26700-cdce-41a8-9913-d8a35704cd48",
+                initiator_name="testapi",
+                security_credential="credential",
+                command_id=CommandID.BUSINESS_PAYMENT,
+                amount="1",
+                party_a="600979",
+                party_b="254708374149",
+                remarks="Test remarks",
+                queue_time_out_url="https://mydomain.com/b2c/queue",
+                result_url="https://mydomain.com/b2c/result",
+            )
+        assert isinstance(result, B2CErrorResult)
+        assert result.error_code == "401.002.01"
+
+    asyncio.run(main())
+
+
+def test_async_non_json_error_page_is_retried() -> None:
+    calls: List[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(503, text="<html>Service Unavailable</html>")
+        return httpx.Response(
+            200,
+            json={
+                "ResponseCode": "0",
+                "ResponseDescription": "Accepted",
+                "MerchantRequestID": "22205-34066-1",
+                "CheckoutRequestID": "ws_CO_13012021093521236557",
+                "ResultCode": "0",
+                "ResultDesc": "Processed",
+            },
+        )
+
+    async def main() -> None:
+        app = _app(handler)
+        app.retry_policy = RetryPolicy(max_attempts=3, backoff=0)
+        async with app:
+            result = await AsyncSTKPush(app, access_token="token").query(
+                business_short_code="174379",
+                checkout_request_id="ws_CO_13012021093521236557",
+                password="password",
+                timestamp="20160216165627",
+            )
+        assert isinstance(result, STKPushQueryResult)
+        assert len(calls) == 2
+
+    asyncio.run(main())
+
+
+def test_async_client_is_pooled() -> None:
+    app = App(env=AppEnv.SANDBOX, consumer_key="", consumer_secret="", timeout=(3, 30))
+    client = app.async_client
+    assert client is app.async_client
+    assert client.timeout.connect == 3
+    assert client.timeout.read == 30
+    asyncio.run(app.aclose())
+    assert app.async_client is not client
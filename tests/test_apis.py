@@ -1,3 +1,6 @@
+from dataclasses import dataclass, field
+from typing import List
+
 import pytest
 import responses
 
@@ -27,6 +30,7 @@ from mpesa_connect import (
     TransactionType,
     TrxCode,
 )
+from mpesa_connect.base import Result
 
 SANDBOX_URL = "https://sandbox.safaricom.co.ke"
 LIVE_URL = "https://api.safaricom.co.ke"
@@ -34,7 +38,14 @@ LIVE_URL = "https://api.safaricom.co.ke"
 
 @pytest.fixture(scope="module")
 def app() -> App:
-    return App(env=AppEnv.SANDBOX, consumer_key="", consumer_secret="")
+    app = App(env=AppEnv.SANDBOX, consumer_key="", consumer_secret="")
+    with responses.RequestsMock() as rsps:
+        rsps.get(
+            f"{SANDBOX_URL}/oauth/v1/generate",
+            json={"access_token": "c9SQxWWhmdVRlyh0zh8gZDTkubVF", "expires_in": "3599"},
+        )
+        app.token_provider.get_token()
+    return app
 
 
 def test_app_env():
@@ -332,3 +343,52 @@ def test_reversal_request(app: App) -> None:
         response_code="0",
         response_description="Accept the service request successfully.",
     )
+
+
+@responses.activate
+def test_result_tolerates_unexpected_keys(app: App) -> None:
+    responses.post(
+        f"{SANDBOX_URL}/mpesa/c2b/v1/registerurl",
+        json={
+            "OriginatorConversationID": "df2b-4546-bd46-7ed17f22e0b542692",
+            "ResponseCode": "0",
+            "ResponseDescription": "Success",
+            "NewField": "value",
+        },
+        status=200,
+    )
+    result = C2B(app).register_url(
+        short_code="600983",
+        response_type=ResponseType.COMPLETED,
+        validation_url="https://mydomain.com/validation",
+        confirmation_url="https://mydomain.com/confirmation",
+    )
+    assert isinstance(result, C2BResult)
+    assert result.extra == {"NewField": "value"}
+    assert not hasattr(result, "__dict__")
+
+
+def test_result_subclass_with_defaults() -> None:
+    @dataclass
+    class MyResult(C2BResult):
+        note: str = "none"
+        tags: List[str] = field(default_factory=list)
+        count: int = 0
+
+    result = MyResult(
+        response=None,  # type: ignore[arg-type]
+        status_ok=True,
+        originator_conversation_id="1",
+        response_code="0",
+        response_description="Success",
+        count=2,
+    )
+    assert (result.note, result.tags, result.count) == ("none", [], 2)
+    assert result.originator_conversation_id == "1"
+    assert "originator_conversation_id" in C2BResult.__slots__
+
+    @dataclass
+    class Plain(Result):
+        value: str = "x"
+
+    assert Plain(response=None, status_ok=True).value == "x"  # type: ignore[arg-type]
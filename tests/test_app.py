@@ -0,0 +1,115 @@
+import asyncio
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterator, Set, Tuple
+
+import pytest
+
+from mpesa_connect import App, AppEnv, STKPush, STKPushQueryResult
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_Server"
+
+    def do_POST(self) -> None:
+        self.server.peers.add(self.client_address)
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps(
+            {
+                "ResponseCode": "0",
+                "ResponseDescription": "Accepted",
+                "MerchantRequestID": "22205-34066-1",
+                "CheckoutRequestID": "ws_CO_13012021093521236557",
+                "ResultCode": "0",
+                "ResultDesc": "Processed",
+            }
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: object) -> None:
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    peers: Set[Tuple[str, int]]
+
+
+@pytest.fixture
+def server() -> Iterator[_Server]:
+    server = _Server(("127.0.0.1", 0), _Handler)
+    server.peers = set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _query(app: App, server: _Server) -> STKPushQueryResult:
+    stkpush = STKPush(app, access_token="token")
+    stkpush.get_url = lambda path: f"http://127.0.0.1:{server.server_port}{path}"  # type: ignore[assignment]
+    result = stkpush.query(
+        business_short_code="174379",
+        checkout_request_id="ws_CO_13012021093521236557",
+        password="password",
+        timestamp="20160216165627",
+    )
+    assert isinstance(result, STKPushQueryResult)
+    return result
+
+
+def test_connections_are_reused(server: _Server) -> None:
+    with App(env=AppEnv.SANDBOX, consumer_key="", consumer_secret="") as app:
+        for _ in range(5):
+            _query(app, server)
+    assert len(server.peers) == 1
+
+
+def test_connections_not_reused_without_keep_alive(server: _Server) -> None:
+    with App(
+        env=AppEnv.SANDBOX, consumer_key="", consumer_secret="", keep_alive=False
+    ) as app:
+        for _ in range(3):
+            _query(app, server)
+    assert len(server.peers) == 3
+
+
+def test_close_releases_session() -> None:
+    app = App(env=AppEnv.SANDBOX, consumer_key="", consumer_secret="", pool_maxsize=4)
+    session = app.session
+    assert session is app.session
+    assert session.get_adapter("https://").__dict__["_pool_maxsize"] == 4
+    app.close()
+    assert app.session is not session
+
+
+def test_close_releases_async_client(server: _Server, caplog: Any) -> None:
+    app = App(env=AppEnv.SANDBOX, consumer_key="", consumer_secret="")
+    client = app.async_client
+    app.close()
+    assert client.is_closed and app.async_client is not client
+
+    async def close_in_loop() -> None:
+        client = app.async_client
+        app.close()
+        # Closed in the background, without blocking the loop
+        await asyncio.sleep(0.01)
+        assert client.is_closed
+
+    asyncio.run(close_in_loop())
+
+    async def connect() -> None:
+        await app.async_client.post(f"http://127.0.0.1:{server.server_port}/")
+
+    # Connections of an ended loop can't be closed, aclose() was needed
+    asyncio.run(connect())
+    with caplog.at_level(logging.WARNING, logger="mpesa_connect.app"):
+        app.close()
+    assert "aclose()" in caplog.text
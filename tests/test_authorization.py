@@ -0,0 +1,129 @@
+import threading
+import time
+from typing import List
+
+import pytest
+import responses
+
+from mpesa_connect import App, AppEnv, AuthorizationError, STKPush, TokenProvider
+
+SANDBOX_URL = "https://sandbox.safaricom.co.ke"
+OAUTH_URL = f"{SANDBOX_URL}/oauth/v1/generate"
+QUERY_URL = f"{SANDBOX_URL}/mpesa/stkpushquery/v1/query"
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def app() -> App:
+    return App(env=AppEnv.SANDBOX, consumer_key="key", consumer_secret="secret")
+
+
+def _mock_tokens(tokens: List[str], delay: float = 0.0) -> None:
+    it = iter(tokens)
+
+    def callback(request):  # type: ignore[no-untyped-def]
+        time.sleep(delay)
+        return (200, {}, f'{{"access_token": "{next(it)}", "expires_in": "3599"}}')
+
+    responses.add_callback(responses.GET, OAUTH_URL, callback=callback)
+
+
+@responses.activate
+def test_token_is_cached_and_refreshed_before_expiry(app: App) -> None:
+    _mock_tokens(["t1", "t2"])
+    clock = FakeClock()
+    provider = TokenProvider(app, refresh_margin=60, clock=clock)
+    assert provider.get_token() == "t1"
+    clock.now = 3500
+    assert provider.get_token() == "t1"
+    assert len(responses.calls) == 1
+    clock.now = 3550
+    assert provider.get_token() == "t2"
+    assert len(responses.calls) == 2
+
+
+@responses.activate
+def test_concurrent_refreshes_are_collapsed(app: App) -> None:
+    _mock_tokens(["t1"] * 10, delay=0.1)
+    provider = TokenProvider(app)
+    tokens: List[str] = []
+    threads = [
+        threading.Thread(target=lambda: tokens.append(provider.get_token()))
+        for _ in range(10)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert tokens == ["t1"] * 10
+    assert len(responses.calls) == 1
+
+
+@responses.activate
+def test_failed_generation_raises(app: App) -> None:
+    responses.get(
+        OAUTH_URL,
+        json={
+            "requestId": "1",
+            "errorCode": "400.008.01",
+            "errorMessage": "Invalid Authentication passed",
+        },
+        status=400,
+    )
+    with pytest.raises(AuthorizationError) as e:
+        app.token_provider.get_token()
+    assert e.value.result.error_code == "400.008.01"
+
+
+@responses.activate
+def test_api_uses_token_provider(app: App) -> None:
+    _mock_tokens(["revoked", "fresh"])
+    responses.post(
+        QUERY_URL,
+        status=401,
+        json={"requestId": "1", "errorCode": "404.001.03", "errorMessage": "Invalid"},
+        match=[responses.matchers.header_matcher({"Authorization": "Bearer revoked"})],
+    )
+    responses.post(
+        QUERY_URL,
+        json={
+            "ResponseCode": "0",
+            "ResponseDescription": "Accepted",
+            "MerchantRequestID": "22205-34066-1",
+            "CheckoutRequestID": "ws_CO_13012021093521236557",
+            "ResultCode": "0",
+            "ResultDesc": "Processed",
+        },
+        match=[responses.matchers.header_matcher({"Authorization": "Bearer fresh"})],
+    )
+    result = STKPush(app).query(
+        business_short_code="174379",
+        checkout_request_id="ws_CO_13012021093521236557",
+        password="password",
+        timestamp="20160216165627",
+    )
+    assert result.status_ok
+
+
+@responses.activate
+def test_failed_early_refresh_keeps_the_valid_token(app: App) -> None:
+    _mock_tokens(["t1"])
+    clock = FakeClock()
+    provider = TokenProvider(app, refresh_margin=60, clock=clock)
+    assert provider.get_token() == "t1"
+    responses.replace(responses.GET, OAUTH_URL, status=503, json={})
+    clock.now = 3550
+    assert provider.get_token() == "t1"
+    assert provider.get_token() == "t1"
+    assert len(responses.calls) == 3
+    # Raised once the token expired
+    clock.now = 3600
+    with pytest.raises(AuthorizationError):
+        provider.get_token()
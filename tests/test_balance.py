@@ -0,0 +1,167 @@
+import threading
+from decimal import Decimal
+from typing import Any, Dict, List
+
+import pytest
+import responses
+
+from mpesa_connect import (
+    AccountBalance,
+    AccountBalanceRecord,
+    App,
+    AppEnv,
+    BalanceCache,
+    CallbackType,
+    InMemoryCorrelationStore,
+    MpesaConnectError,
+    parse_account_balance,
+    parse_callback,
+)
+
+SANDBOX_URL = "https://sandbox.safaricom.co.ke"
+BALANCE_PATH = "/mpesa/accountbalance/v1/query"
+BALANCES = (
+    "Working Account|KES|46713.00|46713.00|0.00|0.00"
+    "&Float Account|KES|0.00|0.00|0.00|0.00"
+    "&Utility Account|KES|49217.00|49000.00|217.00|0.00"
+)
+
+DEFAULTS = {
+    "initiator": "testapi",
+    "security_credential": "credential",
+    "queue_time_out_url": "https://mydomain.com/balance/queue",
+    "result_url": "https://mydomain.com/balance/result",
+}
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _callback(conversation_id: str, result_code: int = 0) -> Any:
+    return parse_callback(
+        CallbackType.ACCOUNT_BALANCE,
+        {
+            "Result": {
+                "ResultType": 0,
+                "ResultCode": result_code,
+                "ResultDesc": "The service request is processed successfully.",
+                "OriginatorConversationID": "1",
+                "ConversationID": conversation_id,
+                "TransactionID": "OA90000000",
+                "ResultParameters": {
+                    "ResultParameter": [
+                        {"Key": "AccountBalance", "Value": BALANCES},
+                        {"Key": "BOCompletedTime", "Value": 20200109125710},
+                    ]
+                },
+            }
+        },
+    )
+
+
+def test_parse_account_balance() -> None:
+    accounts = parse_account_balance(BALANCES)
+    assert list(accounts) == ["Working Account", "Float Account", "Utility Account"]
+    assert accounts["Utility Account"] == AccountBalanceRecord(
+        name="Utility Account",
+        currency="KES",
+        current_balance=Decimal("49217.00"),
+        available_balance=Decimal("49000.00"),
+        reserved_balance=Decimal("217.00"),
+        uncleared_balance=Decimal("0.00"),
+    )
+    assert parse_account_balance("") == {}
+    with pytest.raises(ValueError):
+        parse_account_balance("Working Account|KES|abc")
+
+
+@responses.activate
+def test_cache_coalesces_queries_and_refreshes_stale_balances() -> None:
+    store = InMemoryCorrelationStore()
+    queries: List[Dict[str, Any]] = []
+    release = threading.Event()
+
+    def query(request):  # type: ignore[no-untyped-def]
+        queries.append(request)
+        conversation_id = f"AG_{len(queries)}"
+        # The callback arrives once every caller is waiting
+        threading.Thread(
+            target=lambda: release.wait(5) and store.resolve(_callback(conversation_id))
+        ).start()
+        return (
+            200,
+            {},
+            f'{{"OriginatorConversationID": "1", "ConversationID": "{conversation_id}",'
+            ' "ResponseCode": "0", "ResponseDescription": "Accepted"}',
+        )
+
+    responses.add_callback(
+        responses.POST, f"{SANDBOX_URL}{BALANCE_PATH}", callback=query
+    )
+    app = App(
+        env=AppEnv.SANDBOX,
+        consumer_key="",
+        consumer_secret="",
+        correlation_store=store,
+    )
+    clock = FakeClock()
+    cache = BalanceCache(
+        AccountBalance(app, access_token="token"),
+        defaults=DEFAULTS,
+        max_age=60,
+        callback_timeout=5,
+        clock=clock,
+    )
+    balances: List[Decimal] = []
+    threads = [
+        threading.Thread(target=lambda: balances.append(cache.available("600000")))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(queries) == 1
+    assert balances == [Decimal("46713.00")] * 8
+
+    snapshot = cache.get("600000")
+    assert snapshot.completed_time == "20200109125710"
+    assert snapshot.available("Utility Account") == Decimal("49000.00")
+    clock.now = 59
+    assert cache.get("600000") is snapshot
+    assert len(queries) == 1
+    clock.now = 60
+    assert cache.get("600000") is not snapshot
+    assert len(queries) == 2
+
+
+@responses.activate
+def test_failed_queries_are_not_cached() -> None:
+    responses.post(
+        f"{SANDBOX_URL}{BALANCE_PATH}",
+        status=400,
+        json={
+            "requestId": "1",
+            "errorCode": "400.002.02",
+            "errorMessage": "Bad Request - Invalid PartyA",
+        },
+    )
+    app = App(env=AppEnv.SANDBOX, consumer_key="", consumer_secret="")
+    cache = BalanceCache(AccountBalance(app, access_token="token"), defaults=DEFAULTS)
+    for _ in range(2):
+        with pytest.raises(MpesaConnectError, match="400.002.02"):
+            cache.get("600000")
+    assert len(responses.calls) == 2
+    with pytest.raises(MpesaConnectError):
+        cache.update("600000", _callback("AG_1", result_code=1))
+    cache.update("600000", _callback("AG_2"))
+    assert cache.available("600000") == Decimal("46713.00")
+    cache.invalidate("600000")
+    with pytest.raises(MpesaConnectError):
+        cache.available("600000")
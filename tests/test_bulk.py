@@ -0,0 +1,346 @@
+import base64
+import csv
+import json
+import pathlib
+import threading
+import time
+from typing import Any, Dict, Iterator, List
+
+import pytest
+import requests
+import responses
+
+from mpesa_connect import (
+    B2C,
+    App,
+    AppEnv,
+    B2CErrorResult,
+    B2CResult,
+    BulkDisbursement,
+    BulkQRCode,
+    BulkReversal,
+    CommandID,
+    QRCode,
+    QRCodeCache,
+    Reversal,
+    ReversalOutcome,
+    TrxCode,
+)
+from mpesa_connect.qrcode import qr_code_key
+
+SANDBOX_URL = "https://sandbox.safaricom.co.ke"
+
+
+@pytest.fixture
+def app() -> App:
+    return App(env=AppEnv.SANDBOX, consumer_key="", consumer_secret="")
+
+
+def _payees(count: int) -> Iterator[Dict[str, Any]]:
+    for i in range(count):
+        yield {"party_b": f"2547{i:08}", "amount": 10}
+
+
+DEFAULTS = {
+    "initiator_name": "testapi",
+    "security_credential": "credential",
+    "command_id": CommandID.SALARY_PAYMENT,
+    "party_a": "600979",
+    "remarks": "Salary",
+    "queue_time_out_url": "https://mydomain.com/b2c/queue",
+    "result_url": "https://mydomain.com/b2c/result",
+}
+
+
+@responses.activate
+def test_bulk_disbursement(app: App) -> None:
+    lock = threading.Lock()
+    in_flight, peak = 0, 0
+
+    def callback(request):  # type: ignore[no-untyped-def]
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.01)
+        with lock:
+            in_flight -= 1
+        if b"254700000003" in request.body:
+            return (
+                400,
+                {},
+                '{"requestId": "1", "errorCode": "400.002.02", "errorMessage": "Invalid"}',
+            )
+        return (
+            200,
+            {},
+            '{"ConversationID": "AG_1", "OriginatorConversationID": "1", "ResponseCode": "0", "ResponseDescription": "Accepted"}',
+        )
+
+    responses.add_callback(
+        responses.POST, f"{SANDBOX_URL}/mpesa/b2c/v1/paymentrequest", callback=callback
+    )
+    bulk = BulkDisbursement(
+        B2C(app, access_token="token"), defaults=DEFAULTS, concurrency=4
+    )
+    outcomes = list(bulk.run(_payees(20)))
+    assert len(outcomes) == 20
+    assert peak <= 4
+    assert sum(isinstance(o.result, B2CResult) for o in outcomes) == 19
+    assert sum(isinstance(o.result, B2CErrorResult) for o in outcomes) == 1
+    assert len({o.payee["originator_conversation_id"] for o in outcomes}) == 20
+    assert bulk.stats.succeeded == 19
+    assert bulk.stats.failed == 1
+    assert bulk.stats.throughput > 0
+
+
+REVERSAL_DEFAULTS = {
+    "initiator": "testapi",
+    "security_credential": "credential",
+    "receiver_identifier_type": "11",
+    "remarks": "Reversal",
+    "queue_time_out_url": "https://mydomain.com/reversal/queue",
+    "result_url": "https://mydomain.com/reversal/result",
+}
+
+
+@pytest.mark.parametrize("results_file", ["results.csv", "results.jsonl"])
+def test_bulk_reversal(app: App, tmp_path: pathlib.Path, results_file: str) -> None:
+    sent: List[str] = []
+    fail = True
+
+    def callback(request):  # type: ignore[no-untyped-def]
+        transaction_id = json.loads(request.body)["TransactionID"]
+        sent.append(transaction_id)
+        if transaction_id == "NLJ41HAY6C" and fail:
+            raise requests.ConnectionError("Connection reset")
+        if transaction_id == "NLJ41HAY6B":
+            return (
+                400,
+                {},
+                '{"requestId": "1", "errorCode": "400.002.02", "errorMessage": "Invalid"}',
+            )
+        return (
+            200,
+            {},
+            '{"ConversationID": "AG_1", "OriginatorConversationID": "1", "ResponseCode": "0", "ResponseDescription": "Accepted"}',
+        )
+
+    transactions = [
+        ("NLJ41HAY6A", 100, "600610"),
+        ("NLJ41HAY6B", 100, "600610"),
+        ("NLJ41HAY6A", 100, "600610"),
+        {"transaction_id": "NLJ41HAY6C", "amount": "50", "receiver_party": "600610"},
+        ("not-an-id", 100, "600610"),
+        ("NLJ41HAY6D", 0, "600610"),
+    ]
+    path = tmp_path / results_file
+
+    def run() -> BulkReversal:
+        bulk = BulkReversal(
+            Reversal(app, access_token="token"),
+            defaults=REVERSAL_DEFAULTS,
+            results_file=path,
+            concurrency=2,
+        )
+        outcomes = {o.transaction["transaction_id"]: o for o in bulk.run(transactions)}
+        assert all(isinstance(o, ReversalOutcome) for o in outcomes.values())
+        return bulk
+
+    with responses.RequestsMock() as rsps:
+        rsps.add_callback(
+            responses.POST,
+            f"{SANDBOX_URL}/mpesa/reversal/v1/request",
+            callback=callback,
+        )
+        bulk = run()
+        assert sorted(sent) == ["NLJ41HAY6A", "NLJ41HAY6B", "NLJ41HAY6C"]
+        assert bulk.stats.duplicates == 1
+        assert bulk.stats.invalid == 2
+        assert (bulk.stats.succeeded, bulk.stats.failed, bulk.stats.errors) == (1, 1, 1)
+        assert bulk.stats.completed == 5
+
+        # Resuming only retries the transaction that raised
+        sent.clear()
+        fail = False
+        bulk = run()
+        assert sent == ["NLJ41HAY6C"]
+        assert bulk.stats.resumed == 5
+        assert bulk.stats.succeeded == 1
+
+    if results_file.endswith(".jsonl"):
+        rows = [json.loads(line) for line in path.read_text().splitlines()]
+    else:
+        rows = list(csv.DictReader(path.open()))
+    assert [(row["transaction_id"], row["status"]) for row in rows][-1] == (
+        "NLJ41HAY6C",
+        "accepted",
+    )
+    assert sorted(row["status"] for row in rows) == [
+        "accepted",
+        "accepted",
+        "error",
+        "invalid",
+        "invalid",
+        "rejected",
+    ]
+    assert {row["error_code"] for row in rows if row["status"] == "rejected"} == {
+        "400.002.02"
+    }
+
+
+def test_stopping_early_records_calls_in_flight(
+    app: App, tmp_path: pathlib.Path
+) -> None:
+    sent: List[str] = []
+    lock = threading.Lock()
+
+    def callback(request):  # type: ignore[no-untyped-def]
+        with lock:
+            sent.append(json.loads(request.body)["TransactionID"])
+        time.sleep(0.05)
+        return (
+            200,
+            {},
+            '{"ConversationID": "AG_1", "OriginatorConversationID": "1", "ResponseCode": "0", "ResponseDescription": "Accepted"}',
+        )
+
+    path = tmp_path / "results.jsonl"
+    with responses.RequestsMock() as rsps:
+        rsps.add_callback(
+            responses.POST,
+            f"{SANDBOX_URL}/mpesa/reversal/v1/request",
+            callback=callback,
+        )
+        bulk = BulkReversal(
+            Reversal(app, access_token="token"),
+            defaults=REVERSAL_DEFAULTS,
+            results_file=path,
+            concurrency=4,
+        )
+        outcomes = bulk.run((f"NLJ41HAY{i:02}", 100, "600610") for i in range(100))
+        next(outcomes)
+        outcomes.close()
+
+    # Every call made is counted and written, though only one was yielded
+    assert 1 < len(sent) < 100
+    assert bulk.stats.succeeded == bulk.stats.completed == len(sent)
+    rows = [json.loads(line) for line in path.read_text().splitlines()]
+    assert sorted(row["transaction_id"] for row in rows) == sorted(sent)
+
+
+QR_DEFAULTS = {
+    "merchant_name": "TEST SUPERMARKET",
+    "trx_code": TrxCode.BG,
+    "cpi": "373132",
+    "size": "300",
+}
+
+
+def test_qrcode_cache(tmp_path: pathlib.Path) -> None:
+    key = qr_code_key({**QR_DEFAULTS, "ref_no": "Invoice Test", "amount": 1})
+    assert key == qr_code_key(
+        {**QR_DEFAULTS, "trx_code": "BG", "ref_no": "Invoice Test", "amount": "1"}
+    )
+    assert key != qr_code_key({**QR_DEFAULTS, "ref_no": "Invoice Test", "amount": 2})
+    cache = QRCodeCache(max_size=1, directory=str(tmp_path))
+    cache.put(key, b"png")
+    cache.put("other", b"other")
+    assert len(cache) == 1
+    assert (tmp_path / f"{key}.png").read_bytes() == b"png"
+    # Evicted from memory, read back from disk
+    assert cache.get(key) == b"png"
+    assert QRCodeCache().get(key) is None
+
+
+def test_qrcode_cache_creates_once_after_a_stale_lookup(
+    tmp_path: pathlib.Path,
+) -> None:
+    def create() -> bytes:
+        raise AssertionError("created again")
+
+    # As if the leader finished between the lookup and taking the lock
+    cache = QRCodeCache()
+    cache.put("key", b"png")
+    cache.get = lambda key: None  # type: ignore[method-assign]
+    assert cache.get_or_create("key", create) == b"png"
+
+    cache = QRCodeCache(max_size=1, directory=str(tmp_path))
+    cache.put("key", b"png")
+    cache.put("other", b"other")
+    cache.get = lambda key: None  # type: ignore[method-assign]
+    assert cache.get_or_create("key", create) == b"png"
+
+
+@responses.activate
+def test_bulk_qrcode(app: App, tmp_path: pathlib.Path) -> None:
+    generated: List[str] = []
+    image = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+    def callback(request):  # type: ignore[no-untyped-def]
+        body = json.loads(request.body)
+        generated.append(body["RefNo"])
+        time.sleep(0.01)
+        if body["Amount"] == 0:
+            return (
+                400,
+                {},
+                '{"requestId": "1", "errorCode": "404.001.04", "errorMessage": "Invalid Amount"}',
+            )
+        return (
+            200,
+            {},
+            json.dumps(
+                {
+                    "ResponseCode": "00",
+                    "ResponseDescription": "The service request is processed successfully.",
+                    "QRCode": base64.b64encode(image).decode(),
+                }
+            ),
+        )
+
+    responses.add_callback(
+        responses.POST, f"{SANDBOX_URL}/mpesa/qrcode/v1/generate", callback=callback
+    )
+    cache = QRCodeCache(directory=str(tmp_path / "cache"))
+    requests = [{"ref_no": f"INV{i % 3}", "amount": 100} for i in range(9)] + [
+        {"ref_no": "FREE", "amount": 0}
+    ]
+
+    bulk = BulkQRCode(
+        QRCode(app, access_token="token"),
+        defaults=QR_DEFAULTS,
+        cache=cache,
+        concurrency=4,
+    )
+    outcomes = list(bulk.run(requests))
+    # Identical requests in flight together share one call
+    assert sorted(generated) == ["FREE", "INV0", "INV1", "INV2"]
+    assert [o.image for o in outcomes if o.status_ok] == [image] * 9
+    assert [o.error.error_code for o in outcomes if o.error] == ["404.001.04"]  # type: ignore[union-attr]
+    assert (bulk.stats.succeeded, bulk.stats.cached, bulk.stats.failed) == (9, 6, 1)
+
+    generated.clear()
+    bulk = BulkQRCode(
+        QRCode(app, access_token="token"),
+        defaults=QR_DEFAULTS,
+        cache=QRCodeCache(directory=str(tmp_path / "cache")),
+        output_dir=str(tmp_path / "images"),
+    )
+    outcomes = list(bulk.run([{"ref_no": "INV0", "amount": 100, "file_name": "inv0"}]))
+    # Served from the disk cache of the first run
+    assert generated == []
+    assert outcomes[0].image is None
+    assert outcomes[0].path == str(tmp_path / "images" / "inv0.png")
+    assert (tmp_path / "images" / "inv0.png").read_bytes() == image
+
+    # Names that would write outside the output directory are refused
+    outcomes = list(
+        bulk.run(
+            {"ref_no": "INV0", "amount": 100, "file_name": name}
+            for name in ("../escaped", "sub/inv0", "..")
+        )
+    )
+    assert all(isinstance(o.exception, ValueError) for o in outcomes)
+    assert bulk.stats.errors == 3
+    assert not (tmp_path / "escaped.png").exists()
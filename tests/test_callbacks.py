@@ -0,0 +1,188 @@
+import asyncio
+import json
+import threading
+import time
+from typing import Any, Dict, List
+
+from mpesa_connect import (
+    B2CCallback,
+    C2BConfirmationCallback,
+    Callback,
+    CallbackApp,
+    CallbackType,
+    InMemoryCorrelationStore,
+    STKPushCallback,
+    parse_callback,
+)
+
+STK_CALLBACK = {
+    "Body": {
+        "stkCallback": {
+            "MerchantRequestID": "29115-34620561-1",
+            "CheckoutRequestID": "ws_CO_191220191020363925",
+            "ResultCode": 0,
+            "ResultDesc": "The service request is processed successfully.",
+            "CallbackMetadata": {
+                "Item": [
+                    {"Name": "Amount", "Value": 1.00},
+                    {"Name": "MpesaReceiptNumber", "Value": "NLJ7RT61SV"},
+                    {"Name": "TransactionDate", "Value": 20191219102115},
+                    {"Name": "PhoneNumber", "Value": 254708374149},
+                ]
+            },
+        }
+    }
+}
+
+B2C_CALLBACK = {
+    "Result": {
+        "ResultType": 0,
+        "ResultCode": 0,
+        "ResultDesc": "The service request is processed successfully.",
+        "OriginatorConversationID": "10571-7910404-1",
+        "ConversationID": "AG_20191219_00004e48cf7e3533f581",
+        "TransactionID": "NLJ41HAY6Q",
+        "ResultParameters": {
+            "ResultParameter": [
+                {"Key": "TransactionAmount", "Value": 10},
+                {"Key": "TransactionReceipt", "Value": "NLJ41HAY6Q"},
+                {"Key": "ReceiverPartyPublicName", "Value": "254708374149 - John Doe"},
+            ]
+        },
+        "ReferenceData": {
+            "ReferenceItem": {
+                "Key": "QueueTimeoutURL",
+                "Value": "https://internalsandbox.safaricom.co.ke/mpesa/b2cresults/v1/submit",
+            }
+        },
+    }
+}
+
+C2B_CONFIRMATION = {
+    "TransactionType": "Pay Bill",
+    "TransID": "RKTQDM7W6S",
+    "TransTime": "20191122063845",
+    "TransAmount": "10",
+    "BusinessShortCode": "600638",
+    "BillRefNumber": "invoice008",
+    "InvoiceNumber": "",
+    "OrgAccountBalance": "",
+    "ThirdPartyTransID": "",
+    "MSISDN": "25470****149",
+    "FirstName": "John",
+}
+
+
+def test_parse_stkpush_callback() -> None:
+    callback = parse_callback(CallbackType.STK_PUSH, json.dumps(STK_CALLBACK))
+    assert isinstance(callback, STKPushCallback)
+    assert callback.status_ok
+    assert callback.checkout_request_id == "ws_CO_191220191020363925"
+    assert callback.mpesa_receipt_number == "NLJ7RT61SV"
+    assert callback.amount == 1.0
+
+
+def test_parse_result_callback() -> None:
+    callback = parse_callback("b2c", B2C_CALLBACK)
+    assert isinstance(callback, B2CCallback)
+    assert callback.conversation_id == "AG_20191219_00004e48cf7e3533f581"
+    assert callback.result_parameters["TransactionAmount"] == 10
+    assert "QueueTimeoutURL" in callback.reference_data
+
+
+def test_parse_c2b_callback() -> None:
+    callback = parse_callback(CallbackType.C2B_CONFIRMATION, C2B_CONFIRMATION)
+    assert isinstance(callback, C2BConfirmationCallback)
+    assert callback.trans_id == "RKTQDM7W6S"
+    assert callback.msisdn == "25470****149"
+    assert callback.last_name == ""
+
+
+async def _post(app: CallbackApp, path: str, body: bytes) -> Dict[str, Any]:
+    sent: List[Dict[str, Any]] = []
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive() -> Dict[str, Any]:
+        return messages.pop(0)
+
+    async def send(message: Dict[str, Any]) -> None:
+        sent.append(message)
+
+    await app({"type": "http", "method": "POST", "path": path}, receive, send)
+    return {"status": sent[0]["status"], "body": json.loads(sent[1]["body"])}
+
+
+def test_callback_app() -> None:
+    handled: List[Callback] = []
+    release = asyncio.Event()
+
+    async def handler(callback: Callback) -> None:
+        await release.wait()
+        handled.append(callback)
+
+    async def main() -> None:
+        app = CallbackApp(
+            {
+                "/stk": CallbackType.STK_PUSH,
+                "/b2c": CallbackType.B2C,
+                "/c2b": CallbackType.C2B_CONFIRMATION,
+            },
+            handler,
+            queue_size=1,
+            workers=1,
+        )
+        ok = await _post(app, "/stk", json.dumps(STK_CALLBACK).encode())
+        assert ok == {
+            "status": 200,
+            "body": {"ResultCode": 0, "ResultDesc": "Accepted"},
+        }
+        await asyncio.sleep(0)
+        assert (await _post(app, "/b2c", json.dumps(B2C_CALLBACK).encode()))[
+            "status"
+        ] == 200
+        assert (await _post(app, "/b2c", json.dumps(B2C_CALLBACK).encode()))[
+            "status"
+        ] == 503
+        assert (await _post(app, "/stk", b"{}"))["status"] == 400
+        for body in (b"[1]", b'"x"', b"1"):
+            assert (await _post(app, "/c2b", body))["status"] == 400
+        assert (await _post(app, "/unknown", b"{}"))["status"] == 404
+        release.set()
+        await app.stop()
+        assert [type(c) for c in handled] == [STKPushCallback, B2CCallback]
+
+    asyncio.run(main())
+
+
+def test_callback_app_resolves_off_the_event_loop() -> None:
+    class SlowStore(InMemoryCorrelationStore):
+        def resolve(self, callback: Callback) -> None:
+            threads.append(threading.get_ident())
+            time.sleep(0.1)
+            super().resolve(callback)
+
+    threads: List[int] = []
+    store = SlowStore()
+
+    async def main() -> None:
+        app = CallbackApp({"/stk": CallbackType.STK_PUSH}, correlation_store=store)
+        ticks = 0
+
+        async def tick() -> None:
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.ensure_future(tick())
+        ok = await _post(app, "/stk", json.dumps(STK_CALLBACK).encode())
+        ticker.cancel()
+        assert ok["status"] == 200
+        # The loop kept running while the store was busy
+        assert ticks > 3
+        assert threads != [threading.get_ident()]
+
+    asyncio.run(main())
+    # Resolved before the callback is acknowledged
+    correlation = store.get("ws_CO_191220191020363925")
+    assert correlation is not None and correlation.callback is not None
@@ -0,0 +1,224 @@
+from typing import Any, List, Tuple
+
+import pytest
+import requests
+import responses
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from mpesa_connect import (
+    B2C,
+    App,
+    AppEnv,
+    CircuitBreaker,
+    CircuitBreakers,
+    CircuitOpenError,
+    CircuitState,
+    CommandID,
+    RetryPolicy,
+    STKPush,
+)
+
+SANDBOX_URL = "https://sandbox.safaricom.co.ke"
+B2C_PATH = "/mpesa/b2c/v1/paymentrequest"
+QUERY_PATH = "/mpesa/stkpushquery/v1/query"
+UNAVAILABLE = {
+    "requestId": "1",
+    "errorCode": "503.001.01",
+    "errorMessage": "Service Unavailable",
+}
+QUERY_RESPONSE = {
+    "ResponseCode": "0",
+    "ResponseDescription": "Accepted",
+    "MerchantRequestID": "22205-34066-1",
+    "CheckoutRequestID": "ws_CO_13012021093521236557",
+    "ResultCode": "0",
+    "ResultDesc": "Processed",
+}
+
+
+def _connection_refused() -> requests.ConnectionError:
+    reason = NewConnectionError(None, "Connection refused")  # type: ignore[arg-type]
+    return requests.ConnectionError(MaxRetryError(None, B2C_PATH, reason))  # type: ignore[arg-type]
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _breaker(
+    clock: FakeClock, events: List[Tuple[Any, ...]], **kwargs: Any
+) -> CircuitBreaker:
+    return CircuitBreaker(
+        B2C_PATH,
+        window_size=4,
+        minimum_calls=4,
+        open_timeout=10,
+        listeners=[lambda *event: events.append(event)],
+        clock=clock,
+        **kwargs,
+    )
+
+
+def _call(breaker: CircuitBreaker, failed: bool, duration: float = 0.1) -> None:
+    breaker.record(breaker.acquire(), failed, duration)
+
+
+def test_opens_on_failure_rate_and_probes_when_half_open() -> None:
+    clock = FakeClock()
+    events: List[Tuple[Any, ...]] = []
+    breaker = _breaker(clock, events, half_open_calls=2)
+    for failed in [True, False, True, False]:
+        _call(breaker, failed)
+    assert breaker.state is CircuitState.OPEN
+    clock.now = 4
+    with pytest.raises(CircuitOpenError) as e:
+        breaker.acquire()
+    assert e.value.path == B2C_PATH and e.value.retry_after == 6
+    clock.now = 10
+    probes = [breaker.acquire(), breaker.acquire()]
+    assert breaker.state is CircuitState.HALF_OPEN
+    # Only the probes are let through
+    with pytest.raises(CircuitOpenError):
+        breaker.acquire()
+    breaker.record(probes[0], False, 0.1)
+    breaker.record(probes[1], True, 0.1)
+    assert breaker.state is CircuitState.OPEN
+    clock.now = 20
+    _call(breaker, False)
+    _call(breaker, False)
+    assert breaker.state is CircuitState.CLOSED
+    assert [event[1:] for event in events] == [
+        (CircuitState.CLOSED, CircuitState.OPEN),
+        (CircuitState.OPEN, CircuitState.HALF_OPEN),
+        (CircuitState.HALF_OPEN, CircuitState.OPEN),
+        (CircuitState.OPEN, CircuitState.HALF_OPEN),
+        (CircuitState.HALF_OPEN, CircuitState.CLOSED),
+    ]
+
+
+def test_calls_from_before_the_circuit_opened_are_not_probes() -> None:
+    clock = FakeClock()
+    breaker = _breaker(clock, [])
+    slow_call = breaker.acquire()
+    for _ in range(4):
+        _call(breaker, True)
+    clock.now = 10
+    probe = breaker.acquire()
+    assert breaker.state is CircuitState.HALF_OPEN
+    breaker.record(slow_call, False, 0.1)
+    breaker.cancel(slow_call)
+    # Still waiting on the probe, which alone decides
+    assert breaker.state is CircuitState.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.acquire()
+    breaker.record(probe, True, 0.1)
+    assert breaker.state is CircuitState.OPEN
+
+
+def test_opens_on_slow_calls() -> None:
+    clock = FakeClock()
+    breaker = _breaker(clock, [], slow_call_duration=5, slow_call_rate_threshold=0.75)
+    for duration in [6, 1, 6, 1, 6]:
+        _call(breaker, False, duration)
+        assert breaker.state is CircuitState.CLOSED
+    _call(breaker, False, 6)
+    assert breaker.state is CircuitState.OPEN
+
+
+def test_fails_fast_without_affecting_other_endpoints() -> None:
+    breakers = CircuitBreakers(window_size=2, minimum_calls=2, open_timeout=60)
+    states: List[Tuple[Any, ...]] = []
+    breakers.add_listener(lambda *event: states.append(event))
+    app = App(
+        env=AppEnv.SANDBOX,
+        consumer_key="",
+        consumer_secret="",
+        circuit_breakers=breakers,
+        retry_policy=RetryPolicy(max_attempts=5, backoff=0),
+    )
+    b2c = B2C(app, access_token="token")
+    stkpush = STKPush(app, access_token="token")
+    with responses.RequestsMock() as rsps:
+        rsps.post(f"{SANDBOX_URL}{B2C_PATH}", body=_connection_refused())
+        rsps.post(f"{SANDBOX_URL}{QUERY_PATH}", json=QUERY_RESPONSE)
+        # Retried until the circuit opened
+        with pytest.raises(CircuitOpenError):
+            b2c.payment_request(
+                originator_conversation_id="2dc26700-cdce-41a8-9913-d8a35704cd48",
+                initiator_name="testapi",
+                security_credential="credential",
+                command_id=CommandID.BUSINESS_PAYMENT,
+                amount="1",
+                party_a="600979",
+                party_b="254708374149",
+                remarks="Test remarks",
+                queue_time_out_url="https://mydomain.com/b2c/queue",
+                result_url="https://mydomain.com/b2c/result",
+            )
+        assert len(rsps.calls) == 2
+        assert stkpush.query(
+            business_short_code="174379",
+            checkout_request_id="ws_CO_13012021093521236557",
+            password="password",
+            timestamp="20160216165627",
+        ).status_ok
+    assert states == [(B2C_PATH, CircuitState.CLOSED, CircuitState.OPEN)]
+    assert breakers.states() == {
+        B2C_PATH: CircuitState.OPEN,
+        QUERY_PATH: CircuitState.CLOSED,
+    }
+
+
+@responses.activate
+def test_error_responses_count_as_failures() -> None:
+    responses.post(f"{SANDBOX_URL}{QUERY_PATH}", status=503, json=UNAVAILABLE)
+    breakers = CircuitBreakers(window_size=2, minimum_calls=2)
+    app = App(
+        env=AppEnv.SANDBOX,
+        consumer_key="",
+        consumer_secret="",
+        circuit_breakers=breakers,
+    )
+    stkpush = STKPush(app, access_token="token")
+    for _ in range(2):
+        assert not stkpush.query(
+            business_short_code="174379",
+            checkout_request_id="ws_CO_13012021093521236557",
+            password="password",
+            timestamp="20160216165627",
+        ).status_ok
+    assert breakers.get(QUERY_PATH).state is CircuitState.OPEN
+
+
+@responses.activate
+def test_throttling_and_token_errors_are_not_counted() -> None:
+    responses.post(f"{SANDBOX_URL}{QUERY_PATH}", json=QUERY_RESPONSE)
+    responses.get(f"{SANDBOX_URL}/oauth/v1/generate", status=503, json=UNAVAILABLE)
+    breakers = CircuitBreakers(window_size=2, minimum_calls=2, slow_call_duration=0.05)
+    app = App(
+        env=AppEnv.SANDBOX,
+        consumer_key="",
+        consumer_secret="",
+        circuit_breakers=breakers,
+        rate_limit=10,
+    )
+
+    def query(access_token: Any = "token") -> Any:
+        return STKPush(app, access_token=access_token).query(
+            business_short_code="174379",
+            checkout_request_id="ws_CO_13012021093521236557",
+            password="password",
+            timestamp="20160216165627",
+        )
+
+    # Calls beyond the burst wait for the rate limiter, which isn't timed
+    for _ in range(12):
+        assert query().status_ok
+    for _ in range(2):
+        with pytest.raises(Exception):
+            query(access_token=None)
+    assert breakers.get(QUERY_PATH).state is CircuitState.CLOSED
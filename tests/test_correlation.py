@@ -0,0 +1,203 @@
+import asyncio
+import pathlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import httpx
+import pytest
+import responses
+
+from mpesa_connect import (
+    App,
+    AppEnv,
+    AsyncSTKPush,
+    CallbackType,
+    CorrelationStore,
+    InMemoryCorrelationStore,
+    MpesaTimeoutError,
+    SQLiteCorrelationStore,
+    STKPush,
+    STKPushCallback,
+    STKPushResult,
+    TransactionType,
+    parse_callback,
+)
+
+SANDBOX_URL = "https://sandbox.safaricom.co.ke"
+CHECKOUT_REQUEST_ID = "ws_CO_191220191020363925"
+
+
+def _callback(checkout_request_id: str = CHECKOUT_REQUEST_ID) -> STKPushCallback:
+    callback = parse_callback(
+        CallbackType.STK_PUSH,
+        {
+            "Body": {
+                "stkCallback": {
+                    "MerchantRequestID": "29115-34620561-1",
+                    "CheckoutRequestID": checkout_request_id,
+                    "ResultCode": 1032,
+                    "ResultDesc": "Request cancelled by user",
+                }
+            }
+        },
+    )
+    assert isinstance(callback, STKPushCallback)
+    return callback
+
+
+def test_in_memory_store() -> None:
+    store = InMemoryCorrelationStore()
+    store.record(CHECKOUT_REQUEST_ID, {"amount": 1})
+    threading.Timer(0.05, store.resolve, [_callback()]).start()
+    callback = store.wait(CHECKOUT_REQUEST_ID, timeout=5)
+    assert callback.result_code == 1032  # type: ignore[attr-defined]
+    correlation = store.get(CHECKOUT_REQUEST_ID)
+    assert correlation is not None and correlation.request == {"amount": 1}
+    with pytest.raises(MpesaTimeoutError):
+        store.wait("unknown", timeout=0.01)
+
+
+def test_callback_received_before_request_recorded() -> None:
+    store = InMemoryCorrelationStore()
+    store.resolve(_callback())
+    store.record(CHECKOUT_REQUEST_ID, {})
+    assert store.wait(CHECKOUT_REQUEST_ID, timeout=0) == _callback()
+
+
+def test_in_memory_store_eviction() -> None:
+    store = InMemoryCorrelationStore(ttl=0.05, max_size=2)
+    for i in range(3):
+        store.record(str(i), {})
+    assert store.get("0") is None
+    assert len(store) == 2
+    time.sleep(0.06)
+    assert store.get("2") is None
+
+
+def test_sqlite_store(tmp_path: pathlib.Path) -> None:
+    sender = SQLiteCorrelationStore(str(tmp_path / "db.sqlite"), poll_interval=0.01)
+    receiver = SQLiteCorrelationStore(str(tmp_path / "db.sqlite"))
+    sender.record(CHECKOUT_REQUEST_ID, {"amount": 1})
+    threading.Timer(0.05, receiver.resolve, [_callback()]).start()
+    assert sender.wait(CHECKOUT_REQUEST_ID, timeout=5) == _callback()
+    correlation = receiver.get(CHECKOUT_REQUEST_ID)
+    assert correlation is not None and correlation.request == {"amount": 1}
+
+
+@responses.activate
+def test_result_waits_for_callback() -> None:
+    responses.post(
+        f"{SANDBOX_URL}/mpesa/stkpush/v1/processrequest",
+        json={
+            "MerchantRequestID": "29115-34620561-1",
+            "CheckoutRequestID": CHECKOUT_REQUEST_ID,
+            "ResponseCode": "0",
+            "ResponseDescription": "Success. Request accepted for processing",
+            "CustomerMessage": "Success. Request accepted for processing",
+        },
+    )
+    store = InMemoryCorrelationStore()
+    app = App(
+        env=AppEnv.SANDBOX,
+        consumer_key="",
+        consumer_secret="",
+        correlation_store=store,
+    )
+    result = STKPush(app, access_token="token").process_request(
+        business_short_code="174379",
+        phone_number="254708374149",
+        amount="1",
+        call_back_url="https://mydomain.com/pat",
+        account_reference="Test",
+        transaction_desc="Test",
+        transaction_type=TransactionType.CUSTOMER_PAY_BILL_ONLINE,
+        pass_key="passkey",
+    )
+    assert isinstance(result, STKPushResult)
+    correlation = store.get(CHECKOUT_REQUEST_ID)
+    assert correlation is not None
+    assert correlation.request["path"] == "/mpesa/stkpush/v1/processrequest"
+    threading.Timer(0.05, store.resolve, [_callback()]).start()
+    assert result.wait_for_callback(timeout=5) == _callback()
+
+
+def test_store_must_implement_the_storage() -> None:
+    class Incomplete(CorrelationStore):
+        def get(self, correlation_id: str) -> None:
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()  # type: ignore[abstract]
+
+
+def test_async_waiters_leave_the_executor_to_callbacks(tmp_path: pathlib.Path) -> None:
+    store = SQLiteCorrelationStore(str(tmp_path / "db.sqlite"), poll_interval=0.05)
+    ids = [f"{CHECKOUT_REQUEST_ID}{i}" for i in range(4)]
+
+    async def main() -> None:
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(2))
+        waiters = [asyncio.ensure_future(store.wait_async(i, timeout=5)) for i in ids]
+        await asyncio.sleep(0.1)
+        # More waiters than executor threads, callbacks are still resolved
+        started_at = time.monotonic()
+        for i in ids:
+            await loop.run_in_executor(None, store.resolve, _callback(i))
+        assert time.monotonic() - started_at < 1
+        callbacks = await asyncio.gather(*waiters)
+        assert [c.correlation_id for c in callbacks] == ids
+        with pytest.raises(MpesaTimeoutError):
+            await store.wait_async("unknown", timeout=0.1)
+
+    asyncio.run(main())
+
+
+def test_async_requests_are_recorded_off_the_event_loop() -> None:
+    recorded_in: List[threading.Thread] = []
+
+    class Store(InMemoryCorrelationStore):
+        def record(self, correlation_id: str, request: Dict[str, Any]) -> None:
+            recorded_in.append(threading.current_thread())
+            super().record(correlation_id, request)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(
+            200,
+            json={
+                "MerchantRequestID": "29115-34620561-1",
+                "CheckoutRequestID": CHECKOUT_REQUEST_ID,
+                "ResponseCode": "0",
+                "ResponseDescription": "Success. Request accepted for processing",
+                "CustomerMessage": "Success. Request accepted for processing",
+            },
+        )
+
+    async def main() -> Any:
+        store = Store()
+        app = App(
+            env=AppEnv.SANDBOX,
+            consumer_key="",
+            consumer_secret="",
+            correlation_store=store,
+        )
+        app._async_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        async with app:
+            result = await AsyncSTKPush(app, access_token="token").process_request(
+                business_short_code="174379",
+                phone_number="254708374149",
+                amount="1",
+                call_back_url="https://mydomain.com/pat",
+                account_reference="Test",
+                transaction_desc="Test",
+                transaction_type=TransactionType.CUSTOMER_PAY_BILL_ONLINE,
+                pass_key="passkey",
+            )
+            assert isinstance(result, STKPushResult)
+            loop = asyncio.get_running_loop()
+            loop.call_later(0.05, store.resolve, _callback())
+            return await result.wait_for_callback_async(timeout=5)
+
+    assert asyncio.run(main()) == _callback()
+    assert recorded_in and recorded_in[0] is not threading.main_thread()
@@ -0,0 +1,93 @@
+import base64
+import datetime
+import os
+import pathlib
+import time
+from typing import Any, Tuple
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.x509.oid import NameOID
+
+from mpesa_connect import SecurityCredentialProvider
+from mpesa_connect.utils import generate_security_credential
+
+
+def _certificate() -> Tuple[Any, bytes]:
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "mpesa")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    return key, certificate.public_bytes(serialization.Encoding.PEM)
+
+
+def _decrypt(key: Any, credential: str) -> str:
+    return key.decrypt(base64.b64decode(credential), padding.PKCS1v15()).decode()
+
+
+def test_generate_security_credential() -> None:
+    key, pem = _certificate()
+    assert _decrypt(key, generate_security_credential("Safaricom999!*!", pem)) == (
+        "Safaricom999!*!"
+    )
+
+
+def test_provider_caches_credentials() -> None:
+    key, pem = _certificate()
+    provider = SecurityCredentialProvider(pem, cache_ttl=60)
+    credential = provider.generate("Safaricom999!*!")
+    assert _decrypt(key, credential) == "Safaricom999!*!"
+    assert provider.generate("Safaricom999!*!") == credential
+    assert provider.generate("other") != credential
+    uncached = SecurityCredentialProvider(pem)
+    assert uncached.generate("Safaricom999!*!") != uncached.generate("Safaricom999!*!")
+
+
+def test_provider_reloads_rotated_certificate(tmp_path: pathlib.Path) -> None:
+    old_key, old_pem = _certificate()
+    new_key, new_pem = _certificate()
+    path = tmp_path / "cert.cer"
+    path.write_bytes(old_pem)
+    provider = SecurityCredentialProvider(str(path), cache_ttl=60, check_interval=0)
+    assert _decrypt(old_key, provider.generate("password")) == "password"
+    path.write_bytes(new_pem)
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert _decrypt(new_key, provider.generate("password")) == "password"
+
+
+def test_provider_keeps_certificate_while_rotation_fails(
+    tmp_path: pathlib.Path,
+) -> None:
+    old_key, old_pem = _certificate()
+    new_key, new_pem = _certificate()
+    path = tmp_path / "cert.cer"
+    path.write_bytes(old_pem)
+    provider = SecurityCredentialProvider(str(path), check_interval=0)
+    path.unlink()
+    assert _decrypt(old_key, provider.generate("password")) == "password"
+    path.write_bytes(old_pem[: len(old_pem) // 2])
+    assert _decrypt(old_key, provider.generate("password")) == "password"
+    # Loaded at the next check once the file is complete
+    path.write_bytes(new_pem)
+    assert _decrypt(new_key, provider.generate("password")) == "password"
+
+
+def test_provider_drops_expired_credentials() -> None:
+    _, pem = _certificate()
+    provider = SecurityCredentialProvider(pem, cache_ttl=0.01)
+    for i in range(10):
+        provider.generate(f"password{i}")
+    time.sleep(0.02)
+    provider.generate("password")
+    assert len(provider._cache) == 1
@@ -0,0 +1,197 @@
+from typing import Any, List, Optional, Tuple
+
+import pytest
+import requests
+import responses
+
+from mpesa_connect import App, AppEnv, Metrics, RetryPolicy, STKPush
+from mpesa_connect.instrumentation import default_hooks
+
+SANDBOX_URL = "https://sandbox.safaricom.co.ke"
+QUERY_PATH = "/mpesa/stkpushquery/v1/query"
+OAUTH_PATH = "/oauth/v1/generate"
+QUERY_RESPONSE = {
+    "ResponseCode": "0",
+    "ResponseDescription": "Accepted",
+    "MerchantRequestID": "22205-34066-1",
+    "CheckoutRequestID": "ws_CO_13012021093521236557",
+    "ResultCode": "0",
+    "ResultDesc": "Processed",
+}
+UNAVAILABLE = {
+    "requestId": "1",
+    "errorCode": "503.001.01",
+    "errorMessage": "Service Unavailable",
+}
+
+
+class RecordingMetrics(Metrics):
+    def __init__(self) -> None:
+        self.events: List[Tuple[Any, ...]] = []
+
+    def request_started(self, path: str) -> None:
+        self.events.append(("started", path))
+
+    def request_finished(
+        self, path: str, seconds: float, status_code: Optional[int]
+    ) -> None:
+        assert seconds >= 0
+        self.events.append(("finished", path, status_code))
+
+    def result(self, path: str, status_code: int, error_code: Optional[str]) -> None:
+        self.events.append(("result", path, status_code, error_code))
+
+    def retry(self, path: str) -> None:
+        self.events.append(("retry", path))
+
+    def token_refresh(self, ok: bool) -> None:
+        self.events.append(("token_refresh", ok))
+
+
+def _query(app: App, access_token: Optional[str] = "token"):  # type: ignore[no-untyped-def]
+    return STKPush(app, access_token=access_token).query(
+        business_short_code="174379",
+        checkout_request_id="ws_CO_13012021093521236557",
+        password="password",
+        timestamp="20160216165627",
+    )
+
+
+@responses.activate
+def test_metrics_record_attempts_results_and_retries() -> None:
+    responses.get(
+        f"{SANDBOX_URL}{OAUTH_PATH}",
+        json={"access_token": "token", "expires_in": "3599"},
+    )
+    responses.post(f"{SANDBOX_URL}{QUERY_PATH}", status=503, json=UNAVAILABLE)
+    responses.post(f"{SANDBOX_URL}{QUERY_PATH}", json=QUERY_RESPONSE)
+    metrics = RecordingMetrics()
+    app = App(
+        env=AppEnv.SANDBOX,
+        consumer_key="",
+        consumer_secret="",
+        metrics=metrics,
+        retry_policy=RetryPolicy(backoff=0),
+    )
+    assert _query(app, access_token=None).status_ok
+    assert metrics.events == [
+        ("started", OAUTH_PATH),
+        ("finished", OAUTH_PATH, 200),
+        ("result", OAUTH_PATH, 200, None),
+        ("token_refresh", True),
+        ("started", QUERY_PATH),
+        ("finished", QUERY_PATH, 503),
+        ("result", QUERY_PATH, 503, "503.001.01"),
+        ("retry", QUERY_PATH),
+        ("started", QUERY_PATH),
+        ("finished", QUERY_PATH, 200),
+        ("result", QUERY_PATH, 200, None),
+    ]
+
+
+@responses.activate
+def test_hooks_run_around_every_request() -> None:
+    responses.post(
+        f"{SANDBOX_URL}{QUERY_PATH}", body=requests.ConnectionError("refused")
+    )
+    calls: List[Tuple[Any, ...]] = []
+
+    def on_request(method: str, path: str, kwargs: Any) -> None:
+        kwargs["headers"]["traceparent"] = "00-trace-span-01"
+        calls.append(("request", method, path))
+
+    def on_response(
+        method: str,
+        path: str,
+        response: Any,
+        error: Optional[BaseException],
+        elapsed: float,
+    ) -> None:
+        calls.append(("response", method, path, response, type(error)))
+
+    metrics = RecordingMetrics()
+    app = App(
+        env=AppEnv.SANDBOX,
+        consumer_key="",
+        consumer_secret="",
+        metrics=metrics,
+        hooks={"request": [on_request], "response": [on_response]},
+    )
+    with pytest.raises(requests.ConnectionError):
+        _query(app)
+    assert responses.calls[0].request.headers["traceparent"] == "00-trace-span-01"
+    assert calls == [
+        ("request", "POST", QUERY_PATH),
+        ("response", "POST", QUERY_PATH, None, requests.ConnectionError),
+    ]
+    assert metrics.events == [
+        ("started", QUERY_PATH),
+        ("finished", QUERY_PATH, None),
+    ]
+
+
+def test_unknown_hook_event() -> None:
+    with pytest.raises(ValueError):
+        default_hooks({"error": []})
+
+
+@responses.activate
+def test_prometheus_metrics() -> None:
+    prometheus_client = pytest.importorskip("prometheus_client")
+    from mpesa_connect import PrometheusMetrics
+
+    responses.post(f"{SANDBOX_URL}{QUERY_PATH}", status=503, json=UNAVAILABLE)
+    registry = prometheus_client.CollectorRegistry()
+    app = App(
+        env=AppEnv.SANDBOX,
+        consumer_key="",
+        consumer_secret="",
+        metrics=PrometheusMetrics(registry=registry),
+    )
+    _query(app)
+    labels = {"path": QUERY_PATH}
+    assert (
+        registry.get_sample_value("mpesa_request_duration_seconds_count", labels) == 1
+    )
+    assert registry.get_sample_value("mpesa_requests_in_flight", labels) == 0
+    assert (
+        registry.get_sample_value(
+            "mpesa_responses_total",
+            {**labels, "status": "503", "error_code": "503.001.01"},
+        )
+        == 1
+    )
+
+
+@responses.activate
+def test_opentelemetry_metrics() -> None:
+    pytest.importorskip("opentelemetry.sdk.metrics")
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+
+    from mpesa_connect import OpenTelemetryMetrics
+
+    responses.post(f"{SANDBOX_URL}{QUERY_PATH}", json=QUERY_RESPONSE)
+    reader = InMemoryMetricReader()
+    meter = MeterProvider(metric_readers=[reader]).get_meter("test")
+    app = App(
+        env=AppEnv.SANDBOX,
+        consumer_key="",
+        consumer_secret="",
+        metrics=OpenTelemetryMetrics(meter),
+    )
+    _query(app)
+    data = reader.get_metrics_data()
+    points = {
+        metric.name: metric.data.data_points[0]
+        for resource in data.resource_metrics
+        for scope in resource.scope_metrics
+        for metric in scope.metrics
+    }
+    assert points["mpesa.request.duration"].count == 1
+    assert points["mpesa.requests.in_flight"].value == 0
+    assert points["mpesa.responses"].attributes == {
+        "path": QUERY_PATH,
+        "status": "200",
+        "error_code": "",
+    }
@@ -0,0 +1,110 @@
+import json
+
+import pytest
+import requests
+import responses
+
+from mpesa_connect import App, AppEnv, ResponseInfo, STKPush, get_json_backend
+from mpesa_connect.json_backend import JSONBackend
+
+SANDBOX_URL = "https://sandbox.safaricom.co.ke"
+QUERY_PATH = "/mpesa/stkpushquery/v1/query"
+QUERY_RESPONSE = {
+    "ResponseCode": "0",
+    "ResponseDescription": "Accepted",
+    "MerchantRequestID": "22205-34066-1",
+    "CheckoutRequestID": "ws_CO_13012021093521236557",
+    "ResultCode": "0",
+    "ResultDesc": "Processed",
+}
+
+
+def _query(app: App) -> object:
+    return STKPush(app, access_token="token").query(
+        business_short_code="174379",
+        checkout_request_id="ws_CO_13012021093521236557",
+        password="password",
+        timestamp="20160216165627",
+    )
+
+
+@pytest.mark.parametrize("name", ["json", "orjson", "ujson"])
+def test_backends_round_trip(name: str) -> None:
+    try:
+        backend = get_json_backend(name)
+    except ImportError:
+        pytest.skip(f"{name} is not installed")
+    payload = {"Amount": 1, "PhoneNumber": "254700000000", "Remarks": "ñ"}
+    data = backend.dumps(payload)
+    assert isinstance(data, bytes)
+    assert json.loads(data) == payload
+    assert backend.loads(data) == payload
+    with pytest.raises(ValueError):
+        backend.loads(b"<html>")
+
+
+def test_unknown_backend() -> None:
+    with pytest.raises(ValueError):
+        get_json_backend("yaml")
+
+
+@responses.activate
+def test_custom_backend_encodes_and_decodes() -> None:
+    calls = []
+
+    def dumps(obj: object) -> bytes:
+        calls.append("dumps")
+        return json.dumps(obj).encode()
+
+    def loads(data: bytes) -> object:
+        calls.append("loads")
+        return json.loads(data)
+
+    responses.post(f"{SANDBOX_URL}{QUERY_PATH}", json=QUERY_RESPONSE)
+    app = App(
+        env=AppEnv.SANDBOX,
+        consumer_key="",
+        consumer_secret="",
+        json_backend=JSONBackend("custom", dumps, loads),
+    )
+    result = _query(app)
+    request = responses.calls[0].request
+    assert request.headers["Content-Type"] == "application/json"
+    assert (
+        json.loads(request.body)["CheckoutRequestID"]
+        == QUERY_RESPONSE["CheckoutRequestID"]
+    )
+    assert calls == ["dumps", "loads"]
+    assert result.checkout_request_id == QUERY_RESPONSE["CheckoutRequestID"]
+
+
+@responses.activate
+def test_results_drop_response() -> None:
+    responses.post(f"{SANDBOX_URL}{QUERY_PATH}", json=QUERY_RESPONSE)
+    app = App(
+        env=AppEnv.SANDBOX,
+        consumer_key="",
+        consumer_secret="",
+        retain_response=False,
+    )
+    result = _query(app)
+    assert isinstance(result.response, ResponseInfo)
+    assert result.response.status_code == 200
+    assert result.response.url == f"{SANDBOX_URL}{QUERY_PATH}"
+    assert result.status_ok
+
+
+@pytest.mark.parametrize("name", ["json", "orjson", "ujson"])
+@responses.activate
+def test_invalid_body_raises_requests_error(name: str) -> None:
+    try:
+        backend = get_json_backend(name)
+    except ImportError:
+        pytest.skip(f"{name} is not installed")
+    responses.post(f"{SANDBOX_URL}{QUERY_PATH}", body="<html>Bad Gateway</html>")
+    app = App(
+        env=AppEnv.SANDBOX, consumer_key="", consumer_secret="", json_backend=backend
+    )
+    with pytest.raises(requests.JSONDecodeError) as excinfo:
+        _query(app)
+    assert excinfo.value.doc == "<html>Bad Gateway</html>"
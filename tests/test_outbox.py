@@ -0,0 +1,304 @@
+import asyncio
+import json
+import pathlib
+import threading
+from typing import Any, Dict, List, Optional
+
+import httpx
+import pytest
+import responses
+
+from mpesa_connect import (
+    B2C,
+    App,
+    AppEnv,
+    CallbackType,
+    CommandID,
+    IdentifierType,
+    Outbox,
+    OutboxStatus,
+    TransactionStatus,
+    parse_callback,
+)
+from mpesa_connect.aio import AsyncB2C
+
+from .test_circuitbreaker import _connection_refused
+
+SANDBOX_URL = "https://sandbox.safaricom.co.ke"
+B2C_PATH = "/mpesa/b2c/v1/paymentrequest"
+STATUS_PATH = "/mpesa/transactionstatus/v1/query"
+ORIGINATOR_ID = "2dc26700-cdce-41a8-9913-d8a35704cd48"
+ACCEPTED = {
+    "ConversationID": "AG_20191219_00005797af5d7d75f652",
+    "OriginatorConversationID": ORIGINATOR_ID,
+    "ResponseCode": "0",
+    "ResponseDescription": "Accept the service request successfully.",
+}
+
+
+def _payment(b2c: Any, originator_conversation_id: str = ORIGINATOR_ID) -> Any:
+    return b2c.payment_request(
+        originator_conversation_id=originator_conversation_id,
+        initiator_name="testapi",
+        security_credential="credential",
+        command_id=CommandID.BUSINESS_PAYMENT,
+        amount="1",
+        party_a="600979",
+        party_b="254708374149",
+        remarks="Test remarks",
+        queue_time_out_url="https://mydomain.com/b2c/queue",
+        result_url="https://mydomain.com/b2c/result",
+    )
+
+
+def _result(
+    originator_conversation_id: str, conversation_id: str, result_code: Any = 0
+) -> Dict[str, Any]:
+    return {
+        "Result": {
+            "ResultType": 0,
+            "ResultCode": result_code,
+            "ResultDesc": "Processed",
+            "OriginatorConversationID": originator_conversation_id,
+            "ConversationID": conversation_id,
+            "TransactionID": "NLJ41HAY6Q",
+        }
+    }
+
+
+@pytest.fixture
+def outbox(tmp_path: pathlib.Path) -> Any:
+    outbox = Outbox(str(tmp_path / "outbox.db"))
+    yield outbox
+    outbox.close()
+
+
+def _app(outbox: Outbox) -> App:
+    return App(env=AppEnv.SANDBOX, consumer_key="", consumer_secret="", outbox=outbox)
+
+
+@responses.activate
+def test_records_before_sending_and_completes_from_callback(outbox: Outbox) -> None:
+    def accept(request: Any) -> Any:
+        # Durable before the request leaves
+        entry = outbox.get(ORIGINATOR_ID)
+        assert entry is not None and entry.status is OutboxStatus.PENDING
+        return 200, {}, json.dumps(ACCEPTED)
+
+    responses.add_callback("POST", f"{SANDBOX_URL}{B2C_PATH}", callback=accept)
+    assert _payment(B2C(_app(outbox), access_token="token")).status_ok
+    entry = outbox.get(ORIGINATOR_ID)
+    assert entry is not None
+    assert entry.status is OutboxStatus.ACCEPTED
+    assert entry.conversation_id == ACCEPTED["ConversationID"]
+    assert entry.payload["PartyB"] == "254708374149"
+
+    callback = parse_callback(
+        CallbackType.B2C, _result(ORIGINATOR_ID, ACCEPTED["ConversationID"])
+    )
+    completed = outbox.handle_callback(callback)
+    assert completed is not None
+    assert completed.status is OutboxStatus.COMPLETED
+    assert completed.result_code == "0"
+
+
+@responses.activate
+def test_rejections_and_connect_errors_are_safe_to_resend(outbox: Outbox) -> None:
+    b2c = B2C(_app(outbox), access_token="token")
+    responses.post(
+        f"{SANDBOX_URL}{B2C_PATH}",
+        status=400,
+        json={
+            "requestId": "1",
+            "errorCode": "400.002.02",
+            "errorMessage": "Bad Request - Invalid Amount",
+        },
+    )
+    assert not _payment(b2c, "rejected").status_ok
+    responses.replace("POST", f"{SANDBOX_URL}{B2C_PATH}", body=_connection_refused())
+    with pytest.raises(Exception):
+        _payment(b2c, "not-sent")
+    responses.replace("POST", f"{SANDBOX_URL}{B2C_PATH}", body=TimeoutError("read"))
+    with pytest.raises(TimeoutError):
+        _payment(b2c, "in-doubt")
+    entries = {
+        e.originator_conversation_id: e.status for e in outbox.entries(*OutboxStatus)
+    }
+    assert entries == {
+        "rejected": OutboxStatus.REJECTED,
+        "not-sent": OutboxStatus.NOT_SENT,
+        "in-doubt": OutboxStatus.PENDING,
+    }
+    assert outbox.get("rejected").result_code == "400.002.02"  # type: ignore[union-attr]
+    assert [e.originator_conversation_id for e in outbox.in_doubt(0)] == ["in-doubt"]
+
+
+@responses.activate
+def test_reconciles_in_doubt_requests_with_status_queries(
+    tmp_path: pathlib.Path,
+) -> None:
+    path = str(tmp_path / "outbox.db")
+    outbox = Outbox(path)
+    outbox.record(B2C_PATH, {"OriginatorConversationID": "found"})
+    outbox.record(B2C_PATH, {"OriginatorConversationID": "lost"})
+    outbox.record(B2C_PATH, {"OriginatorConversationID": "busy"})
+    outbox.close()
+
+    # After a restart
+    outbox = Outbox(path)
+    payloads = []
+
+    def accept(request: Any) -> Any:
+        payload = json.loads(request.body)
+        payloads.append(payload)
+        return (
+            200,
+            {},
+            json.dumps(
+                {
+                    "ConversationID": f"AG_{payload['OriginalConversationID']}",
+                    "OriginatorConversationID": payload["OriginatorConversationID"],
+                    "ResponseCode": "0",
+                    "ResponseDescription": "Accept the service request successfully.",
+                }
+            ),
+        )
+
+    responses.add_callback("POST", f"{SANDBOX_URL}{STATUS_PATH}", callback=accept)
+    transaction_status = TransactionStatus(_app(outbox), access_token="token")
+    query = {
+        "initiator": "testapi",
+        "security_credential": "credential",
+        "identifier_type": IdentifierType.ORGANIZATION_SHORT_CODE,
+        "party_a": "600979",
+        "remarks": "Reconciliation",
+        "queue_time_out_url": "https://mydomain.com/status/queue",
+        "result_url": "https://mydomain.com/status/result",
+    }
+    queried = outbox.reconcile(transaction_status, older_than=0, **query)
+    assert [e.originator_conversation_id for e in queried] == ["found", "lost", "busy"]
+    for payload, original in zip(payloads, ("found", "lost", "busy")):
+        # Every query has its own id and looks up the original request
+        assert payload == {
+            "OriginatorConversationID": payload["OriginatorConversationID"],
+            "OriginalConversationID": original,
+            "TransactionID": "",
+            "Initiator": "testapi",
+            "SecurityCredential": "credential",
+            "CommandID": "TransactionStatusQuery",
+            "PartyA": "600979",
+            "IdentifierType": 4,
+            "Remarks": "Reconciliation",
+            "QueueTimeOutURL": "https://mydomain.com/status/queue",
+            "ResultURL": "https://mydomain.com/status/result",
+            "Occassion": None,
+        }
+        assert payload["OriginatorConversationID"] != original
+    assert outbox.get("found").status is OutboxStatus.RECONCILING  # type: ignore[union-attr]
+    assert outbox.in_doubt(0) == []
+
+    results = (("found", 0), ("lost", "R000001"), ("busy", 2001))
+    for originator_conversation_id, result_code in results:
+        outbox.handle_callback(
+            parse_callback(
+                CallbackType.TRANSACTION_STATUS,
+                _result(
+                    "status-query", f"AG_{originator_conversation_id}", result_code
+                ),
+            )
+        )
+    assert outbox.get("found").status is OutboxStatus.COMPLETED  # type: ignore[union-attr]
+    assert outbox.get("lost").status is OutboxStatus.NOT_FOUND  # type: ignore[union-attr]
+    # A failed query says nothing about the request, it is queried again
+    assert outbox.get("busy").status is OutboxStatus.RECONCILING  # type: ignore[union-attr]
+    queried = outbox.reconcile(transaction_status, older_than=0, **query)
+    assert [e.originator_conversation_id for e in queried] == ["busy"]
+    outbox.close()
+
+
+def test_only_requests_known_not_sent_can_be_recorded_again(outbox: Outbox) -> None:
+    outbox.record(B2C_PATH, {"OriginatorConversationID": "1", "Amount": "1"})
+    with pytest.raises(ValueError):
+        outbox.record(B2C_PATH, {"OriginatorConversationID": "1", "Amount": "1"})
+    for status in OutboxStatus:
+        outbox._update("1", status)
+        if status in (
+            OutboxStatus.NOT_SENT,
+            OutboxStatus.NOT_FOUND,
+            OutboxStatus.REJECTED,
+        ):
+            outbox.record(B2C_PATH, {"OriginatorConversationID": "1", "Amount": "2"})
+            entry = outbox.get("1")
+            assert entry is not None and entry.status is OutboxStatus.PENDING
+            assert entry.payload["Amount"] == "2"
+        else:
+            with pytest.raises(ValueError):
+                outbox.record(B2C_PATH, {"OriginatorConversationID": "1"})
+
+
+def test_concurrent_writes_are_committed_together(outbox: Outbox) -> None:
+    # Writes in each transaction SQLite commits
+    commits: List[int] = []
+    writes: Optional[int] = None
+
+    def trace(statement: str) -> None:
+        nonlocal writes
+        if statement.startswith("BEGIN"):
+            writes = 0
+        elif statement.startswith("SAVEPOINT"):
+            if writes is None:
+                # Opens a transaction of its own, committed by its release
+                commits.append(1)
+            else:
+                writes += 1
+        elif statement.startswith("COMMIT") and writes is not None:
+            commits.append(writes)
+            writes = None
+
+    commit = outbox._commit
+
+    def tracing(db: Any, batch: Any) -> None:
+        db.set_trace_callback(trace)
+        commit(db, batch)
+
+    outbox.commit_interval = 0.05
+    outbox._commit = tracing  # type: ignore[method-assign]
+    threads = [
+        threading.Thread(
+            target=outbox.record, args=(B2C_PATH, {"OriginatorConversationID": str(i)})
+        )
+        for i in range(20)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(outbox.entries(OutboxStatus.PENDING)) == 20
+    assert len(commits) < 20 and sum(commits) == 20
+
+
+def test_failed_write_does_not_fail_the_batch(outbox: Outbox) -> None:
+    with pytest.raises(ValueError):
+        outbox.record(B2C_PATH, {})
+    assert outbox.record(B2C_PATH, {"OriginatorConversationID": "1"}) == "1"
+
+
+def test_async_calls_are_recorded(outbox: Outbox) -> None:
+    async def main() -> Any:
+        app = App(
+            env=AppEnv.SANDBOX,
+            consumer_key="",
+            consumer_secret="",
+            outbox=outbox,
+            base_url="https://mpesa.test",
+        )
+        app._async_client = httpx.AsyncClient(
+            transport=httpx.MockTransport(lambda r: httpx.Response(200, json=ACCEPTED))
+        )
+        try:
+            return await _payment(AsyncB2C(app, access_token="token"))
+        finally:
+            await app.aclose()
+
+    assert asyncio.run(main()).status_ok
+    assert outbox.get(ORIGINATOR_ID).status is OutboxStatus.ACCEPTED  # type: ignore[union-attr]
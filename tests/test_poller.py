@@ -0,0 +1,110 @@
+import asyncio
+import json
+import threading
+from collections import Counter
+from typing import List
+
+import responses
+
+from mpesa_connect import (
+    App,
+    AppEnv,
+    PollOutcome,
+    STKPush,
+    STKPushPoller,
+    STKPushQueryResult,
+)
+
+QUERY_URL = "https://sandbox.safaricom.co.ke/mpesa/stkpushquery/v1/query"
+
+
+@responses.activate
+def test_poller() -> None:
+    queries: Counter = Counter()
+    lock = threading.Lock()
+
+    def callback(request):  # type: ignore[no-untyped-def]
+        checkout_request_id = json.loads(request.body)["CheckoutRequestID"]
+        with lock:
+            queries[checkout_request_id] += 1
+            attempt = queries[checkout_request_id]
+        if attempt == 1:
+            body = {
+                "requestId": "1",
+                "errorCode": "500.001.1001",
+                "errorMessage": "The transaction is being processed",
+            }
+            return (500, {}, json.dumps(body))
+        if attempt == 2:
+            # Answered, but still in progress
+            result_code, result_desc = (
+                "4999",
+                "The transaction is still under processing",
+            )
+        elif checkout_request_id == "ws_1":
+            result_code, result_desc = "1032", "Request cancelled by user"
+        else:
+            result_code, result_desc = "0", "Done"
+        body = {
+            "ResponseCode": "0",
+            "ResponseDescription": "Accepted",
+            "MerchantRequestID": "22205-34066-1",
+            "CheckoutRequestID": checkout_request_id,
+            "ResultCode": result_code,
+            "ResultDesc": result_desc,
+        }
+        return (200, {}, json.dumps(body))
+
+    responses.add_callback(responses.POST, QUERY_URL, callback=callback)
+    app = App(env=AppEnv.SANDBOX, consumer_key="", consumer_secret="")
+    received: List[PollOutcome] = []
+    with STKPushPoller(
+        STKPush(app, access_token="token"),
+        business_short_code="174379",
+        pass_key="passkey",
+        on_result=received.append,
+        rate=1000,
+        initial_delay=0.01,
+        backoff=2,
+    ) as poller:
+        futures = [poller.track(f"ws_{i}") for i in range(5)]
+        assert poller.track("ws_0") is futures[0]
+        outcomes = list(poller.results(timeout=5))
+    assert len(outcomes) == len(received) == 5
+    assert all(f.result().attempts == 3 for f in futures)
+    assert all(isinstance(o.result, STKPushQueryResult) for o in outcomes)
+    assert sorted(o.status_ok for o in outcomes) == [False, True, True, True, True]
+    assert set(queries.values()) == {3}
+
+
+def test_complete_stops_polling() -> None:
+    app = App(env=AppEnv.SANDBOX, consumer_key="", consumer_secret="")
+    with STKPushPoller(STKPush(app), initial_delay=60) as poller:
+        future = poller.track("ws_0")
+        poller.complete("ws_0")
+        outcome = future.result(timeout=1)
+    assert outcome.attempts == 0
+    assert len(poller) == 0
+
+
+def test_stop_finishes_pending_checkouts() -> None:
+    app = App(env=AppEnv.SANDBOX, consumer_key="", consumer_secret="")
+    poller = STKPushPoller(STKPush(app), initial_delay=60)
+    futures = [poller.track(f"ws_{i}") for i in range(3)]
+    outcomes: List[PollOutcome] = []
+    consumer = threading.Thread(target=lambda: outcomes.extend(poller.results()))
+    consumer.start()
+    poller.stop()
+    consumer.join(timeout=5)
+    assert not consumer.is_alive()
+    assert len(outcomes) == 3
+    assert all(f.done() and not f.result().status_ok for f in futures)
+
+    async def collect() -> List[PollOutcome]:
+        poller.track("ws_3")
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.05, poller.stop)
+        return [outcome async for outcome in poller]
+
+    outcomes = asyncio.run(asyncio.wait_for(collect(), 5))
+    assert [o.checkout_request_id for o in outcomes] == ["ws_3"]
@@ -0,0 +1,69 @@
+import time
+
+import responses
+
+from mpesa_connect import AdaptiveRateLimiter, App, AppEnv, RateLimiter, STKPush
+from mpesa_connect.urls import PATH_STKPUSHQUERY_QUERY
+
+SANDBOX_URL = "https://sandbox.safaricom.co.ke"
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_rate_limiter() -> None:
+    limiter = RateLimiter(50, burst=1)
+    start = time.monotonic()
+    for _ in range(10):
+        limiter.acquire()
+    assert time.monotonic() - start >= 0.17
+    assert not limiter.try_acquire()
+
+
+def test_adaptive_rate_limiter() -> None:
+    clock = FakeClock()
+    limiter = AdaptiveRateLimiter(100, clock=clock)
+    limiter.on_throttled()
+    limiter.on_throttled()
+    assert limiter.rate == 50
+    clock.now = 2
+    limiter.on_throttled()
+    assert limiter.rate == 25
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter.rate == 100
+
+
+@responses.activate
+def test_api_throttling_feedback() -> None:
+    responses.post(
+        f"{SANDBOX_URL}{PATH_STKPUSHQUERY_QUERY}",
+        json={
+            "requestId": "1",
+            "errorCode": "500.003.02",
+            "errorMessage": "Spike arrest violation",
+        },
+        status=429,
+    )
+    app = App(
+        env=AppEnv.SANDBOX,
+        consumer_key="",
+        consumer_secret="",
+        rate_limit=1000,
+        path_rate_limits={PATH_STKPUSHQUERY_QUERY: 200},
+    )
+    result = STKPush(app, access_token="token").query(
+        business_short_code="174379",
+        checkout_request_id="ws_CO_13012021093521236557",
+        password="password",
+        timestamp="20160216165627",
+    )
+    assert not result.status_ok
+    assert app.rate_limits.limiter is not None
+    assert app.rate_limits.limiter.rate == 500
+    assert app.rate_limits.path_limiters[PATH_STKPUSHQUERY_QUERY].rate == 100
@@ -0,0 +1,165 @@
+import csv
+import json
+import pathlib
+import random
+from typing import Any, Dict, List
+
+import pytest
+
+from mpesa_connect import (
+    CallbackType,
+    MatchStatus,
+    Reconciler,
+    hash_msisdn,
+    parse_callback,
+)
+
+
+def _confirmation(
+    trans_id: str, amount: str, bill_ref_number: str, msisdn: str
+) -> Dict[str, Any]:
+    return {
+        "TransactionType": "Pay Bill",
+        "TransID": trans_id,
+        "TransTime": "20191122063845",
+        "TransAmount": amount,
+        "BusinessShortCode": "600638",
+        "BillRefNumber": bill_ref_number,
+        "InvoiceNumber": "",
+        "OrgAccountBalance": "",
+        "ThirdPartyTransID": "",
+        "MSISDN": hash_msisdn(msisdn),
+        "FirstName": "John",
+    }
+
+
+STATEMENT_COLUMNS = {
+    "trans_id": "Receipt No.",
+    "amount": "Paid In",
+    "bill_ref_number": "A/C No.",
+    "msisdn": "Other Party Info",
+    "trans_time": "Completion Time",
+}
+
+
+def _row(
+    trans_id: str, amount: str, bill_ref_number: str, msisdn: str
+) -> Dict[str, str]:
+    return {
+        "Receipt No.": trans_id,
+        "Completion Time": "22-11-2019 06:38:45",
+        "Paid In": amount,
+        "A/C No.": bill_ref_number,
+        "Other Party Info": f"{msisdn} - John Doe",
+    }
+
+
+def test_hash_msisdn() -> None:
+    digest = hash_msisdn("254708374149")
+    assert digest == hash_msisdn("0708374149") == hash_msisdn("708374149")
+    assert hash_msisdn(digest) == digest
+    assert hash_msisdn("2547******149") is None
+
+
+def test_reconcile() -> None:
+    confirmations = [
+        _confirmation("NLJ0000001", "100.00", "INV1", "254708374149"),
+        _confirmation("NLJ0000002", "200.00", "INV2", "254708374149"),
+        _confirmation("NLJ0000003", "300.00", "INV3", "254708374149"),
+        _confirmation("NLJ0000004", "400.00", "INV4", "254708374149"),
+        _confirmation("NLJ0000001", "100.00", "INV1", "254708374149"),
+        _confirmation("NLJ0000006", "600.00", "INV6", "254708374149"),
+    ]
+    statement = [
+        _row("NLJ0000001", "100", "inv1", "254708374149"),
+        _row("NLJ0000002", "250", "INV2", "254708374149"),
+        _row("NLJ0000003", "300", "INV3", "254722000000"),
+        _row("NLJ0000005", "500", "INV5", "254708374149"),
+        _row("NLJX000006", "600", "INV6", "0708374149"),
+    ]
+    reconciler = Reconciler(statement_columns=STATEMENT_COLUMNS)
+    records = list(
+        reconciler.reconcile(
+            [parse_callback(CallbackType.C2B_CONFIRMATION, c) for c in confirmations],
+            statement,
+        )
+    )
+    outcomes = {
+        (
+            r.confirmation.trans_id if r.confirmation else None,
+            r.statement.trans_id if r.statement else None,
+            r.status,
+            r.differences,
+        )
+        for r in records
+    }
+    assert outcomes == {
+        ("NLJ0000001", "NLJ0000001", MatchStatus.MATCHED, ()),
+        ("NLJ0000001", "NLJ0000001", MatchStatus.DUPLICATE, ()),
+        ("NLJ0000002", "NLJ0000002", MatchStatus.MISMATCHED, ("amount",)),
+        ("NLJ0000003", "NLJ0000003", MatchStatus.MISMATCHED, ("msisdn",)),
+        ("NLJ0000004", None, MatchStatus.MISSING_FROM_STATEMENT, ()),
+        (None, "NLJ0000005", MatchStatus.MISSING_CONFIRMATION, ()),
+        ("NLJ0000006", "NLJX000006", MatchStatus.MISMATCHED, ("trans_id",)),
+    }
+    assert len(records) == 7
+    assert reconciler.counts[MatchStatus.MISMATCHED] == 3
+    assert not reconciler.spilled
+    assert records[0].statement.raw["Paid In"] == "100"  # type: ignore[union-attr]
+
+
+def _generate(count: int) -> Any:
+    rng = random.Random(7)
+    confirmations: List[Dict[str, Any]] = []
+    statement: List[Dict[str, str]] = []
+    for i in range(count):
+        trans_id = f"NLJ{i:07}"
+        amount = str(rng.randint(1, 10_000))
+        msisdn = f"2547{rng.randint(0, 99_999_999):08}"
+        if i % 10 != 1:
+            confirmations.append(_confirmation(trans_id, amount, f"INV{i}", msisdn))
+        if i % 10 != 2:
+            paid = str(int(amount) + 1) if i % 10 == 3 else amount
+            statement.append(_row(trans_id, paid, f"INV{i}", msisdn))
+    rng.shuffle(confirmations)
+    rng.shuffle(statement)
+    return confirmations, statement
+
+
+@pytest.mark.parametrize("memory_rows", [10_000, 50])
+def test_reconcile_files_with_bounded_memory(
+    tmp_path: pathlib.Path, memory_rows: int
+) -> None:
+    confirmations, statement = _generate(2_000)
+    confirmations_file = tmp_path / "confirmations.jsonl"
+    confirmations_file.write_text("".join(json.dumps(c) + "\n" for c in confirmations))
+    statement_file = tmp_path / "statement.csv"
+    with statement_file.open("w", newline="") as f:
+        writer = csv.DictWriter(f, list(statement[0]))
+        writer.writeheader()
+        writer.writerows(statement)
+
+    reconciler = Reconciler(
+        statement_columns=STATEMENT_COLUMNS,
+        memory_rows=memory_rows,
+        partitions=8,
+        spill_dir=str(tmp_path),
+    )
+    records = list(reconciler.reconcile(confirmations_file, statement_file))
+    assert reconciler.spilled is (memory_rows == 50)
+    assert dict(reconciler.counts) == {
+        MatchStatus.MATCHED: 1_400,
+        MatchStatus.MISMATCHED: 200,
+        MatchStatus.MISSING_FROM_STATEMENT: 200,
+        MatchStatus.MISSING_CONFIRMATION: 200,
+    }
+    assert all(
+        r.differences == ("amount",)
+        for r in records
+        if r.status is MatchStatus.MISMATCHED
+    )
+    # The partition files are removed
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "confirmations.jsonl",
+        "statement.csv",
+    ]
@@ -0,0 +1,154 @@
+import time
+
+import pytest
+import requests
+import responses
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from mpesa_connect import (
+    B2C,
+    App,
+    AppEnv,
+    B2CErrorResult,
+    B2CResult,
+    CommandID,
+    MpesaTimeoutError,
+    RetryPolicy,
+    STKPush,
+    STKPushQueryResult,
+)
+
+SANDBOX_URL = "https://sandbox.safaricom.co.ke"
+B2C_URL = f"{SANDBOX_URL}/mpesa/b2c/v1/paymentrequest"
+QUERY_URL = f"{SANDBOX_URL}/mpesa/stkpushquery/v1/query"
+UNAVAILABLE = {
+    "requestId": "1",
+    "errorCode": "503.001.01",
+    "errorMessage": "Service Unavailable",
+}
+
+
+@pytest.fixture
+def app() -> App:
+    return App(
+        env=AppEnv.SANDBOX,
+        consumer_key="",
+        consumer_secret="",
+        retry_policy=RetryPolicy(max_attempts=3, backoff=0),
+    )
+
+
+def _query(app: App):  # type: ignore[no-untyped-def]
+    return STKPush(app, access_token="token").query(
+        business_short_code="174379",
+        checkout_request_id="ws_CO_13012021093521236557",
+        password="password",
+        timestamp="20160216165627",
+    )
+
+
+def _pay(app: App):  # type: ignore[no-untyped-def]
+    return B2C(app, access_token="token").payment_request(
+        originator_conversation_id="2dc26700-cdce-41a8-9913-d8a35704cd48",
+        initiator_name="testapi",
+        security_credential="credential",
+        command_id=CommandID.BUSINESS_PAYMENT,
+        amount="1",
+        party_a="600979",
+        party_b="254708374149",
+        remarks="Test remarks",
+        queue_time_out_url="https://mydomain.com/b2c/queue",
+        result_url="https://mydomain.com/b2c/result",
+    )
+
+
+def _connection_refused() -> requests.ConnectionError:
+    reason = NewConnectionError(None, "Connection refused")  # type: ignore[arg-type]
+    return requests.ConnectionError(MaxRetryError(None, B2C_URL, reason))  # type: ignore[arg-type]
+
+
+@responses.activate
+def test_idempotent_call_is_retried(app: App) -> None:
+    responses.post(QUERY_URL, json=UNAVAILABLE, status=503)
+    responses.post(QUERY_URL, body=requests.ReadTimeout())
+    responses.post(
+        QUERY_URL,
+        json={
+            "ResponseCode": "0",
+            "ResponseDescription": "Accepted",
+            "MerchantRequestID": "22205-34066-1",
+            "CheckoutRequestID": "ws_CO_13012021093521236557",
+            "ResultCode": "0",
+            "ResultDesc": "Processed",
+        },
+    )
+    assert isinstance(_query(app), STKPushQueryResult)
+    assert len(responses.calls) == 3
+
+
+@responses.activate
+def test_non_json_error_pages_are_retried(app: App) -> None:
+    responses.post(QUERY_URL, body="<html>502 Bad Gateway</html>", status=502)
+    responses.post(
+        QUERY_URL,
+        json={
+            "ResponseCode": "0",
+            "ResponseDescription": "Accepted",
+            "MerchantRequestID": "22205-34066-1",
+            "CheckoutRequestID": "ws_CO_13012021093521236557",
+            "ResultCode": "0",
+            "ResultDesc": "Processed",
+        },
+    )
+    assert isinstance(_query(app), STKPushQueryResult)
+    assert len(responses.calls) == 2
+
+    # Raised once the attempts run out
+    responses.replace(
+        "POST", QUERY_URL, body="<html>502 Bad Gateway</html>", status=502
+    )
+    with pytest.raises(requests.JSONDecodeError):
+        _query(app)
+    assert len(responses.calls) == 5
+
+
+@responses.activate
+def test_attempts_are_bounded(app: App) -> None:
+    responses.post(QUERY_URL, json=UNAVAILABLE, status=503)
+    assert not _query(app).status_ok
+    assert len(responses.calls) == 3
+
+
+@responses.activate
+def test_money_moving_call_is_not_retried_when_delivery_is_unknown(app: App) -> None:
+    responses.post(B2C_URL, json=UNAVAILABLE, status=503)
+    assert isinstance(_pay(app), B2CErrorResult)
+    responses.post(B2C_URL, body=requests.ReadTimeout())
+    with pytest.raises(MpesaTimeoutError):
+        _pay(app)
+    assert len(responses.calls) == 2
+
+
+@responses.activate
+def test_money_moving_call_is_retried_when_not_delivered(app: App) -> None:
+    responses.post(B2C_URL, body=_connection_refused())
+    responses.post(
+        B2C_URL,
+        json={
+            "ConversationID": "AG_20250803_0100100304l06pxff5wk",
+            "OriginatorConversationID": "2dc26700-cdce-41a8-9913-d8a35704cd48",
+            "ResponseCode": "0",
+            "ResponseDescription": "Accept the service request successfully.",
+        },
+    )
+    assert isinstance(_pay(app), B2CResult)
+    assert len(responses.calls) == 2
+    assert responses.calls[0].request.body == responses.calls[1].request.body
+
+
+def test_deadline() -> None:
+    policy = RetryPolicy(max_attempts=10, backoff=1, jitter=False, deadline=2.5)
+    started_at = time.monotonic()
+    assert policy.next_delay(1, started_at) == 1
+    assert policy.next_delay(2, started_at) == 2
+    assert policy.next_delay(3, started_at) is None
@@ -0,0 +1,141 @@
+import socket
+
+import pytest
+import requests
+import responses
+
+from mpesa_connect import App, AppEnv, EndpointRouter, QRCode, STKPush
+from mpesa_connect.simulator import DarajaSimulator
+
+QUERY_PATH = "/mpesa/stkpushquery/v1/query"
+QUERY_RESPONSE = {
+    "ResponseCode": "0",
+    "ResponseDescription": "Accepted",
+    "MerchantRequestID": "22205-34066-1",
+    "CheckoutRequestID": "ws_CO_13012021093521236557",
+    "ResultCode": "0",
+    "ResultDesc": "Processed",
+}
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _unused_url() -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+def _query(app: App, access_token: str = "token"):  # type: ignore[no-untyped-def]
+    return STKPush(app, access_token=access_token).query(
+        business_short_code="174379",
+        checkout_request_id="ws_CO_13012021093521236557",
+        password="password",
+        timestamp="20160216165627",
+    )
+
+
+def _generate_qr(app: App):  # type: ignore[no-untyped-def]
+    return QRCode(app).generate(
+        merchant_name="Test", ref_no="1", amount=1, trx_code="BG", cpi="1", size="300"
+    )
+
+
+def test_round_robin_skips_endpoints_that_are_down() -> None:
+    clock = FakeClock()
+    router = EndpointRouter(
+        ["https://a.test/", "https://b.test", "https://c.test"],
+        cooldown=10,
+        clock=clock,
+    )
+    assert {router.select() for _ in range(3)} == {
+        "https://a.test",
+        "https://b.test",
+        "https://c.test",
+    }
+    router.report_failure("https://b.test/mpesa/b2c/v1/paymentrequest")
+    assert {router.select() for _ in range(4)} == {"https://a.test", "https://c.test"}
+    clock.now = 10
+    assert "https://b.test" in {router.select() for _ in range(3)}
+
+
+def test_priority_fails_over_in_order() -> None:
+    clock = FakeClock()
+    router = EndpointRouter(
+        ["https://a.test", "https://b.test"],
+        strategy="priority",
+        failure_threshold=2,
+        cooldown=10,
+        clock=clock,
+    )
+    assert router.select() == "https://a.test"
+    router.report_failure("https://a.test")
+    assert router.select() == "https://a.test"
+    router.report_failure("https://a.test")
+    assert router.select() == "https://b.test"
+    clock.now = 5
+    router.report_failure("https://b.test")
+    router.report_failure("https://b.test")
+    # Everything is down, the endpoint that recovers first is used
+    assert router.select() == "https://a.test"
+    router.report_success("https://a.test")
+    assert router.select() == "https://a.test"
+
+
+def test_similar_urls_are_told_apart() -> None:
+    router = EndpointRouter(["http://a.test:80", "http://a.test:8000"], cooldown=10)
+    router.report_failure("http://a.test:8000/mpesa/b2c/v1/paymentrequest")
+    assert [e.failures for e in router.endpoints] == [0, 1]
+
+
+def test_failover_on_connect_errors() -> None:
+    dead = _unused_url()
+    with DarajaSimulator() as simulator:
+        router = EndpointRouter([dead, simulator.url], strategy="priority")
+        with App(
+            env=AppEnv.SANDBOX, consumer_key="", consumer_secret="", base_url=router
+        ) as app:
+            assert _generate_qr(app).status_ok
+            assert router.endpoints[0].failures == 1
+            assert router.select() == simulator.url
+            assert _generate_qr(app).status_ok
+    assert router.check() == []
+
+
+def test_no_failover_once_the_request_was_sent() -> None:
+    router = EndpointRouter(["https://a.test", "https://b.test"], strategy="priority")
+    app = App(env=AppEnv.SANDBOX, consumer_key="", consumer_secret="", base_url=router)
+    with responses.RequestsMock() as rsps:
+        rsps.post(f"https://a.test{QUERY_PATH}", body=requests.exceptions.ReadTimeout())
+        with pytest.raises(Exception):
+            _query(app)
+        assert len(rsps.calls) == 1
+    assert router.endpoints[0].failures == 0
+
+
+@responses.activate
+def test_base_url_with_path() -> None:
+    responses.post(f"https://gateway.test/daraja{QUERY_PATH}", json=QUERY_RESPONSE)
+    app = App(
+        env=AppEnv.SANDBOX,
+        consumer_key="",
+        consumer_secret="",
+        base_url="https://gateway.test/daraja/",
+    )
+    assert app.base_url == "https://gateway.test/daraja"
+    assert _query(app).status_ok
+
+
+def test_health_checks() -> None:
+    dead = _unused_url()
+    with DarajaSimulator() as simulator:
+        router = EndpointRouter([dead, simulator.url], cooldown=60)
+        up = router.check()
+        assert [e.url for e in up] == [simulator.url]
+        assert router.select() == simulator.url
@@ -0,0 +1,180 @@
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterator
+
+import pytest
+
+from mpesa_connect import (
+    B2C,
+    App,
+    AppEnv,
+    B2CCallback,
+    CallbackType,
+    CommandID,
+    QRCode,
+    STKPush,
+    STKPushCallback,
+    STKPushErrorResult,
+    STKPushQueryErrorResult,
+    STKPushQueryResult,
+    TransactionType,
+    parse_callback,
+)
+from mpesa_connect.simulator import DarajaSimulator
+
+
+class _Receiver(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: Any
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.received.put((self.path, json.loads(body)))
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args: object) -> None:
+        pass
+
+
+@pytest.fixture
+def receiver() -> Iterator[Any]:
+    server: Any = ThreadingHTTPServer(("127.0.0.1", 0), _Receiver)
+    server.received = queue.Queue()
+    server.url = f"http://127.0.0.1:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _app(simulator: DarajaSimulator) -> App:
+    return App(
+        env=AppEnv.SANDBOX,
+        consumer_key="key",
+        consumer_secret="secret",
+        base_url=simulator.url,
+    )
+
+
+def _push(app: App, call_back_url: str = "https://mydomain.com/stk"):  # type: ignore[no-untyped-def]
+    return STKPush(app).process_request(
+        business_short_code="174379",
+        transaction_type=TransactionType.CUSTOMER_PAY_BILL_ONLINE,
+        phone_number="254708374149",
+        amount="1",
+        call_back_url=call_back_url,
+        account_reference="Test",
+        transaction_desc="Test",
+        password="password",
+        timestamp="20160216165627",
+    )
+
+
+def _query(app: App, checkout_request_id: str):  # type: ignore[no-untyped-def]
+    return STKPush(app).query(
+        business_short_code="174379",
+        checkout_request_id=checkout_request_id,
+        password="password",
+        timestamp="20160216165627",
+    )
+
+
+def test_stkpush_callback_and_query(receiver: Any) -> None:
+    with DarajaSimulator(callback_delay=0.2) as simulator, _app(simulator) as app:
+        result = _push(app, f"{receiver.url}/stk")
+        assert result.status_ok
+        pending = _query(app, result.checkout_request_id)
+        assert isinstance(pending, STKPushQueryErrorResult)
+        assert pending.error_code == "500.001.1001"
+        path, body = receiver.received.get(timeout=5)
+        assert path == "/stk"
+        callback = parse_callback(CallbackType.STK_PUSH, body)
+        assert isinstance(callback, STKPushCallback)
+        assert callback.checkout_request_id == result.checkout_request_id
+        assert callback.status_ok and callback.amount == "1"
+        completed = _query(app, result.checkout_request_id)
+        assert isinstance(completed, STKPushQueryResult)
+        assert completed.result_code == "0"
+
+
+def test_result_callback(receiver: Any) -> None:
+    with DarajaSimulator(callback_delay=0, result_code=2001) as simulator:
+        result = B2C(_app(simulator)).payment_request(
+            originator_conversation_id="2dc26700-cdce-41a8-9913-d8a35704cd48",
+            initiator_name="testapi",
+            security_credential="credential",
+            command_id=CommandID.BUSINESS_PAYMENT,
+            amount="1",
+            party_a="600979",
+            party_b="254708374149",
+            remarks="Test remarks",
+            queue_time_out_url=f"{receiver.url}/queue",
+            result_url=f"{receiver.url}/result",
+        )
+        assert result.status_ok
+        _, body = receiver.received.get(timeout=5)
+        callback = parse_callback(CallbackType.B2C, body)
+        assert isinstance(callback, B2CCallback)
+        assert callback.correlation_id == result.conversation_id
+        assert callback.originator_conversation_id == result.originator_conversation_id
+        assert callback.result_code == 2001 and not callback.status_ok
+
+
+def test_throttling_and_error_injection() -> None:
+    with DarajaSimulator(rate_limit=2, deliver_callbacks=False) as simulator:
+        app = _app(simulator)
+        # The token request and the first push fit in the burst
+        first = _push(app)
+        throttled = _push(app)
+        assert isinstance(throttled, STKPushErrorResult)
+        assert throttled.response.status_code == 429
+        assert throttled.error_code == "500.003.02"
+    assert first.status_ok
+    with DarajaSimulator(error_rate=1) as simulator:
+        failed = _push(_app(simulator))
+        assert isinstance(failed, STKPushErrorResult)
+        assert failed.error_code == "503.001.01"
+
+
+def test_rejects_unknown_tokens() -> None:
+    with DarajaSimulator() as simulator:
+        app = _app(simulator)
+        result = QRCode(app, access_token="forged").generate(
+            merchant_name="Test",
+            ref_no="1",
+            amount=1,
+            trx_code="BG",
+            cpi="1",
+            size="300",
+        )
+        assert result.response.status_code == 401
+        assert (
+            QRCode(app)
+            .generate(
+                merchant_name="Test",
+                ref_no="1",
+                amount=1,
+                trx_code="BG",
+                cpi="1",
+                size="300",
+            )
+            .qr_code
+        )
+    assert simulator.requests["/oauth/v1/generate"] == 1
+
+
+def test_expired_pushes_and_tokens_are_dropped() -> None:
+    with DarajaSimulator(
+        callback_delay=0, query_retention=0, token_ttl=0, deliver_callbacks=False
+    ) as simulator:
+        for _ in range(3):
+            simulator._oauth()
+            simulator._stkpush({})
+            time.sleep(0.01)
+        # Only the latest are kept, the others can no longer be used
+        assert len(simulator._tokens) == len(simulator._stk) == 1
@@ -0,0 +1,158 @@
+import asyncio
+import base64
+from typing import Dict, List
+
+import pytest
+import responses
+from cryptography.hazmat.primitives.asymmetric import padding
+
+from mpesa_connect import (
+    B2C,
+    AppEnv,
+    MpesaConnectError,
+    STKPush,
+    TenantConfig,
+    TenantRegistry,
+)
+
+from .test_credentials import _certificate
+
+SANDBOX_URL = "https://sandbox.safaricom.co.ke"
+QUERY_RESPONSE = {
+    "ResponseCode": "0",
+    "ResponseDescription": "Accepted",
+    "MerchantRequestID": "22205-34066-1",
+    "CheckoutRequestID": "ws_CO_13012021093521236557",
+    "ResultCode": "0",
+    "ResultDesc": "Processed",
+}
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _configs(*tenant_ids: str) -> Dict[str, TenantConfig]:
+    return {
+        tenant_id: TenantConfig(
+            consumer_key=f"{tenant_id}-key",
+            consumer_secret=f"{tenant_id}-secret",
+            env=AppEnv.SANDBOX,
+            business_short_code="174379",
+        )
+        for tenant_id in tenant_ids
+    }
+
+
+@responses.activate
+def test_tenants_reuse_their_token_and_session() -> None:
+    responses.get(
+        f"{SANDBOX_URL}/oauth/v1/generate",
+        json={"access_token": "token", "expires_in": "3599"},
+    )
+    responses.post(f"{SANDBOX_URL}/mpesa/stkpushquery/v1/query", json=QUERY_RESPONSE)
+    registry = TenantRegistry(_configs("a", "b"))
+    for tenant_id in ["a", "b", "a", "b", "a"]:
+        tenant = registry.get(tenant_id)
+        assert (
+            tenant.api(STKPush)
+            .query(
+                business_short_code=tenant.config.business_short_code,
+                checkout_request_id="ws_CO_13012021093521236557",
+                password="password",
+                timestamp="20160216165627",
+            )
+            .status_ok
+        )
+    token_requests = [
+        call.request
+        for call in responses.calls
+        if call.request.url.startswith(f"{SANDBOX_URL}/oauth")
+    ]
+    assert len(token_requests) == 2
+    assert registry["a"].api(STKPush) is registry["a"].api(STKPush)
+    assert registry["a"].app.session is registry["a"].app.session
+    registry.close()
+    assert len(registry) == 0
+
+
+def test_least_recently_used_tenants_are_evicted() -> None:
+    registry = TenantRegistry(_configs("a", "b", "c"), max_tenants=2)
+    a = registry.get("a")
+    session = a.app.session
+    client = a.app.async_client
+    registry.get("b")
+    registry.get("a")
+    registry.get("c")
+    assert "a" in registry and "c" in registry and "b" not in registry
+    registry.get("b")
+    assert "a" not in registry
+    # The evicted app's pool was closed
+    assert a.app.session is not session
+    assert client.is_closed
+    assert registry.get("a") is not a
+
+
+def test_idle_tenants_are_evicted() -> None:
+    clock = FakeClock()
+    registry = TenantRegistry(_configs("a", "b"), idle_timeout=60, clock=clock)
+    registry.get("a")
+    clock.now = 30
+    registry.get("b")
+    clock.now = 70
+    registry.get("b")
+    assert "a" not in registry and "b" in registry
+
+
+def test_configs_are_loaded_on_demand() -> None:
+    loaded: List[str] = []
+    configs = _configs("a")
+
+    def load(tenant_id: str) -> TenantConfig:
+        loaded.append(tenant_id)
+        return configs.get(tenant_id)  # type: ignore[return-value]
+
+    registry = TenantRegistry(load, timeout=3)
+    assert registry.get("a").app.timeout == 3
+    registry.get("a")
+    assert loaded == ["a"]
+    with pytest.raises(KeyError):
+        registry.get("unknown")
+
+
+def test_security_credential() -> None:
+    key, pem = _certificate()
+    registry = TenantRegistry(
+        {
+            "a": TenantConfig(
+                consumer_key="key",
+                consumer_secret="secret",
+                initiator_name="testapi",
+                initiator_password="Safaricom999!*!",
+                certificate=pem,
+            ),
+            "b": TenantConfig(consumer_key="key", consumer_secret="secret"),
+        }
+    )
+    credential = registry["a"].security_credential()
+    assert credential == registry["a"].security_credential()
+    assert (
+        key.decrypt(base64.b64decode(credential), padding.PKCS1v15()).decode()
+        == "Safaricom999!*!"
+    )
+    with pytest.raises(MpesaConnectError):
+        registry["b"].security_credential()
+
+
+def test_aclose() -> None:
+    async def main() -> None:
+        async with TenantRegistry(_configs("a")) as registry:
+            client = registry["a"].app.async_client
+            assert registry["a"].api(B2C).app is registry["a"].app
+        assert client.is_closed
+
+    asyncio.run(main())
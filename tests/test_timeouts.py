@@ -0,0 +1,74 @@
+import time
+
+import pytest
+import requests
+import responses
+
+from mpesa_connect import App, AppEnv, MpesaTimeoutError, RetryPolicy, STKPush
+from mpesa_connect.timeouts import Budget
+
+SANDBOX_URL = "https://sandbox.safaricom.co.ke"
+QUERY_URL = f"{SANDBOX_URL}/mpesa/stkpushquery/v1/query"
+
+
+def _query(app: App, **kwargs):  # type: ignore[no-untyped-def]
+    return STKPush(app).query(
+        business_short_code="174379",
+        checkout_request_id="ws_CO_13012021093521236557",
+        password="password",
+        timestamp="20160216165627",
+        **kwargs,
+    )
+
+
+def test_budget_clips_timeout_to_deadline() -> None:
+    assert Budget((5, 30)).request_timeout() == (5, 30)
+    connect, read = Budget((5, 30), deadline=2).request_timeout()  # type: ignore[misc]
+    assert 1.9 < connect <= 2 and 1.9 < read <= 2
+    budget = Budget((5, 30), deadline=0)
+    with pytest.raises(MpesaTimeoutError):
+        budget.request_timeout()
+
+
+@responses.activate
+def test_per_call_timeout() -> None:
+    responses.get(
+        f"{SANDBOX_URL}/oauth/v1/generate",
+        json={"access_token": "token", "expires_in": "3599"},
+    )
+    responses.post(
+        QUERY_URL,
+        json={"requestId": "1", "errorCode": "1", "errorMessage": "Error"},
+        status=500,
+    )
+    app = App(env=AppEnv.SANDBOX, consumer_key="", consumer_secret="")
+    _query(app)
+    _query(app, timeout=(1, 2))
+    assert responses.calls[0].request.req_kwargs["timeout"] == (5, 30)
+    assert responses.calls[1].request.req_kwargs["timeout"] == (5, 30)
+    assert responses.calls[2].request.req_kwargs["timeout"] == (1, 2)
+
+
+@responses.activate
+def test_timeout_raises_dedicated_error() -> None:
+    responses.post(QUERY_URL, body=requests.ReadTimeout("Read timed out"))
+    app = App(env=AppEnv.SANDBOX, consumer_key="", consumer_secret="")
+    with pytest.raises(MpesaTimeoutError):
+        _query(app, access_token="token")
+
+
+@responses.activate
+def test_deadline_covers_retries() -> None:
+    responses.post(QUERY_URL, body=requests.ReadTimeout("Read timed out"))
+    app = App(
+        env=AppEnv.SANDBOX,
+        consumer_key="",
+        consumer_secret="",
+        deadline=0.3,
+        retry_policy=RetryPolicy(max_attempts=100, backoff=0.05, jitter=False),
+    )
+    started_at = time.monotonic()
+    with pytest.raises(MpesaTimeoutError):
+        _query(app, access_token="token")
+    assert time.monotonic() - started_at < 0.5
+    assert 1 < len(responses.calls) < 10
@@ -0,0 +1,125 @@
+import asyncio
+import json
+import threading
+import time
+from typing import Any, List, Tuple
+
+from mpesa_connect import (
+    C2BValidator,
+    CallbackApp,
+    CallbackType,
+    Metrics,
+    ValidationResultCode,
+    ValidationRules,
+)
+
+from .test_callbacks import C2B_CONFIRMATION, _post
+
+RULES = ValidationRules(
+    accounts=["invoice008", "ACC-1"],
+    prefixes=["INV", "LOAN-"],
+    patterns=[r"\d{6}", r"SUB-[A-Z]{3}"],
+    blocked=["INV-666"],
+    min_amount=10,
+    max_amount=150_000,
+)
+
+
+class RecordingMetrics(Metrics):
+    def __init__(self) -> None:
+        self.validations: List[Tuple[str, float]] = []
+
+    def validation(self, result_code: str, seconds: float) -> None:
+        self.validations.append((result_code, seconds))
+
+
+def test_rules() -> None:
+    accepted = ["INVOICE008", " acc-1 ", "inv-1", "loan-42", "123456", "sub-abc"]
+    for account in accepted:
+        assert RULES.check(account, 100) is ValidationResultCode.ACCEPTED, account
+    rejected = ["ACC-2", "LOAN", "1234567", "SUB-AB1", "INV-666", ""]
+    for account in rejected:
+        assert (
+            RULES.check(account, 100) is ValidationResultCode.INVALID_ACCOUNT_NUMBER
+        ), account
+    assert RULES.check("ACC-1", 5) is ValidationResultCode.INVALID_AMOUNT
+    assert RULES.check("ACC-1", 200_000) is ValidationResultCode.INVALID_AMOUNT
+    # Anything not blocked without accepted accounts
+    assert ValidationRules(blocked=["X"]).check("Y", 1) is ValidationResultCode.ACCEPTED
+    assert (
+        ValidationRules(accounts=["Acc"], case_sensitive=True).check("ACC", 1)
+        is ValidationResultCode.INVALID_ACCOUNT_NUMBER
+    )
+
+
+def test_validator_reports_latency_and_refreshes_rules() -> None:
+    metrics = RecordingMetrics()
+    loaded = threading.Event()
+    versions = [ValidationRules(accounts=["A"]), ValidationRules(accounts=["B"])]
+
+    def load() -> ValidationRules:
+        if not versions:
+            raise OSError("database is down")
+        if len(versions) == 1:
+            loaded.set()
+        return versions.pop(0)
+
+    validator = C2BValidator(load, refresh_interval=0.01, metrics=metrics)
+    try:
+        assert validator.validate("A", "100") is ValidationResultCode.ACCEPTED
+        assert loaded.wait(5)
+        time.sleep(0.05)
+        # The last rules loaded are kept while loading fails
+        assert validator.validate("B", "100") is ValidationResultCode.ACCEPTED
+        assert validator.validate("A", "100") is (
+            ValidationResultCode.INVALID_ACCOUNT_NUMBER
+        )
+        assert validator.validate("B", "ten") is ValidationResultCode.OTHER_ERROR
+    finally:
+        validator.stop()
+    assert [code for code, _ in metrics.validations] == [
+        "0",
+        "0",
+        "C2B00012",
+        "C2B00016",
+    ]
+    assert all(0 <= seconds < 0.1 for _, seconds in metrics.validations)
+
+
+def test_callback_app_answers_validation_requests() -> None:
+    handled: List[Any] = []
+
+    async def main() -> None:
+        app = CallbackApp(
+            {
+                "/validation": CallbackType.C2B_VALIDATION,
+                "/confirmation": CallbackType.C2B_CONFIRMATION,
+            },
+            handled.append,
+            validator=C2BValidator(RULES),
+        )
+        ok = await _post(app, "/validation", json.dumps(C2B_CONFIRMATION).encode())
+        assert ok == {
+            "status": 200,
+            "body": {"ResultCode": "0", "ResultDesc": "Accepted"},
+        }
+        rejected = await _post(
+            app,
+            "/validation",
+            json.dumps({**C2B_CONFIRMATION, "BillRefNumber": "unknown"}).encode(),
+        )
+        assert rejected == {
+            "status": 200,
+            "body": {"ResultCode": "C2B00012", "ResultDesc": "Rejected"},
+        }
+        # Confirmations are acknowledged as before
+        confirmed = await _post(
+            app,
+            "/confirmation",
+            json.dumps({**C2B_CONFIRMATION, "BillRefNumber": "unknown"}).encode(),
+        )
+        assert confirmed["body"] == {"ResultCode": 0, "ResultDesc": "Accepted"}
+        await app.stop()
+
+    asyncio.run(main())
+    assert [c.bill_ref_number for c in handled] == ["invoice008", "unknown", "unknown"]